@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Bayesian adaptive design over the cells of a pm1 condition table.
+A joint posterior over the parameters of a masking model is kept on a grid, and the next trial is run in the
+(SOA, stim1_c, stim2_c) cell whose response is expected to tell the most about them (the mutual information between
+the response and the parameters). The likelihoods of a correct response, and their entropies, are tabulated once for
+every parameter set and cell, so that each step is two matrix-vector products over the whole grid.
+Masking model: each stimulus contributes (contrast / 10 ** thresh) ** slope of evidence, with the first one's
+weighted by 1 - amp * exp(-soa_ms / tau) (amp > 0: masking by the second stimulus, amp < 0: facilitation), and the
+probability of a correct location (or interval) report is guess + (1 - guess - lapse) * (1 - exp(-evidence)).
+Contrasts are log10 scaled, as in the condition files; -99 stands for no stimulus.
+Original date: 2026-10-18
+"""
+
+from __future__ import division
+import numpy as np
+
+## Default parameter grids:
+PARAM_GRIDS = {'thresh': np.round(np.arange(-2.4, -0.35, .1), 2),  # log10 contrast
+               'slope': np.geomspace(1, 8, 6),  # per log10 unit
+               'amp': np.round(np.linspace(-.6, 1, 9), 2),  # weight loss of the first stimulus at SOA 0
+               'tau': np.geomspace(20, 400, 6)}  # decay of the masking with SOA, in ms
+PARAM_NAMES = ['thresh', 'slope', 'amp', 'tau']
+
+
+# Probability of a correct response in each cell (columns) under each parameter set (rows):
+def p_correct(params, soa_ms, c1, c2, guess=.5, lapse=.02):
+    thresh_, slope_, amp_, tau_ = [params[name_][:, None] for name_ in PARAM_NAMES]
+    weight_ = 1 - amp_ * np.exp(-soa_ms[None, :] / tau_)
+    evidence_ = (weight_ * (10 ** (c1[None, :] - thresh_)) ** slope_ +
+                 (10 ** (c2[None, :] - thresh_)) ** slope_)
+    return guess + (1 - guess - lapse) * (1 - np.exp(-evidence_))
+
+
+# Entropy of a binary outcome, in bits:
+def binary_entropy(p):
+    p_ = np.clip(p, 1e-12, 1 - 1e-12)
+    return -(p_ * np.log2(p_) + (1 - p_) * np.log2(1 - p_))
+
+
+class MaskingDesign(object):
+    """
+    Information-maximizing choice among the cells (arrays of SOA in ms and log contrasts, one entry per cell).
+    next_cell is the cell of the next trial (chosen as soon as the previous response is in), and update() takes the
+    response to a cell. The next cell is drawn at random among the top_k most informative ones, so that a
+    misspecified model cannot pin the whole block on a single cell (top_k=1: always the most informative one, ties
+    broken at random). The likelihood table is built batch_size cells at a time.
+    """
+
+    def __init__(self, soa_ms, c1, c2, param_grids=None, guess=.5, lapse=.02, top_k=3, batch_size=64, seed=None):
+        self.soa_ms = np.asarray(soa_ms, dtype=float)
+        self.c1 = np.asarray(c1, dtype=float)
+        self.c2 = np.asarray(c2, dtype=float)
+        self.grids = dict((name_, np.asarray((param_grids or {}).get(name_, PARAM_GRIDS[name_]), dtype=float))
+                          for name_ in PARAM_NAMES)
+        mesh_ = np.meshgrid(*[self.grids[name_] for name_ in PARAM_NAMES], indexing='ij')
+        self.grid_shape = mesh_[0].shape
+        self.params = dict((name_, mesh_[i_].ravel()) for i_, name_ in enumerate(PARAM_NAMES))
+        n_params_ = mesh_[0].size
+        n_cells_ = len(self.soa_ms)
+        # Likelihood of a correct response and its entropy, by parameter set x cell:
+        self.p_correct = np.empty((n_params_, n_cells_))
+        for beg_ in range(0, n_cells_, batch_size):
+            end_ = min(beg_ + batch_size, n_cells_)
+            self.p_correct[:, beg_:end_] = p_correct(self.params, self.soa_ms[beg_:end_], self.c1[beg_:end_],
+                                                     self.c2[beg_:end_], guess, lapse)
+        self.entropy = binary_entropy(self.p_correct)
+        self.log_posterior = np.zeros(n_params_)  # flat prior
+        self.top_k = min(top_k, n_cells_)
+        self.rng = np.random.RandomState(seed)
+        self.n_trials = np.zeros(n_cells_, dtype=int)
+        self.n_correct = np.zeros(n_cells_, dtype=int)
+        self.next_cell = self.choose()
+
+    @property
+    def posterior(self):
+        posterior_ = np.exp(self.log_posterior - self.log_posterior.max())
+        return posterior_ / posterior_.sum()
+
+    # Expected information (bits) from a response in each cell:
+    def information(self):
+        posterior_ = self.posterior
+        return binary_entropy(np.dot(posterior_, self.p_correct)) - np.dot(posterior_, self.entropy)
+
+    def choose(self):
+        info_ = self.information()
+        if self.top_k == 1:
+            return int(self.rng.choice(np.flatnonzero(info_ >= info_.max() - 1e-12)))
+        return int(self.rng.choice(np.argpartition(-info_, self.top_k - 1)[:self.top_k]))
+
+    # Take the response to a cell (by default, next_cell), and choose the next one:
+    def update(self, correct, cell=None):
+        if cell is None:
+            cell = self.next_cell
+        likelihood_ = self.p_correct[:, cell]
+        self.log_posterior += np.log(likelihood_ if correct else 1 - likelihood_)
+        self.n_trials[cell] += 1
+        self.n_correct[cell] += int(correct)
+        self.next_cell = self.choose()
+
+    # Posterior means and SDs of the model parameters:
+    def estimate(self):
+        posterior_ = self.posterior
+        estimate_ = {}
+        for name_ in PARAM_NAMES:
+            mean_ = np.dot(posterior_, self.params[name_])
+            estimate_[name_] = mean_
+            estimate_[name_ + '_sd'] = np.sqrt(np.dot(posterior_, (self.params[name_] - mean_) ** 2))
+        return estimate_
+
+    # Posterior marginals of the parameters, over their grids:
+    def marginals(self):
+        posterior_ = self.posterior.reshape(self.grid_shape)
+        marginals_ = {}
+        for i_, name_ in enumerate(PARAM_NAMES):
+            other_axes_ = tuple(axis_ for axis_ in range(len(PARAM_NAMES)) if axis_ != i_)
+            marginals_[name_] = posterior_.sum(axis=other_axes_)
+        return marginals_
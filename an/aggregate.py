@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Running count tables of the pm analyses.
+The derived trial variables of the Rmd analyses (loc_corr, vis, angle_diff) are computed once per session, and the
+trials of each session are counted per cell (experiment x subject x block x SOA x contrasts x orientations) and
+response level of each measure: visibility, interval (or location) accuracy, reported number and reported
+orientation. The tables are kept up to date incrementally: a new session adds its counts, and a changed or removed
+one first takes its previous counts back (kept per session), so an update costs the rows of the sessions involved,
+not of the whole study.
+The tables are written as CSV files (counts_<measure>.csv: the cell columns, angle_diff, the response level and
+'count') for the Rmd files to read instead of the raw trials. Dropped trials are not counted, and sessions without
+the cell columns are left out with a warning.
+Usage: python aggregate.py <data dir> <aggregate dir>
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+import argparse
+import collections
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import ingest
+
+# Cell columns, and the measures counted per cell:
+CELL_COLUMNS = ['experiment', 'subj', 'block', 'soa', 'stim1_c', 'stim2_c', 'stim1_ori', 'stim2_ori']
+MEASURES = ['vis', 'loc_corr', 'resp_num', 'resp_ori']
+
+
+# The derived columns of the analyses: loc_corr (the reported interval, or location, is the one of the stimuli), vis
+# (at least one stimulus reported) and angle_diff (the two orientations differ). Trials without the response are NaN:
+def derive(trials):
+    resp_loc_ = trials['resp_loc'].astype(str) if 'resp_loc' in trials else pd.Series('N', index=trials.index)
+    stim_loc_ = trials['stim_loc'].astype(str) if 'stim_loc' in trials else pd.Series('N', index=trials.index)
+    # The interval paradigm codes the stimulus interval as '1st'/'2nd', reported with the left/right keys:
+    resp_int_ = np.where(resp_loc_ == 'R', '2nd', '1st')
+    loc_corr_ = np.where(stim_loc_.isin(['L', 'R']), resp_loc_ == stim_loc_, resp_int_ == stim_loc_)
+    loc_corr_ = np.where(resp_loc_.isin(['L', 'R']), loc_corr_, np.nan)
+    if 'stim_int' in trials and 'resp_int' in trials:
+        # pm_old.py codes the stimulus and reported intervals as 1/2 (stim_int, resp_int), without stim_loc:
+        stim_int_ = pd.to_numeric(trials['stim_int'], errors='coerce').astype(float)
+        resp_int_ = pd.to_numeric(trials['resp_int'], errors='coerce').astype(float)
+        loc_corr_ = np.where(np.isin(stim_int_, [1, 2]) & np.isin(resp_int_, [1, 2]), resp_int_ == stim_int_,
+                             loc_corr_)
+    trials['loc_corr'] = loc_corr_
+    resp_num_ = pd.to_numeric(trials['resp_num'], errors='coerce') if 'resp_num' in trials else np.nan
+    trials['resp_num'] = resp_num_
+    trials['vis'] = np.where(np.isnan(resp_num_), np.nan, resp_num_ > 0)
+    trials['angle_diff'] = (trials['stim1_ori'].astype(str) != trials['stim2_ori'].astype(str)).astype(int)
+    return trials
+
+
+# Counts of one session, per measure: {(cell values..., level): count}:
+def session_counts(trials):
+    counts_ = {}
+    for measure_ in MEASURES:
+        if measure_ not in trials:
+            continue
+        valid_ = trials[trials[measure_].notna() & (trials[measure_].astype(str) != 'N')]
+        if measure_ == 'resp_ori':
+            # Orientations of the trials not reported invisible (pm_old.py asked for them on every trial):
+            valid_ = valid_[valid_['vis'] != 0]
+        levels_ = valid_[measure_]
+        if measure_ != 'resp_ori':
+            levels_ = levels_.astype(int)
+        sizes_ = valid_.assign(**{measure_: levels_}).groupby(CELL_COLUMNS + [measure_]).size()
+        counts_[measure_] = dict((tuple(getattr(value_, 'item', lambda: value_)() for value_ in key_), int(n_))
+                                 for key_, n_ in sizes_.items())  # plain Python values, for the session files
+    return counts_
+
+
+# Path of the saved counts of a session:
+def session_file_path(agg_dir, key):
+    return os.path.join(agg_dir, 'sessions', key.replace('/', '__') + '.json')
+
+
+def save_session_counts(agg_dir, key, counts):
+    path_ = session_file_path(agg_dir, key)
+    os.makedirs(os.path.dirname(path_), exist_ok=True)
+    with open(path_, 'w') as counts_file_:
+        json.dump(dict((measure_, [list(key_) + [n_] for key_, n_ in measure_counts_.items()])
+                       for measure_, measure_counts_ in counts.items()), counts_file_)
+
+
+def load_session_counts(agg_dir, key):
+    path_ = session_file_path(agg_dir, key)
+    if not os.path.exists(path_):
+        return {}
+    with open(path_) as counts_file_:
+        return dict((measure_, dict((tuple(row_[:-1]), row_[-1]) for row_ in rows_))
+                    for measure_, rows_ in json.load(counts_file_).items())
+
+
+class CountTables(object):
+    """
+    The count tables of all sessions, as one counter per measure. add() and subtract() take the counts of a session.
+    """
+
+    def __init__(self):
+        self.counts = dict((measure_, collections.Counter()) for measure_ in MEASURES)
+
+    def add(self, session_counts):
+        for measure_, counts_ in session_counts.items():
+            self.counts[measure_].update(counts_)
+
+    def subtract(self, session_counts):
+        for measure_, counts_ in session_counts.items():
+            self.counts[measure_].subtract(counts_)
+            for key_ in counts_:
+                if self.counts[measure_][key_] <= 0:
+                    del self.counts[measure_][key_]
+
+    def table(self, measure):
+        table_ = pd.DataFrame([key_ + (n_,) for key_, n_ in self.counts[measure].items()],
+                              columns=CELL_COLUMNS + [measure, 'count'])
+        table_.insert(len(CELL_COLUMNS), 'angle_diff', (table_['stim1_ori'] != table_['stim2_ori']).astype(int))
+        return table_.sort_values(CELL_COLUMNS + [measure]).reset_index(drop=True)
+
+    def save(self, agg_dir):
+        for measure_ in MEASURES:
+            path_ = table_file_path(agg_dir, measure_)
+            self.table(measure_).to_csv(path_ + '.tmp', index=False)
+            os.replace(path_ + '.tmp', path_)
+
+    @classmethod
+    def load(cls, agg_dir):
+        tables_ = cls()
+        for measure_ in MEASURES:
+            path_ = table_file_path(agg_dir, measure_)
+            if not os.path.exists(path_):
+                continue
+            table_ = pd.read_csv(path_, dtype={'stim1_ori': str, 'stim2_ori': str, 'resp_ori': str,
+                                               'experiment': str})
+            cells_ = table_[CELL_COLUMNS + [measure_]].itertuples(index=False, name=None)
+            tables_.counts[measure_].update(dict(zip(cells_, table_['count'].tolist())))
+        return tables_
+
+
+def table_file_path(agg_dir, measure):
+    return os.path.join(agg_dir, 'counts_' + measure + '.csv')
+
+
+# Whether the saved tables (if any) have the current cell columns:
+def tables_current(agg_dir):
+    for measure_ in MEASURES:
+        path_ = table_file_path(agg_dir, measure_)
+        if os.path.exists(path_) and (list(pd.read_csv(path_, nrows=0).columns) !=
+                                      CELL_COLUMNS + ['angle_diff', measure_, 'count']):
+            return False
+    return True
+
+
+# The counts of a session, or None if it is not a pm session (no SOA and contrasts):
+def count_session(data_dir, session):
+    trials_ = ingest.read_session(data_dir, session)
+    trials_ = trials_[~trials_['dropped']]
+    # (the sessions have all the columns of the store, those of the other scripts empty; the stimulus interval or
+    # location is stim_loc, or stim_int in the pm_old.py logs)
+    missing_ = [column_ for column_ in CELL_COLUMNS[3:] if trials_[column_].isna().all()]
+    if trials_['stim_loc'].isna().all() and trials_['stim_int'].isna().all():
+        missing_.append('stim_loc')
+    if missing_:
+        print('WARNING! ' + ingest.session_key(session) + ' left out of the count tables, without ' +
+              ', '.join(missing_))
+        return None
+    trials_ = derive(trials_.assign(experiment=session[0]))
+    return session_counts(trials_)
+
+
+# Bring the count tables up to date with the data directory; returns the keys of the sessions counted and removed:
+def update(data_dir, agg_dir):
+    os.makedirs(agg_dir, exist_ok=True)
+    manifest_ = ingest.load_manifest(agg_dir)
+    if not tables_current(agg_dir):
+        # Tables with other cells (e.g., from before the block was a cell column) are counted again from scratch:
+        print('The count tables have other cell columns: counting all sessions again')
+        manifest_ = {}
+        shutil.rmtree(os.path.join(agg_dir, 'sessions'), ignore_errors=True)
+        for measure_ in MEASURES:
+            if os.path.exists(table_file_path(agg_dir, measure_)):
+                os.remove(table_file_path(agg_dir, measure_))
+    tables_ = CountTables.load(agg_dir)
+    sessions_ = ingest.find_sessions(data_dir)
+    stamps_ = dict((ingest.session_key(session_), ingest.session_stamp(data_dir, session_)) for session_ in sessions_)
+    changed_ = [session_ for session_ in sessions_
+                if manifest_.get(ingest.session_key(session_), {}).get('files') !=
+                stamps_[ingest.session_key(session_)]]
+    removed_ = sorted(set(manifest_) - set(stamps_))
+    for key_ in removed_ + [ingest.session_key(session_) for session_ in changed_]:
+        # The previous counts of the session are taken back before its new ones (if any) are added:
+        tables_.subtract(load_session_counts(agg_dir, key_))
+        if os.path.exists(session_file_path(agg_dir, key_)):
+            os.remove(session_file_path(agg_dir, key_))
+        manifest_.pop(key_, None)
+    for session_ in changed_:
+        key_ = ingest.session_key(session_)
+        counts_ = count_session(data_dir, session_)
+        if counts_ is not None:
+            tables_.add(counts_)
+            save_session_counts(agg_dir, key_, counts_)
+        manifest_[key_] = {'files': stamps_[key_], 'counted': counts_ is not None}
+    tables_.save(agg_dir)
+    ingest.save_manifest(agg_dir, manifest_)
+    return [ingest.session_key(session_) for session_ in changed_], removed_
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update the count tables of the pm analyses.')
+    parser.add_argument('data_dir')
+    parser.add_argument('agg_dir')
+    args = parser.parse_args()
+    counted, removed = update(args.data_dir, args.agg_dir)
+    print('counted ' + str(len(counted)) + ' new or changed session(s), removed ' + str(len(removed)))
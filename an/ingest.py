@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar store of the trial data of all sessions.
+Finds the session directories written by pm.py (data/<exp>_<para>/subj-NN/block-*) and meg.py
+(data/<exp>/subj-NNNN/run-*), parses their trial logs (beh_out.csv, plus drop_out.csv with dropped=True) in a process
+pool with normalized dtypes, and writes one Parquet file per session into a dataset partitioned by experiment and
+subject:
+    <store>/experiment=<exp dir>/subject=<subj dir>/<session dir>.parquet
+Every session is brought to the same columns and types (SCHEMA: the columns of all the versions of the trial logs),
+so that the dataset reads back with all of them whichever file comes first. A Parquet engine (pyarrow or fastparquet)
+is required.
+The store is incremental: the mtime and size of every parsed file are kept in <store>/manifest.json, and only the
+sessions with new or changed files are parsed again (the files of removed sessions are dropped).
+Usage: python ingest.py <data dir> <store dir> [-j N]
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+import argparse
+import concurrent.futures
+import glob
+import importlib
+import json
+import os
+import pandas as pd
+
+# Session directories, and the trial logs read from each (the first one is required):
+SESSION_PATTERNS = ['block-*', 'run-*']
+TRIAL_FILES = ['beh_out.csv', 'drop_out.csv']
+
+# The columns of all the versions of the trial logs (pm.py, pm_old.py, meg.py), by type; the columns of a session
+# that are not listed are left out of the store:
+STR_COLUMNS = ['exp_name', 'stim_ori', 'stim1_ori', 'stim2_ori', 'stim_loc', 'resp_loc', 'resp_ori', 'drop_reason',
+               'session']
+INT_COLUMNS = ['subj', 'block', 'run', 'trial_id', 'block_trial_id', 'drops', 'n_late_fr', 'jitter', 'stim_int',
+               'angle_diff', 'prestim_t_ms', 'prestim_t_fr', 'blink_trial', 'stim_dur_fr', 'poststim_t_fr', 'bitcode',
+               'trial_beg_ns', 'stim_on_ns', 'stim_off_ns', 'trial_end_ns', 'anchor_wall_ns', 'varied_stim', 'correct',
+               'design_cell']
+FLOAT_COLUMNS = ['frame_rate', 'stim_dur', 'beg_buff', 'end_buff', 'wiggle', 'soa', 'stim1_c', 'stim2_c', 'stim_c',
+                 'stim_phase', 'rt_num', 'rt_loc', 'rt_ori', 'rt_int', 'rt_conf', 'max_ifi_ms', 'stim1_on_t',
+                 'stim1_off_t', 'stim2_on_t', 'stim2_off_t', 'stim_on_t', 'stim_off_t', 'thresh', 'thresh_sd', 'slope',
+                 'slope_sd', 'amp', 'amp_sd', 'tau', 'tau_sd']
+# Numeric responses ('N', no response, and 'X', dropped, become NaN):
+NUM_RESP_COLUMNS = ['resp_num', 'resp_int', 'resp_int_conf', 'resp_num_conf', 'resp_ori_conf']
+BOOL_COLUMNS = ['dropped']
+# Column -> type, in the column order of the store:
+SCHEMA = dict([(name_, 'string') for name_ in STR_COLUMNS] + [(name_, 'Int64') for name_ in INT_COLUMNS] +
+              [(name_, 'float64') for name_ in FLOAT_COLUMNS + NUM_RESP_COLUMNS] +
+              [(name_, 'bool') for name_ in BOOL_COLUMNS])
+
+MANIFEST_NAME = 'manifest.json'
+
+
+# Sessions under the data directory, as (experiment, subject, session) directory names:
+def find_sessions(data_dir):
+    sessions_ = []
+    for pattern_ in SESSION_PATTERNS:
+        for path_ in glob.glob(os.path.join(data_dir, '*', 'subj-*', pattern_)):
+            if os.path.exists(os.path.join(path_, TRIAL_FILES[0])):
+                subj_path_, session_ = os.path.split(path_)
+                exp_path_, subject_ = os.path.split(subj_path_)
+                sessions_.append((os.path.basename(exp_path_), subject_, session_))
+    return sorted(sessions_)
+
+
+def session_key(session):
+    return '/'.join(session)
+
+
+# Modification time (ns) and size of each trial log of a session:
+def session_stamp(data_dir, session):
+    stamp_ = {}
+    for name_ in TRIAL_FILES:
+        path_ = os.path.join(data_dir, *session + (name_,))
+        if os.path.exists(path_):
+            stat_ = os.stat(path_)
+            stamp_[name_] = [stat_.st_mtime_ns, stat_.st_size]
+    return stamp_
+
+
+def store_file_path(store_dir, session):
+    experiment_, subject_, session_ = session
+    return os.path.join(store_dir, 'experiment=' + experiment_, 'subject=' + subject_, session_ + '.parquet')
+
+
+# The trials with the columns and types of SCHEMA (a column missing from the session is all NA); raises ValueError on
+# a value that does not fit its column:
+def normalize(trials):
+    trials = trials.reindex(columns=list(SCHEMA))
+    for name_, type_ in SCHEMA.items():
+        if type_ == 'string':
+            trials[name_] = trials[name_].astype('string')
+        elif type_ == 'Int64':
+            values_ = pd.to_numeric(trials[name_])
+            if (values_.dropna() % 1 != 0).any():
+                raise ValueError('non-integer values in column ' + name_)
+            trials[name_] = values_.astype('Int64')
+        elif name_ in NUM_RESP_COLUMNS:
+            trials[name_] = pd.to_numeric(trials[name_], errors='coerce')
+        elif type_ == 'float64':
+            trials[name_] = pd.to_numeric(trials[name_]).astype('float64')
+        else:
+            trials[name_] = trials[name_].astype(bool)
+    return trials
+
+
+# All the trials of a session, with a 'dropped' column and the session directory name:
+def read_session(data_dir, session):
+    parts_ = []
+    for name_ in TRIAL_FILES:
+        path_ = os.path.join(data_dir, *session + (name_,))
+        if not os.path.exists(path_):
+            continue
+        part_ = pd.read_csv(path_)
+        part_['dropped'] = name_ != TRIAL_FILES[0]
+        parts_.append(part_)
+    trials_ = pd.concat(parts_, ignore_index=True, sort=False)
+    trials_['session'] = session[2]
+    unknown_ = [name_ for name_ in trials_.columns if name_ not in SCHEMA]
+    if unknown_:
+        print('WARNING! ' + session_key(session) + ': columns left out of the store: ' + ', '.join(unknown_))
+    return normalize(trials_)
+
+
+# Parse a session and write its Parquet file (in a worker process); returns its number of rows:
+def ingest_session(data_dir, store_dir, session):
+    trials_ = read_session(data_dir, session)
+    path_ = store_file_path(store_dir, session)
+    os.makedirs(os.path.dirname(path_), exist_ok=True)  # the workers may make the same subject directory
+    # A hidden file, which the dataset readers skip, so that an interrupted write never leaves a broken file in the
+    # store:
+    tmp_path_ = os.path.join(os.path.dirname(path_), '.' + os.path.basename(path_) + '.tmp')
+    trials_.to_parquet(tmp_path_, index=False)
+    os.replace(tmp_path_, path_)
+    return len(trials_)
+
+
+# The Parquet engine that pandas will use; raises ImportError if there is none:
+def parquet_engine():
+    for engine_ in ['pyarrow', 'fastparquet']:
+        try:
+            importlib.import_module(engine_)
+            return engine_
+        except ImportError:
+            pass
+    raise ImportError('the store is written as Parquet files, which needs pyarrow (or fastparquet): '
+                      'pip install pyarrow')
+
+
+def load_manifest(store_dir):
+    path_ = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path_):
+        return {}
+    with open(path_) as manifest_file_:
+        return json.load(manifest_file_)
+
+
+def save_manifest(store_dir, manifest):
+    path_ = os.path.join(store_dir, MANIFEST_NAME)
+    tmp_path_ = path_ + '.tmp'
+    with open(tmp_path_, 'w') as manifest_file_:
+        json.dump(manifest, manifest_file_, indent=1, sort_keys=True)
+    os.replace(tmp_path_, path_)
+
+
+# Bring the store up to date with the data directory; returns the keys of the sessions (re)parsed and removed:
+def ingest(data_dir, store_dir, n_jobs=None):
+    parquet_engine()  # before any worker is started
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+    manifest_ = load_manifest(store_dir)
+    sessions_ = find_sessions(data_dir)
+    stamps_ = dict((session_key(session_), session_stamp(data_dir, session_)) for session_ in sessions_)
+    changed_ = [session_ for session_ in sessions_
+                if manifest_.get(session_key(session_), {}).get('files') != stamps_[session_key(session_)]]
+    removed_ = sorted(set(manifest_) - set(stamps_))
+    for key_ in removed_:
+        path_ = store_file_path(store_dir, tuple(key_.split('/')))
+        if os.path.exists(path_):
+            os.remove(path_)
+        del manifest_[key_]
+    if changed_:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as pool_:
+            futures_ = dict((pool_.submit(ingest_session, data_dir, store_dir, session_), session_)
+                            for session_ in changed_)
+            for future_ in concurrent.futures.as_completed(futures_):
+                session_ = futures_[future_]
+                try:
+                    n_rows_ = future_.result()
+                except (ValueError, pd.errors.ParserError, pd.errors.EmptyDataError) as error_:
+                    print('WARNING! Could not parse ' + session_key(session_) + ': ' + str(error_))
+                    continue
+                manifest_[session_key(session_)] = {'files': stamps_[session_key(session_)], 'rows': n_rows_}
+    save_manifest(store_dir, manifest_)
+    return [session_key(session_) for session_ in changed_], removed_
+
+
+# The trials of one experiment directory (e.g., 'pm1_int') from the store, with its subject partition column:
+def load_store(store_dir, experiment):
+    return pd.read_parquet(os.path.join(store_dir, 'experiment=' + experiment))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or update the columnar store of the trial data.')
+    parser.add_argument('data_dir')
+    parser.add_argument('store_dir')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+    parsed, removed = ingest(args.data_dir, args.store_dir, args.jobs)
+    manifest = load_manifest(args.store_dir)
+    print('parsed ' + str(len(parsed)) + ' session(s), removed ' + str(len(removed)) + '; the store holds ' +
+          str(len(manifest)) + ' session(s), ' + str(sum(entry_['rows'] for entry_ in manifest.values())) +
+          ' trials')
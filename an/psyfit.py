@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Batched psychometric-function fits with bootstrap confidence intervals.
+Fits a Weibull or logistic function of (log10) contrast to every cell of a count table at once (e.g., per subject x
+SOA x orientation difference x contrast of the other stimulus), by maximum likelihood: a grid search over threshold and
+slope for all the cells together, then Fisher scoring steps on all of them as arrays. The bootstrap resamples the
+binomial counts of each contrast level (nonparametric), and its replicates are fitted in the same batched way, a chunk
+of cells per worker process.
+The input is a count table written by aggregate.py (counts_<measure>.csv); levels below MIN_X (no stimulus, -99) are
+left out of the fits.
+Usage: python psyfit.py <aggregate dir> [--measure loc_corr] [--x stim1_c] [--by subj soa angle_diff stim2_c]
+                        [--model weibull] [--boot 2000] [-j N] [--out fits.csv]
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+from __future__ import division
+import argparse
+import concurrent.futures
+import os
+import numpy as np
+import pandas as pd
+
+# The guess rate (fixed) of each measure: chance for the interval (location) report, none for visibility:
+GUESS = {'loc_corr': .5, 'vis': 0.}
+LAPSE = .02
+MIN_X = -10
+# Starting grids of the fits:
+THRESH_GRID = np.arange(-3, 0.01, .05)
+SLOPE_GRID = np.geomspace(.3, 30, 25)
+# Bounds of the scoring steps (an estimate on a bound did not converge):
+THRESH_BOUNDS = (THRESH_GRID[0] - 1, THRESH_GRID[-1] + 1)
+SLOPE_BOUNDS = (SLOPE_GRID[0] / 10, SLOPE_GRID[-1] * 10)
+P_EPS = 1e-9
+
+
+# Function values and their derivative (with respect to z = slope * (x - thresh)) of the sigmoids:
+# (z is clipped where the functions are flat anyway, to keep the powers finite):
+def weibull(z):
+    power_ = 10 ** np.clip(z, -30, 3)
+    e_ = np.exp(-power_)
+    return 1 - e_, np.log(10) * power_ * e_
+
+def logistic(z):
+    f_ = 1 / (1 + np.exp(-np.clip(z, -50, 50)))
+    return f_, f_ * (1 - f_)
+
+MODELS = {'weibull': weibull, 'logistic': logistic}
+
+
+def on_bound(values, bounds):
+    return np.isclose(values, bounds[0], rtol=1e-9) | np.isclose(values, bounds[1], rtol=1e-9)
+
+
+def log_likelihood(p, n, k):
+    p_ = np.clip(p, P_EPS, 1 - P_EPS)
+    return (k * np.log(p_) + (n - k) * np.log(1 - p_)).sum(axis=-1)
+
+
+# Binomial data per cell: the cell table, and the contrast levels, trials and successes, padded with n=0 to the same
+# number of levels per cell:
+def cell_data(counts, measure, x, by):
+    counts_ = counts[counts[x] > MIN_X]
+    levels_ = counts_.assign(n=counts_['count'], k=counts_['count'] * (counts_[measure] == 1))
+    levels_ = levels_.groupby(by + [x])[['n', 'k']].sum().reset_index()  # sorted by cell, then level
+    cells_ = levels_[by].drop_duplicates().reset_index(drop=True)
+    cell_indx_ = levels_.groupby(by).ngroup().values
+    level_indx_ = levels_.groupby(by).cumcount().values
+    shape_ = (len(cells_), level_indx_.max() + 1)
+    x_, n_, k_ = np.zeros(shape_), np.zeros(shape_), np.zeros(shape_)
+    x_[cell_indx_, level_indx_] = levels_[x].values
+    n_[cell_indx_, level_indx_] = levels_['n'].values
+    k_[cell_indx_, level_indx_] = levels_['k'].values
+    return cells_, x_, n_, k_
+
+
+# Maximum-likelihood thresholds and slopes, all fitted together. x and n are (cells, levels); k is (cells, levels), or
+# (cells, replicates, levels) for resampled data, which share the levels and trials of their cell. A fit has converged
+# when its scoring steps end below tol, with a regular information matrix, and off the bounds; those that have not
+# (e.g., a step function, whose likelihood keeps growing with the slope) are no estimates:
+def fit_batch(x, n, k, model='weibull', guess=.5, lapse=LAPSE, n_steps=30, tol=1e-7, max_grid_size=4e6):
+    sigmoid_ = MODELS[model]
+    scale_ = 1 - guess - lapse
+    k_ = k.reshape(len(x), -1, x.shape[1])
+    n_rep_ = k_.shape[1]
+
+    # Grid search: the log-likelihood is k . (log p - log(1 - p)) + n . log(1 - p), so for each cell the grid terms
+    # are computed once and all its replicates are scored with one matrix product:
+    thresh_grid_, slope_grid_ = [grid_.ravel() for grid_ in np.meshgrid(THRESH_GRID, SLOPE_GRID, indexing='ij')]
+    grid_best_ = np.zeros((len(x), n_rep_), dtype=int)
+    block_ = max(1, int(max_grid_size // (n_rep_ * len(thresh_grid_))))  # cells per block
+    for beg_ in range(0, len(x), block_):
+        x_block_ = x[beg_:beg_ + block_]
+        z_ = slope_grid_[None, :, None] * (x_block_[:, None, :] - thresh_grid_[None, :, None])
+        p_ = np.clip(guess + scale_ * sigmoid_(z_)[0], P_EPS, 1 - P_EPS)
+        log_q_ = np.log(1 - p_)
+        ll_ = (np.matmul(k_[beg_:beg_ + block_], np.swapaxes(np.log(p_) - log_q_, 1, 2)) +
+               (n[beg_:beg_ + block_, None, :] * log_q_).sum(axis=-1)[:, None, :])
+        grid_best_[beg_:beg_ + block_] = ll_.argmax(axis=-1)
+
+    # Fisher scoring in (thresh, log slope), on all the rows at once, with the step halved wherever it does not
+    # improve the likelihood; rows leave the batch once converged (or stuck):
+    x = np.repeat(x, n_rep_, axis=0)
+    n = np.repeat(n, n_rep_, axis=0)
+    k_ = k_.reshape(-1, x.shape[1])
+    thresh_ = thresh_grid_[grid_best_.ravel()]
+    log_slope_ = np.log(slope_grid_[grid_best_.ravel()])
+
+    def predict(rows_, thresh_, log_slope_):
+        return guess + scale_ * sigmoid_(np.exp(log_slope_)[:, None] * (x[rows_] - thresh_[:, None]))[0]
+
+    best_ll_ = log_likelihood(predict(slice(None), thresh_, log_slope_), n, k_)
+    active_ = np.arange(len(x))
+    converged_ = np.zeros(len(x), dtype=bool)
+    for step_ in range(n_steps):
+        x_, n_, k_active_ = x[active_], n[active_], k_[active_]
+        slope_ = np.exp(log_slope_[active_])
+        dx_ = x_ - thresh_[active_, None]
+        f_, df_ = sigmoid_(slope_[:, None] * dx_)
+        p_ = np.clip(guess + scale_ * f_, P_EPS, 1 - P_EPS)
+        dp_thresh_ = -scale_ * df_ * slope_[:, None]
+        dp_log_slope_ = scale_ * df_ * slope_[:, None] * dx_
+        weight_ = n_ / (p_ * (1 - p_))
+        residual_ = (k_active_ - n_ * p_) / (p_ * (1 - p_))
+        g1_ = (residual_ * dp_thresh_).sum(axis=1)
+        g2_ = (residual_ * dp_log_slope_).sum(axis=1)
+        i11_ = (weight_ * dp_thresh_ ** 2).sum(axis=1)
+        i12_ = (weight_ * dp_thresh_ * dp_log_slope_).sum(axis=1)
+        i22_ = (weight_ * dp_log_slope_ ** 2).sum(axis=1)
+        det_ = i11_ * i22_ - i12_ ** 2
+        ok_ = det_ > 1e-12
+        det_[~ok_] = 1
+        d_thresh_ = np.where(ok_, (i22_ * g1_ - i12_ * g2_) / det_, 0)
+        d_log_slope_ = np.where(ok_, (i11_ * g2_ - i12_ * g1_) / det_, 0)
+        moving_ = np.maximum(np.abs(d_thresh_), np.abs(d_log_slope_)) >= tol
+        converged_[active_[~moving_ & ok_]] = True
+        active_, d_thresh_, d_log_slope_ = active_[moving_], d_thresh_[moving_], d_log_slope_[moving_]
+        step_size_ = np.ones(len(active_))
+        improved_ = np.zeros(len(active_), dtype=bool)
+        for halving_ in range(20):
+            new_thresh_ = np.clip(thresh_[active_] + step_size_ * d_thresh_, *THRESH_BOUNDS)
+            new_log_slope_ = np.clip(log_slope_[active_] + step_size_ * d_log_slope_, *np.log(SLOPE_BOUNDS))
+            new_ll_ = log_likelihood(predict(active_, new_thresh_, new_log_slope_), n[active_], k_[active_])
+            better_ = ~improved_ & (new_ll_ >= best_ll_[active_])
+            thresh_[active_[better_]] = new_thresh_[better_]
+            log_slope_[active_[better_]] = new_log_slope_[better_]
+            best_ll_[active_[better_]] = new_ll_[better_]
+            improved_ |= better_
+            if improved_.all():
+                break
+            step_size_ = np.where(improved_, 0, step_size_ / 2)
+        converged_[active_[~improved_]] = True  # no better point along the step: at the maximum
+        active_ = active_[improved_]
+        if len(active_) == 0:
+            break
+    converged_ &= ~on_bound(thresh_, THRESH_BOUNDS) & ~on_bound(np.exp(log_slope_), SLOPE_BOUNDS)
+    shape_ = k.shape[:-1]
+    return (thresh_.reshape(shape_), np.exp(log_slope_).reshape(shape_), best_ll_.reshape(shape_),
+            converged_.reshape(shape_))
+
+
+# Bootstrap fits of a chunk of cells (in a worker process): returns the thresholds, slopes and converged flags, by
+# cell x replicate. The replicates that did not converge have the top slope bound (their function is as good as a step):
+def bootstrap_chunk(x, n, k, n_boot, seed, model='weibull', guess=.5, lapse=LAPSE):
+    rng_ = np.random.default_rng(seed)
+    p_hat_ = np.where(n > 0, k / np.maximum(n, 1), 0)
+    k_boot_ = rng_.binomial(n.astype(np.int64)[:, None, :], p_hat_[:, None, :],
+                            size=(len(x), n_boot, x.shape[1])).astype(float)
+    thresh_, slope_, ll_, converged_ = fit_batch(x, n, k_boot_, model, guess, lapse)
+    return thresh_, np.where(converged_, slope_, SLOPE_BOUNDS[1]), converged_
+
+
+# Percentile CI limits of the replicates, with the limits on a bound written as unbounded (the bound values: -inf and
+# inf for the threshold, 0 and inf for the slope):
+def ci_limits(values, bounds, unbounded, ci=.95):
+    limits_ = np.percentile(values, [(1 - ci) / 2 * 100, (1 + ci) / 2 * 100], axis=1)
+    limits_ = np.where(np.isclose(limits_, bounds[0], rtol=1e-9), unbounded[0], limits_)
+    return np.where(np.isclose(limits_, bounds[1], rtol=1e-9), unbounded[1], limits_)
+
+
+# Fits of all the cells of a count table, with percentile bootstrap CIs (n_boot=0: none). The threshold and slope of
+# the fits that did not converge (converged column) are NaN; their CIs are still those of the replicates, and
+# boot_converged is the fraction of the replicates that converged:
+def fit_table(counts, measure='loc_corr', x='stim1_c', by=('subj', 'soa', 'angle_diff', 'stim2_c'), model='weibull',
+              n_boot=2000, ci=.95, n_jobs=None, chunk_size=16, seed=None):
+    by = list(by)
+    guess_ = GUESS[measure]
+    cells_, x_, n_, k_ = cell_data(counts, measure, x, by)
+    thresh_, slope_, ll_, converged_ = fit_batch(x_, n_, k_, model, guess_)
+    fits_ = cells_.assign(model=model, n_trials=n_.sum(axis=1).astype(int), n_levels=(n_ > 0).sum(axis=1),
+                          thresh=np.where(converged_, thresh_, np.nan), slope=np.where(converged_, slope_, np.nan),
+                          log_lik=ll_, converged=converged_)
+    if n_boot > 0:
+        seeds_ = np.random.SeedSequence(seed).spawn(int(np.ceil(len(cells_) / chunk_size)))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as pool_:
+            futures_ = [pool_.submit(bootstrap_chunk, x_[beg_:beg_ + chunk_size], n_[beg_:beg_ + chunk_size],
+                                     k_[beg_:beg_ + chunk_size], n_boot, seeds_[i_], model, guess_)
+                        for i_, beg_ in enumerate(range(0, len(cells_), chunk_size))]
+            boot_ = [future_.result() for future_ in futures_]
+        thresh_boot_, slope_boot_, converged_boot_ = [np.concatenate([chunk_[i_] for chunk_ in boot_])
+                                                      for i_ in range(3)]
+        fits_['thresh_lo'], fits_['thresh_hi'] = ci_limits(thresh_boot_, THRESH_BOUNDS, (-np.inf, np.inf), ci)
+        fits_['slope_lo'], fits_['slope_hi'] = ci_limits(slope_boot_, SLOPE_BOUNDS, (0, np.inf), ci)
+        fits_['boot_converged'] = converged_boot_.mean(axis=1)
+    return fits_
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batched psychometric fits of a count table.')
+    parser.add_argument('agg_dir')
+    parser.add_argument('--measure', default='loc_corr', choices=sorted(GUESS))
+    parser.add_argument('--x', default='stim1_c', help='contrast the function is fitted against')
+    parser.add_argument('--by', nargs='*', default=['subj', 'soa', 'angle_diff', 'stim2_c'],
+                        help='columns that define the cells')
+    parser.add_argument('--model', default='weibull', choices=sorted(MODELS))
+    parser.add_argument('--boot', type=int, default=2000, help='bootstrap replicates per cell (0: none)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--out', default='fits.csv')
+    args = parser.parse_args()
+    counts = pd.read_csv(os.path.join(args.agg_dir, 'counts_' + args.measure + '.csv'))
+    fits = fit_table(counts, args.measure, args.x, args.by, args.model, args.boot, n_jobs=args.jobs)
+    fits.to_csv(args.out, index=False)
+    print(str(len(fits)) + ' cells fitted, written to ' + args.out)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Signal-detection metrics of the pm paradigms.
+- Interval (para 'int', 2IFC) and location (para 'loc', left/right) reports: the signal is a stimulus in the 2nd
+  interval (or on the right), and a 'R' response is a 'yes'. d' = (z(H) - z(F)) / sqrt(2), c = -(z(H) + z(F)) / 2.
+- Visibility (resp_num > 0) as a yes/no task: the signal trials are those with a stimulus, and the noise trials are
+  the catch trials (both contrasts at -99) of the same subject (noise_by). d' = z(H) - z(F), c = -(z(H) + z(F)) / 2.
+Hit and false-alarm rates get the log-linear correction ((count + .5) / (n + 1)), so that no rate is 0 or 1. The
+confidence intervals are either analytic (the binomial variance of the rates carried through z, as in Macmillan &
+Creelman) or parametric bootstrap percentiles, with all the cells and replicates as one set of arrays.
+The trials come from the columnar store (ingest.py); dropped trials are left out.
+Usage: python sdt.py <store dir> <experiment> [--task interval] [--by subj soa stim1_c stim2_c] [--boot N]
+                     [--out sdt.csv]
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+from __future__ import division
+import argparse
+import statistics
+import numpy as np
+import pandas as pd
+import ingest
+
+# No stimulus:
+ABSENT_C = -99
+
+
+# Inverse of the standard normal CDF (Acklam's rational approximation, relative error below 1.2e-9):
+def norm_ppf(p):
+    a_ = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02, 1.383577518672690e+02,
+          -3.066479806614716e+01, 2.506628277459239e+00]
+    b_ = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02, 6.680131188771972e+01,
+          -1.328068155288572e+01]
+    c_ = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00, -2.549732539343734e+00,
+          4.374664141464968e+00, 2.938163982698783e+00]
+    d_ = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00]
+    p = np.asarray(p, dtype=float)
+    z_ = np.empty_like(p)
+    tail_ = np.minimum(p, 1 - p)
+    central_ = tail_ >= .02425
+    q_ = p[central_] - .5
+    r_ = q_ * q_
+    z_[central_] = (((((a_[0] * r_ + a_[1]) * r_ + a_[2]) * r_ + a_[3]) * r_ + a_[4]) * r_ + a_[5]) * q_ / \
+                   (((((b_[0] * r_ + b_[1]) * r_ + b_[2]) * r_ + b_[3]) * r_ + b_[4]) * r_ + 1)
+    q_ = np.sqrt(-2 * np.log(tail_[~central_]))
+    z_tail_ = (((((c_[0] * q_ + c_[1]) * q_ + c_[2]) * q_ + c_[3]) * q_ + c_[4]) * q_ + c_[5]) / \
+              ((((d_[0] * q_ + d_[1]) * q_ + d_[2]) * q_ + d_[3]) * q_ + 1)
+    z_[~central_] = np.where(p[~central_] < .5, z_tail_, -z_tail_)
+    return z_
+
+
+def norm_pdf(z):
+    return np.exp(-.5 * z ** 2) / np.sqrt(2 * np.pi)
+
+
+# Log-linear corrected rate of count out of n:
+def corrected_rate(count, n):
+    return (count + .5) / (n + 1)
+
+
+# d' and c from hit and false-alarm rates; two_afc scales d' by 1 / sqrt(2):
+def dprime_c(hit_rate, fa_rate, two_afc=False):
+    z_hit_, z_fa_ = norm_ppf(hit_rate), norm_ppf(fa_rate)
+    d_ = z_hit_ - z_fa_
+    if two_afc:
+        d_ = d_ / np.sqrt(2)
+    return d_, -(z_hit_ + z_fa_) / 2
+
+
+# Analytic standard errors of d' and c:
+def analytic_se(hit_rate, n_signal, fa_rate, n_noise, two_afc=False):
+    var_hit_ = hit_rate * (1 - hit_rate) / (n_signal * norm_pdf(norm_ppf(hit_rate)) ** 2)
+    var_fa_ = fa_rate * (1 - fa_rate) / (n_noise * norm_pdf(norm_ppf(fa_rate)) ** 2)
+    var_d_ = var_hit_ + var_fa_
+    if two_afc:
+        var_d_ = var_d_ / 2
+    return np.sqrt(var_d_), np.sqrt((var_hit_ + var_fa_) / 4)
+
+
+# Bootstrap percentiles of d' and c: the counts are redrawn from the observed rates of each cell, and the
+# replicates get the log-linear correction (once, as the point estimates do):
+def bootstrap_ci(hits, n_signal, fas, n_noise, two_afc=False, n_boot=1000, ci=.95, seed=None):
+    rng_ = np.random.default_rng(seed)
+    n_signal_ = np.asarray(n_signal, dtype=np.int64)[:, None]
+    n_noise_ = np.asarray(n_noise, dtype=np.int64)[:, None]
+    hit_p_ = np.asarray(hits, dtype=float)[:, None] / np.maximum(n_signal_, 1)
+    fa_p_ = np.asarray(fas, dtype=float)[:, None] / np.maximum(n_noise_, 1)
+    hits_ = rng_.binomial(n_signal_, hit_p_, size=(len(n_signal_), n_boot))
+    fas_ = rng_.binomial(n_noise_, fa_p_, size=(len(n_noise_), n_boot))
+    d_, c_ = dprime_c(corrected_rate(hits_, n_signal_), corrected_rate(fas_, n_noise_), two_afc)
+    tails_ = [(1 - ci) / 2 * 100, (1 + ci) / 2 * 100]
+    return np.percentile(d_, tails_, axis=1), np.percentile(c_, tails_, axis=1)
+
+
+# Counts of the interval (or location) task per cell: signal = 2nd interval (right), 'yes' = a 'R' response:
+def interval_counts(trials, by):
+    trials_ = trials[trials['resp_loc'].isin(['L', 'R'])]
+    signal_ = trials_['stim_loc'].isin(['2nd', 'R'])
+    yes_ = trials_['resp_loc'] == 'R'
+    counts_ = trials_[by].assign(hits=signal_ & yes_, n_signal=signal_, fas=~signal_ & yes_, n_noise=~signal_)
+    return counts_.groupby(by)[['hits', 'n_signal', 'fas', 'n_noise']].sum().reset_index()
+
+
+# Counts of visibility per cell, with the false alarms of the catch trials of the same noise_by group:
+def visibility_counts(trials, by, noise_by):
+    resp_num_ = pd.to_numeric(trials['resp_num'], errors='coerce')
+    trials_ = trials[resp_num_.notna()].assign(yes=resp_num_[resp_num_.notna()] > 0)
+    catch_ = (trials_['stim1_c'] == ABSENT_C) & (trials_['stim2_c'] == ABSENT_C)
+    signal_ = trials_[~catch_].groupby(by)['yes'].agg(['sum', 'size']).reset_index()
+    signal_.columns = by + ['hits', 'n_signal']
+    noise_ = trials_[catch_].groupby(noise_by)['yes'].agg(['sum', 'size']).reset_index()
+    noise_.columns = noise_by + ['fas', 'n_noise']
+    return signal_.merge(noise_, on=noise_by, how='inner')
+
+
+# Rates, d', c and their CIs for a table of counts per cell (n_boot=0: analytic CIs only):
+def metrics(counts, two_afc=False, n_boot=0, ci=.95, seed=None):
+    counts_ = counts[(counts['n_signal'] > 0) & (counts['n_noise'] > 0)].reset_index(drop=True)
+    hits_, n_signal_ = counts_['hits'].values.astype(float), counts_['n_signal'].values.astype(float)
+    fas_, n_noise_ = counts_['fas'].values.astype(float), counts_['n_noise'].values.astype(float)
+    hit_rate_, fa_rate_ = corrected_rate(hits_, n_signal_), corrected_rate(fas_, n_noise_)
+    d_, c_ = dprime_c(hit_rate_, fa_rate_, two_afc)
+    se_d_, se_c_ = analytic_se(hit_rate_, n_signal_, fa_rate_, n_noise_, two_afc)
+    z_ = statistics.NormalDist().inv_cdf((1 + ci) / 2)
+    metrics_ = counts_.assign(hit_rate=hit_rate_, fa_rate=fa_rate_, d=d_, c=c_, se_d=se_d_, se_c=se_c_,
+                              d_lo=d_ - z_ * se_d_, d_hi=d_ + z_ * se_d_, c_lo=c_ - z_ * se_c_, c_hi=c_ + z_ * se_c_)
+    if n_boot > 0:
+        (d_lo_, d_hi_), (c_lo_, c_hi_) = bootstrap_ci(hits_, n_signal_, fas_, n_noise_, two_afc, n_boot, ci, seed)
+        metrics_ = metrics_.assign(d_boot_lo=d_lo_, d_boot_hi=d_hi_, c_boot_lo=c_lo_, c_boot_hi=c_hi_)
+    return metrics_
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="d' and criterion per condition cell, from the trial store.")
+    parser.add_argument('store_dir')
+    parser.add_argument('experiment', help="experiment directory, e.g. 'pm1_int'")
+    parser.add_argument('--task', default='interval', choices=['interval', 'visibility'])
+    parser.add_argument('--by', nargs='*', default=['subj', 'soa', 'stim1_c', 'stim2_c'],
+                        help='columns that define the cells')
+    parser.add_argument('--noise-by', nargs='*', default=['subj'],
+                        help='columns that match the catch trials to the cells (visibility)')
+    parser.add_argument('--boot', type=int, default=0, help='bootstrap replicates per cell (0: analytic CIs only)')
+    parser.add_argument('--out', default='sdt.csv')
+    args = parser.parse_args()
+    store_trials = ingest.load_store(args.store_dir, args.experiment)
+    store_trials = store_trials[~store_trials['dropped']]
+    if args.task == 'interval':
+        result = metrics(interval_counts(store_trials, args.by), two_afc=True, n_boot=args.boot)
+    else:
+        result = metrics(visibility_counts(store_trials, args.by, args.noise_by), n_boot=args.boot)
+    result.to_csv(args.out, index=False)
+    print(str(len(result)) + ' cells, written to ' + args.out)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Offline timing audit of a pm.py block or meg.py run.
+Reads the session's frame log (frames.csv), trial logs (beh_out.csv, plus drop_out.csv in pm) and trigger log
+(triggers.csv, meg only), and checks, over all trials at once:
+- the duration of every run of timed frames (fixation, intervals, stimulus, poststimulus) against its number of flips;
+- the measured stimulus windows and SOAs against the planned frames (pm: stim_dur, soa; meg: stim_dur_fr, and the
+  prestimulus and poststimulus frame counts against prestim_t_fr and poststim_t_fr);
+- the late frames per condition;
+- the latency from each trigger's flip to its issue (in the flip callback) and to its send (the write to the device,
+  on the Cedrus worker thread), and the lead of the bitcode trigger over the stimulus onset.
+Usage: python audit.py <block or run directory> [--csv per-trial.csv]
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+from __future__ import division
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import flip_log
+
+# Condition columns by session type (the late frames are reported per combination):
+COND_COLUMNS = {'pm': ['soa', 'stim1_c', 'stim2_c'], 'meg': ['stim_c', 'stim_dur_fr']}
+
+# A measured duration counts as off if it misses the intended one by at least this many frames:
+OFF_FRAMES = .5
+
+
+def load_session(session_dir):
+    trials_ = pd.read_csv(os.path.join(session_dir, 'beh_out.csv'))
+    trials_['dropped'] = False
+    drop_path_ = os.path.join(session_dir, 'drop_out.csv')
+    if os.path.exists(drop_path_):
+        drops_ = pd.read_csv(drop_path_)
+        drops_['dropped'] = True
+        trials_ = pd.concat([trials_, drops_], ignore_index=True)
+    frames_ = pd.read_csv(os.path.join(session_dir, 'frames.csv'))
+    trigger_path_ = os.path.join(session_dir, 'triggers.csv')
+    triggers_ = pd.read_csv(trigger_path_) if os.path.exists(trigger_path_) else None
+    kind_ = 'pm' if 'stim1_on_t' in trials_.columns else 'meg'
+    return kind_, trials_, frames_, triggers_
+
+
+# Runs of consecutive flips of the same trial and phase, with their flip count and duration (from their first flip to
+# the first flip of the next run of the trial, or one period after their last flip for the last run):
+def frame_runs(frames, period):
+    trial_ = frames['trial'].values
+    phase_ = frames['phase'].values
+    t_ = frames['t'].values
+    beg_ = np.flatnonzero(np.r_[True, (trial_[1:] != trial_[:-1]) | (phase_[1:] != phase_[:-1])])
+    end_ = np.r_[beg_[1:], len(t_)]  # one past the last flip of each run
+    last_in_trial_ = np.r_[trial_[beg_[1:]] != trial_[beg_[:-1]], True]
+    end_t_ = np.where(last_in_trial_, t_[end_ - 1] + period, t_[np.minimum(end_, len(t_) - 1)])
+    return pd.DataFrame({'trial': trial_[beg_], 'phase': phase_[beg_], 'n_frames': end_ - beg_,
+                         'dur_ms': (end_t_ - t_[beg_]) * 1000, 'intended_ms': (end_ - beg_) * period * 1000})
+
+
+# Timed flips and late frames per trial (an interval between two timed flips of a trial over LATE_FACTOR periods):
+def late_frames(frames, period):
+    trial_ = frames['trial'].values
+    timed_ = np.isin(frames['phase'].values, flip_log.TIMED_PHASES)
+    pair_ = timed_[1:] & timed_[:-1] & (trial_[1:] == trial_[:-1])
+    late_ = pair_ & (np.diff(frames['t'].values) > flip_log.LATE_FACTOR * period)
+    n_ = trial_.max() + 1
+    return pd.DataFrame({'n_timed': np.bincount(trial_[1:][pair_], minlength=n_),
+                         'n_late': np.bincount(trial_[1:][late_], minlength=n_)})
+
+
+# Achieved vs. intended durations of the stimulus windows and SOAs (ms), one column pair per measure:
+def stim_windows(kind, trials, runs, period):
+    ms_ = period * 1000
+    windows_ = pd.DataFrame({'trial_id': trials['trial_id']})
+    if kind == 'pm':
+        for prefix_ in ['stim1', 'stim2']:
+            windows_[prefix_ + '_dur'] = (trials[prefix_ + '_off_t'] - trials[prefix_ + '_on_t']) * 1000
+            windows_[prefix_ + '_dur_intended'] = trials['stim_dur'] * ms_
+        windows_['soa'] = (trials['stim2_on_t'] - trials['stim1_on_t']) * 1000
+        windows_['soa_intended'] = trials['soa'] * ms_
+    else:
+        windows_['stim_dur'] = (trials['stim_off_t'] - trials['stim_on_t']) * 1000
+        windows_['stim_dur_intended'] = trials['stim_dur_fr'] * ms_
+        # The phases are single runs in meg, so their flip counts are the planned frame counts, give or take the first
+        # flip of a trial: it brings up the last poststimulus frame of the previous trial, but counts as prestimulus:
+        for name_, phase_, column_, extra_fr_ in [('prestim', flip_log.PH_FIX, 'prestim_t_fr', 1),
+                                                  ('poststim', flip_log.PH_POSTFIX, 'poststim_t_fr', -1)]:
+            if column_ not in trials.columns:
+                continue
+            phase_runs_ = runs[runs['phase'] == phase_].set_index('trial')
+            windows_[name_] = phase_runs_['dur_ms'].reindex(trials['trial_id']).values
+            windows_[name_ + '_intended'] = (trials[column_].values + extra_fr_) * ms_
+    return windows_
+
+
+# Summary rows (n, mean and max error, trials off by OFF_FRAMES or more) of achieved vs. intended columns:
+def error_summary(achieved, intended, period):
+    error_ = (achieved - intended).dropna()
+    off_ = np.abs(error_) >= OFF_FRAMES * period * 1000
+    return {'n': len(error_), 'mean_err_ms': error_.mean(), 'max_abs_err_ms': np.abs(error_).max(),
+            'n_off': int(off_.sum())}
+
+
+def trigger_latencies(triggers, frames, trials):
+    t_ = frames['t'].values
+    # The flip each trigger went out on: the latest flip at or before its issue time (give or take the 1 us resolution
+    # of the frame log):
+    flip_indx_ = np.maximum(np.searchsorted(t_, triggers['t_issue'].values + 1e-6, side='right') - 1, 0)
+    # The time the pulse went out (logs before t_sent: the issue time):
+    t_sent_ = triggers['t_sent'] if 't_sent' in triggers.columns else triggers['t_issue']
+    latencies_ = pd.DataFrame({'trial': triggers['trial'], 'bitmask': triggers['bitmask'],
+                               't_issue': triggers['t_issue'], 't_sent': t_sent_,
+                               'flip_to_issue_ms': (triggers['t_issue'].values - t_[flip_indx_]) * 1000,
+                               'flip_to_send_ms': (t_sent_.values - t_[flip_indx_]) * 1000,
+                               'call_ms': (triggers['t_done'] - triggers['t_issue']) * 1000,
+                               'collision': triggers['collision']})
+    # The bitcode (any trigger but the trial onset, line 1) against the measured onset of the stimulus:
+    bitcodes_ = latencies_[latencies_['bitmask'] != 1].merge(trials[['trial_id', 'stim_on_t']], left_on='trial',
+                                                             right_on='trial_id')
+    return latencies_, (bitcodes_['stim_on_t'] - bitcodes_['t_sent']) * 1000
+
+
+def audit(session_dir):
+    kind_, trials_, frames_, triggers_ = load_session(session_dir)
+    period_ = 1 / trials_['frame_rate'].iloc[0]
+    runs_ = frame_runs(frames_, period_)
+    late_ = late_frames(frames_, period_)
+    trials_ = trials_.join(late_, on='trial_id')
+    windows_ = stim_windows(kind_, trials_, runs_, period_)
+    lines_ = ['timing audit of ' + session_dir + ' (' + kind_ + ', ' + str(round(1 / period_, 2)) + ' Hz): ' +
+              str(int((~trials_['dropped']).sum())) + ' trials, ' + str(int(trials_['dropped'].sum())) +
+              ' dropped, ' + str(len(frames_)) + ' flips']
+
+    lines_.append('\nphase runs (duration vs. flip count):')
+    lines_.append('%-12s%8s%10s%14s%16s%8s' % ('phase', 'runs', 'frames', 'mean_err_ms', 'max_abs_err_ms', 'n_off'))
+    for phase_ in flip_log.TIMED_PHASES:
+        phase_runs_ = runs_[runs_['phase'] == phase_]
+        if len(phase_runs_) == 0:
+            continue
+        row_ = error_summary(phase_runs_['dur_ms'], phase_runs_['intended_ms'], period_)
+        lines_.append('%-12s%8d%10d%14.3f%16.3f%8d' % (flip_log.PHASE_NAMES[phase_], row_['n'],
+                                                       phase_runs_['n_frames'].sum(), row_['mean_err_ms'],
+                                                       row_['max_abs_err_ms'], row_['n_off']))
+
+    lines_.append('\nstimulus windows (measured vs. planned):')
+    lines_.append('%-12s%8s%14s%16s%8s' % ('measure', 'trials', 'mean_err_ms', 'max_abs_err_ms', 'n_off'))
+    for column_ in windows_.columns:
+        if column_ == 'trial_id' or column_.endswith('_intended'):
+            continue
+        row_ = error_summary(windows_[column_], windows_[column_ + '_intended'], period_)
+        lines_.append('%-12s%8d%14.3f%16.3f%8d' % (column_, row_['n'], row_['mean_err_ms'], row_['max_abs_err_ms'],
+                                                   row_['n_off']))
+
+    lines_.append('\nlate frames per condition:')
+    cond_columns_ = [column_ for column_ in COND_COLUMNS[kind_] if column_ in trials_.columns]
+    by_cond_ = trials_.groupby(cond_columns_).agg(trials=('trial_id', 'size'),
+                                                  late_trials=('n_late', lambda n_late_: int((n_late_ > 0).sum())),
+                                                  n_late=('n_late', 'sum'), n_timed=('n_timed', 'sum'))
+    by_cond_['late_per_1000'] = by_cond_['n_late'] / by_cond_['n_timed'] * 1000
+    lines_.append(by_cond_.to_string(float_format=lambda x_: '%.3f' % x_))
+
+    if triggers_ is not None and len(triggers_):
+        latencies_, lead_ms_ = trigger_latencies(triggers_, frames_, trials_)
+        lines_.append('\ntriggers: ' + str(int(latencies_['t_sent'].notna().sum())) + ' sent (of ' +
+                      str(len(latencies_)) + '), ' + str(int(latencies_['collision'].sum())) + ' collisions')
+        for name_, values_ in [('flip to issue', latencies_['flip_to_issue_ms']),
+                               ('flip to send', latencies_['flip_to_send_ms'].dropna()),
+                               ('activate_line call', latencies_['call_ms']),
+                               ('bitcode lead over stim onset', lead_ms_.dropna())]:
+            if len(values_):
+                lines_.append('%-30s mean %8.3f ms  p99 %8.3f ms  max %8.3f ms' %
+                              (name_, np.mean(values_), np.percentile(values_, 99), np.max(values_)))
+
+    per_trial_ = trials_[['trial_id', 'dropped', 'n_timed', 'n_late']].merge(windows_, on='trial_id')
+    return '\n'.join(lines_), per_trial_
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Timing audit of a pm.py block or meg.py run.')
+    parser.add_argument('session_dir')
+    parser.add_argument('--csv', help='also write the per-trial audit table to this file')
+    args = parser.parse_args()
+    report, per_trial = audit(args.session_dir)
+    print(report)
+    if args.csv:
+        per_trial.to_csv(args.csv, index=False)
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Headless benchmark of the pm.py and meg.py trial loops.
+Stand-in psychopy (and pyxid) modules replace the window, stimuli, dialogs and keyboards: flips return the times of a
+simulated vsync clock, the dialog is accepted with its defaults (plus overrides), and the response keys are scripted.
+Each run measures the CPU time spent on every frame between two flips, and the distributions are reported per trial
+phase (fixation, presentation, response, ITI) over N simulated blocks.
+Usage: python bench.py pm.py meg.py -n 3
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+from __future__ import division
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+import numpy as np
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, repo_dir)
+import flip_log  # noqa: E402
+import triggers  # noqa: E402
+
+# Frame phases reported (the phases of the flip log, grouped):
+report_phases = [('fixation', [flip_log.PH_FIX]),
+                 ('presentation', [flip_log.PH_INT1, flip_log.PH_INT2, flip_log.PH_POSTFIX]),
+                 ('response', [flip_log.PH_RESP]),
+                 ('iti', [flip_log.PH_ITI])]
+
+# Keys that end a response screen (the rest, e.g., escape and space, are never pressed):
+response_keys = ['left', 'right', 'down', '1', '2', '3']
+
+
+## Stand-in psychopy:
+
+class Backend(object):
+    """
+    Shared state of the stand-in modules: the simulated clock, the scripted keyboard and the per-frame CPU times.
+    """
+
+    def __init__(self, frame_rate=60., key_prob=.5, seed=0):
+        self.period = 1 / frame_rate
+        self.frame_rate = frame_rate
+        self.key_prob = key_prob  # probability of a response key being pressed on any given poll
+        self.rng = np.random.RandomState(seed)
+        self.reset()
+
+    def reset(self):
+        self.now = 0.  # simulated time, in s
+        self.flip_times = []
+        self.frame_cpu = []  # CPU time spent since the previous flip, per flip
+        self.last_flip_end = None
+
+    def flip(self):
+        flip_beg_ = time.perf_counter()
+        if self.last_flip_end is not None:
+            self.frame_cpu.append(flip_beg_ - self.last_flip_end)
+        else:
+            self.frame_cpu.append(np.nan)
+        self.now += self.period
+        self.flip_times.append(self.now)
+        time.sleep(0)  # a real flip blocks on the vertical blank, which lets the other threads run
+        self.last_flip_end = time.perf_counter()
+        return self.now
+
+    def wait(self, secs):
+        self.now += secs
+
+    def get_keys(self, keyList=None, **kwargs):
+        if keyList is None:
+            return []
+        keys_ = [key_ for key_ in keyList if key_ in response_keys]
+        if keys_ and self.rng.rand() < self.key_prob:
+            return [keys_[self.rng.randint(len(keys_))]]
+        return []
+
+    def wait_keys(self, keyList=None, **kwargs):
+        self.now += .5
+        if keyList:
+            return [keyList[0]]
+        return ['space']
+
+    # A scripted key press after a random response time (a response key if any is listed, never escape):
+    def press_key(self, keyList=None):
+        keys_ = [key_ for key_ in keyList or [] if key_ in response_keys]
+        if not keys_:
+            keys_ = [key_ for key_ in keyList or ['space'] if key_ != 'escape']
+        self.now += .2 + self.rng.exponential(.4)
+        return keys_[self.rng.randint(len(keys_))]
+
+
+class Stim(object):
+    """
+    Any visual stimulus: keeps its attributes, and does nothing when drawn or updated.
+    """
+
+    def __init__(self, win=None, *args, **kwargs):
+        self.win = win
+        self.__dict__.update(kwargs)
+
+    def draw(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        # setText(), setOri(), ... and anything else a script may call:
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+class Window(Stim):
+
+    def __init__(self, *args, **kwargs):
+        Stim.__init__(self, None, **kwargs)
+        self.size = np.array([1920, 1080])
+        self.on_flip = []
+
+    def flip(self, *args, **kwargs):
+        flip_time_ = backend.flip()
+        on_flip_, self.on_flip = self.on_flip, []
+        for fn_, args_, kwargs_ in on_flip_:
+            fn_(*args_, **kwargs_)
+        return flip_time_
+
+    def callOnFlip(self, fn, *args, **kwargs):
+        self.on_flip.append((fn, args, kwargs))
+
+    def getActualFrameRate(self, *args, **kwargs):
+        return backend.frame_rate
+
+
+class Dialog(object):
+
+    def __init__(self, dictionary=None, title='', **kwargs):
+        if dictionary is not None:
+            dictionary.update(info_overrides)
+        self.OK = True
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.t0 = backend.now
+
+    def getTime(self):
+        return backend.now - self.t0
+
+    def reset(self, new_t=0.):
+        self.t0 = backend.now - new_t
+
+
+class KeyPress(object):
+
+    def __init__(self, name, t_down, rt):
+        self.name = name
+        self.tDown = t_down
+        self.rt = rt
+
+
+class Keyboard(object):
+    """
+    psychopy.hardware.keyboard.Keyboard: waitKeys() returns a scripted key press. As with the event backend, tDown is
+    on a clock of the keyboard's own (started when it is made, not the flip clock), and rt on its resettable clock.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.t0 = backend.now
+        self.clock = Clock()
+
+    def clearEvents(self, *args, **kwargs):
+        pass
+
+    def key_press(self, key):
+        return KeyPress(key, backend.now - self.t0, self.clock.getTime())
+
+    def waitKeys(self, maxWait=float('inf'), keyList=None, *args, **kwargs):
+        return [self.key_press(backend.press_key(keyList))]
+
+    def getKeys(self, keyList=None, *args, **kwargs):
+        return [self.key_press(key_) for key_ in backend.get_keys(keyList)]
+
+
+class StubModule(types.ModuleType):
+    """
+    A module whose unknown attributes are stimuli (so that any visual.* class can be created).
+    """
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Stim
+
+
+def install_stubs():
+    psychopy_ = types.ModuleType('psychopy')
+    visual_ = StubModule('psychopy.visual')
+    visual_.Window = Window
+    core_ = types.ModuleType('psychopy.core')
+    core_.wait = lambda secs, *args, **kwargs: backend.wait(secs)
+    core_.getTime = lambda: backend.now
+    core_.Clock = Clock
+    core_.MonotonicClock = Clock
+    core_.quit = lambda: sys.exit(0)
+    event_ = types.ModuleType('psychopy.event')
+    event_.getKeys = backend.get_keys
+    event_.waitKeys = backend.wait_keys
+    event_.clearEvents = lambda *args, **kwargs: None
+    gui_ = types.ModuleType('psychopy.gui')
+    gui_.DlgFromDict = Dialog
+    hardware_ = types.ModuleType('psychopy.hardware')
+    keyboard_ = types.ModuleType('psychopy.hardware.keyboard')
+    keyboard_.Keyboard = Keyboard
+    hardware_.keyboard = keyboard_
+    sys.modules['psychopy.hardware.keyboard'] = keyboard_
+    for name_, module_ in [('visual', visual_), ('core', core_), ('event', event_), ('gui', gui_),
+                           ('hardware', hardware_)]:
+        setattr(psychopy_, name_, module_)
+        sys.modules['psychopy.' + name_] = module_
+    sys.modules['psychopy'] = psychopy_
+    # A stand-in Cedrus device, on the simulated clock:
+    pyxid_ = types.ModuleType('pyxid')
+    pyxid_.get_xid_devices = lambda: [triggers.FakeXidDevice(clock=lambda: backend.now)]
+    sys.modules['pyxid'] = pyxid_
+
+
+## Running the scripts:
+
+# Run a script once in a scratch directory (with the condition files linked in); returns its globals:
+def run_script(script_path, work_dir, verbose=False):
+    os.chdir(work_dir)
+    with open(script_path) as script_file_:
+        code_ = compile(script_file_.read(), script_path, 'exec')
+    globals_ = {'__name__': '__main__', '__file__': script_path}
+    console_ = sys.stdout if verbose else io.StringIO()
+    with contextlib.redirect_stdout(console_):
+        try:
+            exec(code_, globals_)
+        except SystemExit:
+            pass
+    return globals_
+
+
+# CPU time per frame, grouped by report phase; a frame's cost is attributed to the phase of the flip that precedes it:
+def frame_costs(globals_):
+    flip_rec_ = globals_['flip_rec']
+    n_ = min(flip_rec_.n_flips, flip_rec_.capacity)
+    phase_at_ = dict(zip(flip_rec_.t[:n_].tolist(), flip_rec_.phase[:n_].tolist()))
+    phases_ = np.array([phase_at_.get(t_, -1) for t_ in backend.flip_times])
+    cpu_ = np.array(backend.frame_cpu)
+    costs_ = {}
+    for name_, codes_ in report_phases:
+        costs_[name_] = cpu_[1:][np.isin(phases_[:-1], codes_)]
+    return costs_
+
+
+def report(script_name, costs, n_runs):
+    print('\n' + script_name + ': per-frame CPU time over ' + str(n_runs) + ' simulated block(s), in ms')
+    print('%-14s%10s%10s%10s%10s%10s' % ('phase', 'frames', 'median', 'p90', 'p99', 'max'))
+    for name_, codes_ in report_phases:
+        ms_ = np.concatenate(costs[name_]) * 1000
+        if len(ms_) == 0:
+            print('%-14s%10d' % (name_, 0))
+            continue
+        print('%-14s%10d%10.3f%10.3f%10.3f%10.3f' % (name_, len(ms_), np.median(ms_), np.percentile(ms_, 90),
+                                                      np.percentile(ms_, 99), np.max(ms_)))
+
+
+backend = Backend()
+info_overrides = {}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless benchmark of the trial loops.')
+    parser.add_argument('scripts', nargs='*', default=['pm.py', 'meg.py'])
+    parser.add_argument('-n', '--n-runs', type=int, default=3, help='simulated blocks (runs) per script')
+    parser.add_argument('--frame-rate', type=float, default=60.)
+    parser.add_argument('--info', nargs='*', default=['block=1'],
+                        help='session dialog overrides, e.g. block=1 subj=99')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show the console output of the scripts')
+    args = parser.parse_args()
+
+    backend = Backend(frame_rate=args.frame_rate)
+    info_overrides.update(dict(item_.split('=', 1) for item_ in args.info))
+    install_stubs()
+    scratch_dir = tempfile.mkdtemp(prefix='pm-bench-')
+    os.environ['PM_CALIB_CACHE'] = os.path.join(scratch_dir, 'calib.json')  # keep the real cache untouched
+    work_dir = os.path.join(scratch_dir, 'work')
+    os.makedirs(work_dir)
+    os.symlink(os.path.join(repo_dir, 'cond-files'), os.path.join(work_dir, 'cond-files'))
+    try:
+        for script_ in args.scripts:
+            script_path = os.path.join(repo_dir, script_)
+            costs = dict((name_, []) for name_, codes_ in report_phases)
+            for run_ in range(args.n_runs):
+                backend.reset()
+                info_overrides['subj'] = str(run_ + 1)
+                run_globals = run_script(script_path, work_dir, args.verbose)
+                for name_, cost_ in frame_costs(run_globals).items():
+                    costs[name_].append(cost_)
+            report(script_, costs, args.n_runs)
+    finally:
+        os.chdir(repo_dir)
+        shutil.rmtree(scratch_dir)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Cached monitor frame-rate calibration.
+The measured refresh rate and inter-flip jitter are stored per monitor profile and resolution
+(e.g., 'samsung_1920x1080') in a small JSON file, and only measured again when the entry is missing or older than
+max_age_days.
+The cache lives in ~/.pm_calib.json unless the PM_CALIB_CACHE environment variable points elsewhere.
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+from __future__ import division
+import json
+import os
+import time
+import numpy as np
+
+
+def cache_path():
+    return os.environ.get('PM_CALIB_CACHE', os.path.join(os.path.expanduser('~'), '.pm_calib.json'))
+
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as cache_file_:
+            return json.load(cache_file_)
+    except ValueError:
+        print('WARNING! Unreadable frame rate cache ' + path + ' - measuring again')
+        return {}
+
+
+def save_cache(path, cache):
+    tmp_path_ = path + '.tmp'
+    with open(tmp_path_, 'w') as cache_file_:
+        json.dump(cache, cache_file_, indent=2, sort_keys=True)
+    os.replace(tmp_path_, path)  # so that an interrupted write never leaves a broken cache
+
+
+# Cache key of a monitor profile at the current window resolution:
+def screen_key(window, profile):
+    return profile + '_%dx%d' % tuple(int(px_) for px_ in window.size)
+
+
+# Refresh rate and inter-flip jitter (SD, in ms), measured on the given window:
+def measure(window, n_flips=120):
+    frame_rate_ = window.getActualFrameRate()
+    flip_times_ = np.array([window.flip() for flip_ in range(n_flips)])
+    jitter_ms_ = np.std(np.diff(flip_times_)) * 1000
+    return frame_rate_, jitter_ms_
+
+
+# The frame rate of the window, from the cache if the entry is recent enough (otherwise measured and cached).
+# If the measurement fails (PsychoPy returns None for an unstable rate), 'nominal' is returned and nothing is cached.
+def frame_rate(window, profile, max_age_days=7, nominal=60, path=None):
+    if path is None:
+        path = cache_path()
+    key_ = screen_key(window, profile)
+    cache_ = load_cache(path)
+    entry_ = cache_.get(key_)
+    if entry_ is not None and time.time() - entry_['measured'] < max_age_days * 24 * 60 * 60:
+        print('frame rate (cached ' + key_ + '): ' + str(entry_['frame_rate']))
+        return entry_['frame_rate']
+    frame_rate_, jitter_ms_ = measure(window)
+    if frame_rate_ is None:
+        print('WARNING! The frame rate could not be measured - assuming ' + str(nominal) + ' Hz')
+        return nominal
+    cache_[key_] = {'frame_rate': frame_rate_, 'jitter_ms': jitter_ms_, 'measured': time.time(),
+                    'measured_on': time.strftime('%Y-%m-%d %H:%M')}
+    save_cache(path, cache_)
+    print('frame rate (measured ' + key_ + '): ' + str(frame_rate_) + ', jitter SD ' +
+          str(round(jitter_ms_, 3)) + ' ms')
+    return frame_rate_
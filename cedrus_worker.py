@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Cedrus XID device on a background thread.
+Discovery, the self-test (the output lines raised one by one), response polling and line activations all happen on a
+worker thread, which is the only one to talk to the USB device. The render thread only enqueues commands and picks up
+responses, so it never waits on the device, and startup no longer hangs until a button is pressed.
+Responses are handed over in a deque (appends and pops are atomic, so no lock is needed), each with the host time at
+which it was read; the response itself keeps the device's own timestamp ('time', on the device RT timer, in ms). The
+line activations are handed back the same way, with the host time at which the write to the device returned, so that
+the trigger log can record when each pulse actually went out (see triggers.TriggerScheduler).
+An error on the worker (no pyxid, a failing device) stops it, and is raised again on the render thread by the next
+call to found, activate_line(), get_responses() or close().
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+import collections
+import queue
+import threading
+import time
+
+
+class CedrusWorker(object):
+    """
+    Stands in for the device: activate_line() and set_pulse_duration() are queued and carried out by the worker, in
+    order (and dropped if no device was found, so check found once ready is set). get_responses() returns the
+    responses read since the last call, and take_sent() the line activations carried out (with the tag given to
+    activate_line()). With a response device, the worker polls it every poll_interval seconds while no command is
+    waiting.
+    """
+
+    def __init__(self, pulse_ms=50, clock=time.perf_counter, poll_interval=.001, self_test=True):
+        self.pulse_ms = pulse_ms
+        self.clock = clock
+        self.poll_interval = poll_interval
+        self.self_test = self_test
+        self.dev = None
+        self.commands = queue.Queue()
+        self.responses = collections.deque()  # (host time, response dict)
+        self.sent = collections.deque()  # (host time, bitmask, tag) of every line activation
+        self.error = None  # the exception that stopped the worker, if any
+        self.ready = threading.Event()  # set once discovery (and the self-test) is done
+        self.thread = threading.Thread(target=self.run, name='cedrus-worker')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __str__(self):
+        return '<CedrusWorker ' + str(self.dev) + '>'
+
+    # Whether a device was found (False until discovery is done):
+    @property
+    def found(self):
+        self.check()
+        return self.ready.is_set() and self.dev is not None
+
+    # Raise the error that stopped the worker, if any:
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        try:
+            self.discover()
+        except Exception as error_:
+            self.error = error_
+            return
+        finally:
+            self.ready.set()
+        polling_ = self.dev is not None and self.dev.is_response_device()
+        try:
+            while True:
+                try:
+                    command_ = self.commands.get(timeout=self.poll_interval if polling_ else None)
+                except queue.Empty:
+                    command_ = ()
+                if command_ is None:
+                    return
+                if command_ and self.dev is not None:
+                    fn_, kwargs_ = command_
+                    fn_(**kwargs_)
+                if polling_:
+                    self.poll()
+        except Exception as error_:
+            self.error = error_
+
+    def discover(self):
+        import pyxid
+        devices_ = pyxid.get_xid_devices()
+        if len(devices_) == 0:
+            print('No pyxid devices found.')
+            return
+        self.dev = devices_[0]  # the first device to use
+        print(self.dev)
+        self.dev.reset_base_timer()
+        self.dev.reset_rt_timer()
+        self.dev.set_pulse_duration(self.pulse_ms)  # the pulse duration for activate_line() calls, in ms
+        if self.self_test:
+            # "There are up to 16 output lines on XID devices that can be raised in any combination."
+            # https://www.psychopy.org/api/hardware/cedrus.html
+            for bm_ in range(0, 7):
+                self.send(bitmask=2 ** bm_)
+            print('Cedrus self-test: sent bitmasks 1 to 64')
+
+    def poll(self):
+        self.dev.poll_for_response()
+        while self.dev.has_response():
+            self.responses.append((self.clock(), self.dev.get_next_response()))
+
+    def send(self, bitmask, tag=None):
+        self.dev.activate_line(bitmask=bitmask)
+        self.sent.append((self.clock(), bitmask, tag))
+
+    def pulse_duration(self, duration):
+        self.dev.set_pulse_duration(duration)
+
+    ## Calls from the render thread (queued):
+
+    def activate_line(self, lines=None, bitmask=None, leave_remaining_lines=False, tag=None):
+        self.check()
+        if bitmask is None:
+            bitmask = sum(2 ** (line_ - 1) for line_ in lines or [])
+        self.commands.put((self.send, {'bitmask': bitmask, 'tag': tag}))
+
+    def set_pulse_duration(self, duration):
+        self.commands.put((self.pulse_duration, {'duration': duration}))
+
+    # The responses read since the last call, as (host time, response) pairs:
+    def get_responses(self):
+        self.check()
+        responses_ = []
+        while self.responses:
+            responses_.append(self.responses.popleft())
+        return responses_
+
+    # The line activations carried out since the last call, as (host time, bitmask, tag):
+    def take_sent(self):
+        sent_ = []
+        while self.sent:
+            sent_.append(self.sent.popleft())
+        return sent_
+
+    # Stop the worker, once the queued commands are done:
+    def close(self):
+        if self.thread.is_alive():
+            self.commands.put(None)
+            self.thread.join()
+        self.check()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Binary cache of the condition tables in cond-files/.
+The first time an xlsx file is loaded it is parsed and compiled into a typed record array, saved as .npz in
+cond-files/.cache/. Later loads read the npz instead, as long as the xlsx is unchanged: the file size and mtime are
+checked first, and the SHA-1 of the contents only if those differ. Tables are also kept in memory for the rest of the
+session, and every call returns a fresh copy.
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Tables already loaded in this session, keyed by absolute path:
+loaded_tables = {}
+
+
+def file_sha1(path):
+    sha1_ = hashlib.sha1()
+    with open(path, 'rb') as table_file_:
+        for chunk_ in iter(lambda: table_file_.read(1 << 16), b''):
+            sha1_.update(chunk_)
+    return sha1_.hexdigest()
+
+
+def cache_file_path(xlsx_path):
+    table_dir_, table_name_ = os.path.split(os.path.abspath(xlsx_path))
+    return os.path.join(table_dir_, '.cache', os.path.splitext(table_name_)[0] + '.npz')
+
+
+# Typed record array of a condition table (strings as fixed-width unicode, so that no pickling is needed):
+def table_records(table):
+    columns_ = []
+    for name_ in table.columns:
+        values_ = table[name_].to_numpy()
+        if values_.dtype.kind in 'OU':
+            values_ = values_.astype(str)
+        columns_.append(values_)
+    return np.rec.fromarrays(columns_, names=[str(name_) for name_ in table.columns])
+
+
+def save_cache(cache_path, records, meta):
+    if not os.path.exists(os.path.dirname(cache_path)):
+        os.makedirs(os.path.dirname(cache_path))
+    tmp_path_ = cache_path + '.tmp.npz'
+    np.savez(tmp_path_, table=records, meta=json.dumps(meta))
+    os.replace(tmp_path_, cache_path)
+
+
+def file_meta(xlsx_path, sha1=None):
+    stat_ = os.stat(xlsx_path)
+    return {'source': os.path.basename(xlsx_path), 'size': stat_.st_size, 'mtime': stat_.st_mtime,
+            'sha1': sha1 or file_sha1(xlsx_path)}
+
+
+def compile_table(xlsx_path):
+    records_ = table_records(pd.read_excel(xlsx_path))
+    save_cache(cache_file_path(xlsx_path), records_, file_meta(xlsx_path))
+    return pd.DataFrame.from_records(records_)
+
+
+# The cached table, or None if there is no valid cache for the current contents of the xlsx file:
+def read_cache(xlsx_path):
+    cache_path_ = cache_file_path(xlsx_path)
+    if not os.path.exists(cache_path_):
+        return None
+    with np.load(cache_path_) as cache_:
+        meta_ = json.loads(str(cache_['meta']))
+        records_ = cache_['table']
+    stat_ = os.stat(xlsx_path)
+    if stat_.st_size != meta_['size'] or stat_.st_mtime != meta_['mtime']:
+        # Touched, but possibly not changed (then only the file stats of the cache are updated):
+        sha1_ = file_sha1(xlsx_path)
+        if sha1_ != meta_['sha1']:
+            return None
+        save_cache(cache_path_, records_, file_meta(xlsx_path, sha1_))
+    return pd.DataFrame.from_records(records_)
+
+
+# The condition table of an xlsx file (a copy that the caller is free to modify):
+def load_conditions(xlsx_path):
+    key_ = os.path.abspath(xlsx_path)
+    if key_ not in loaded_tables:
+        table_ = read_cache(xlsx_path)
+        if table_ is None:
+            print('compiling condition file ' + xlsx_path)
+            table_ = compile_table(xlsx_path)
+        loaded_tables[key_] = table_
+    return loaded_tables[key_].copy()
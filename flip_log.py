@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Per-frame flip timestamps.
+Every window.flip() time is stored in a preallocated ring buffer together with the trial it belongs to, the trial phase
+and the draw flags of what is on screen from that flip on. Each trial can then be summarized (longest inter-flip
+interval, frames over 1.5x the nominal period, measured stimulus on/off times), and its flips written to a frame log.
+Original date: 2026-10-18
+"""
+
+from __future__ import division
+import numpy as np
+
+## Trial phases:
+PH_FIX = 0  # fixation before the stimuli (pre-trial fixation in pm, prestimulus period in meg)
+PH_INT1 = 1  # first interval (the stimulus period in meg)
+PH_INT2 = 2  # second interval
+PH_POSTFIX = 3  # fixation after an interval (poststimulus period in meg)
+PH_RESP = 4  # response screens
+PH_ITI = 5  # inter-trial prompt
+PHASE_NAMES = ['fix', 'int1', 'int2', 'postfix', 'resp', 'iti']
+# Phases in which every frame is timed, i.e., in which consecutive flips should be one frame apart:
+TIMED_PHASES = (PH_FIX, PH_INT1, PH_INT2, PH_POSTFIX)
+
+# A frame counts as late if its flip comes more than this many nominal periods after the previous one:
+LATE_FACTOR = 1.5
+
+FLIP_DTYPE = [('t', 'f8'), ('trial', 'i4'), ('phase', 'i1'), ('shown', 'u1')]
+
+
+class FlipRecorder(object):
+    """
+    Ring buffer of flips. 'phase' and 'shown' describe the frame that becomes visible at the flip, i.e., the one drawn
+    before it: its trial phase and the draw flags of its stimuli. A late flip thus counts against the phase of the
+    frame it brings up. Only the flips of the current trial are summarized, so the capacity only has to exceed the
+    number of flips in the longest trial.
+    """
+
+    def __init__(self, frame_rate, capacity=2 ** 16):
+        self.period = 1 / frame_rate
+        self.capacity = capacity
+        self.t = np.zeros(capacity)
+        self.trial = np.zeros(capacity, dtype=np.int32)
+        self.phase = np.zeros(capacity, dtype=np.int8)
+        self.shown = np.zeros(capacity, dtype=np.uint8)
+        self.n_flips = 0  # total number of flips recorded
+        self.trial_beg = 0  # flip count at the start of the current trial
+
+    def record(self, t, trial, phase, shown=0):
+        indx_ = self.n_flips % self.capacity
+        self.t[indx_] = t
+        self.trial[indx_] = trial
+        self.phase[indx_] = phase
+        self.shown[indx_] = shown
+        self.n_flips += 1
+
+    # Mark the start of a new trial (before its first flip):
+    def begin_trial(self):
+        self.trial_beg = self.n_flips
+
+    # Buffer positions of the flips of the current trial:
+    def trial_indices(self):
+        n_ = min(self.n_flips - self.trial_beg, self.capacity)
+        return (self.n_flips - n_ + np.arange(n_)) % self.capacity
+
+    # A copy of the flips of the current trial, as a structured array (for the frame log):
+    def trial_flips(self):
+        indx_ = self.trial_indices()
+        flips_ = np.zeros(len(indx_), dtype=FLIP_DTYPE)
+        flips_['t'] = self.t[indx_]
+        flips_['trial'] = self.trial[indx_]
+        flips_['phase'] = self.phase[indx_]
+        flips_['shown'] = self.shown[indx_]
+        return flips_
+
+    # Inter-flip intervals between consecutive timed flips of the current trial, in s, with the phase of the later flip
+    # (only those whose later flip brings up a frame of the given phases):
+    def trial_ifis(self, phases=TIMED_PHASES):
+        indx_ = self.trial_indices()
+        timed_ = np.isin(self.phase[indx_], TIMED_PHASES)
+        both_timed_ = timed_[1:] & timed_[:-1] & np.isin(self.phase[indx_][1:], phases)
+        return np.diff(self.t[indx_])[both_timed_], self.phase[indx_][1:][both_timed_]
+
+    # The number of late frames in the given phases of the current trial:
+    def n_late(self, phases=TIMED_PHASES):
+        ifis_, ifi_phases_ = self.trial_ifis(phases)
+        return int(np.sum(ifis_ > LATE_FACTOR * self.period))
+
+    # The number of late frames while the stimuli with any of the given draw flags are up, from the first frame of the
+    # first one to the last frame of the last one: the late flips that lengthen a stimulus or the SOA. (Late frames
+    # before or after them, e.g., in the buffers of the interval or in the fixation, leave the stimuli as planned.)
+    def n_late_stim(self, flags):
+        indx_ = self.trial_indices()
+        on_ = np.flatnonzero(self.shown[indx_] & flags)
+        if len(on_) == 0:
+            return 0
+        # (the i-th interval is the time the i-th frame stays on)
+        ifis_ = np.diff(self.t[indx_])[on_[0]:on_[-1] + 1]
+        return int(np.sum(ifis_ > LATE_FACTOR * self.period))
+
+    # Flip times at which the stimuli with any of the given draw flags appear and disappear (NaN if never shown):
+    def stim_times(self, flags):
+        indx_ = self.trial_indices()
+        on_ = np.flatnonzero(self.shown[indx_] & flags)
+        if len(on_) == 0:
+            return np.nan, np.nan
+        off_ = on_[-1] + 1
+        if off_ < len(indx_):
+            return self.t[indx_[on_[0]]], self.t[indx_[off_]]
+        return self.t[indx_[on_[0]]], np.nan
+
+    # Summary columns of the current trial; stim_flags maps a column prefix (e.g., 'stim1') to its draw flags:
+    def trial_summary(self, stim_flags):
+        ifis_, ifi_phases_ = self.trial_ifis()
+        summary_ = {'max_ifi_ms': np.max(ifis_) * 1000 if len(ifis_) else np.nan,
+                    'n_late_fr': int(np.sum(ifis_ > LATE_FACTOR * self.period))}
+        for prefix_, flags_ in stim_flags.items():
+            summary_[prefix_ + '_on_t'], summary_[prefix_ + '_off_t'] = self.stim_times(flags_)
+        return summary_
+
+
+class FlipLogFile(object):
+    """
+    Frame log: one CSV line per flip (time, trial, phase, shown flags), appended a trial at a time.
+    """
+
+    def __init__(self, path):
+        self.out_file = open(path, 'w')
+        self.out_file.write(','.join(name_ for name_, fmt_ in FLIP_DTYPE) + '\n')
+
+    def write(self, flips):
+        np.savetxt(self.out_file, flips, fmt=['%.6f', '%d', '%d', '%d'], delimiter=',')
+        self.out_file.flush()
+
+    def close(self):
+        self.out_file.close()
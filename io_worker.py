@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Background output thread.
+Disk writes and console output are handed to a worker thread through a bounded queue, so the rendering thread only
+ever enqueues a (function, arguments) record. flush() is a barrier: it returns once everything enqueued before it has
+been carried out.
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+import os
+import queue
+import threading
+
+
+class OutputWorker(object):
+    """
+    Runs output tasks on a daemon thread, in the order they were submitted. If the queue is full, submit() waits for
+    the worker (back-pressure) rather than dropping records. An exception raised by a task is kept and re-raised by the
+    next flush(), so failed writes are never silent.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.tasks = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='output-worker')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            task_ = self.tasks.get()
+            try:
+                if task_ is None:
+                    return
+                fn_, args_, kwargs_ = task_
+                fn_(*args_, **kwargs_)
+            except Exception as error_:
+                if self.error is None:
+                    self.error = error_
+            finally:
+                self.tasks.task_done()
+
+    # Queue a call to be made on the worker thread:
+    def submit(self, fn, *args, **kwargs):
+        self.tasks.put((fn, args, kwargs))
+
+    # Console output (same arguments as print):
+    def log(self, *args, **kwargs):
+        self.submit(print, *args, **kwargs)
+
+    # Directory creation, quietly skipped if the directory exists:
+    def makedirs(self, path):
+        self.submit(makedirs, path)
+
+    # Wait until all the queued tasks have been carried out:
+    def flush(self):
+        self.tasks.join()
+        if self.error is not None:
+            error_, self.error = self.error, None
+            raise error_
+
+    # Flush and stop the worker:
+    def close(self):
+        if self.thread.is_alive():
+            self.tasks.put(None)
+            self.thread.join()
+        if self.error is not None:
+            error_, self.error = self.error, None
+            raise error_
+
+
+def makedirs(path):
+    if not os.path.exists(path):
+        os.makedirs(path)
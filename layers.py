@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+Static screen layers.
+Stimuli that do not change within a trial phase are drawn once, at startup, into the back buffer and captured as a
+single image (a BufferImageStim), so that a frame draws one image instead of every stimulus again. The back buffer is
+cleared after each capture, so baking never shows up on screen.
+Original date: 2026-10-18
+"""
+
+from __future__ import division
+from psychopy import visual
+
+
+# A capture rectangle, [left, top, right, bottom] in norm units, from its center and half-size in pixels:
+def norm_rect(window, center_px, half_size_px):
+    half_w_, half_h_ = window.size[0] / 2, window.size[1] / 2
+    return [(center_px[0] - half_size_px) / half_w_, (center_px[1] + half_size_px) / half_h_,
+            (center_px[0] + half_size_px) / half_w_, (center_px[1] - half_size_px) / half_h_]
+
+
+# The given stimuli, drawn in order and captured as one image (the whole screen unless a rect is given):
+def bake(window, stims, rect=(-1, 1, 1, -1), **kwargs):
+    window.clearBuffer()
+    layer_ = visual.BufferImageStim(window, rect=rect, stim=stims, **kwargs)
+    window.clearBuffer()
+    return layer_
@@ -1,5 +1,6 @@
 ####!/usr/bin/arch -i386 /usr/bin/python # -*- coding: utf-8 -*-
 from __future__ import print_function
+from __future__ import division  # so that 1/3=0.333 instead of 1/3=0
 
 """
 Investigating facilitative and suppressive interactions between stimuli.
@@ -7,59 +8,36 @@ Creator: Egor Ananyev
 Original date: 2019-05-07
 """
 
-from __future__ import division  # so that 1/3=0.333 instead of 1/3=0
 from psychopy import visual, core, event, gui
 import numpy as np
 import os
-import pandas as pd
 from datetime import datetime
+import planner
+from trial_queue import TrialQueue
+import trial_log
+import io_worker
+import flip_log
+import calib
+import cond_cache
+import stim_cache
+import layers
+import triggers
+import cedrus_worker
+import run_clock
 
 ## Initial variables.
 # experiment modes:
 debug = True
 # is Cedrus present?
 cedrus = True
+trigger_pulse_ms = 50  # the pulse duration of the triggers, in ms
 # experiment variables:
 exp_name = 'meg1'
 
 if cedrus:
-    import pyxid
-    devices = pyxid.get_xid_devices()
-    if len(devices) == 0:
-        print('No pyxid devices found.')
-        cedrus = False
-    else:
-        dev = devices[0]  # get the first device to use
-        print(dev)
-        dev.reset_base_timer()
-        dev.reset_rt_timer()
-
-        if dev.is_response_device():
-            while not dev.has_response():
-                dev.poll_for_response()
-
-            response = dev.get_next_response()
-            print(response)
-            dev.clear_response_queue()
-
-        dev.set_pulse_duration(50)  # the pulse duration for activate_line() calls, in (ms)
-
-        sleep_flash = .3
-        # import time
-
-        # "There are up to 16 output lines on XID devices that can be raised in any combination. To raise lines 1 and 7,
-        # for example, you pass in the list: activate_line(lines=[1, 7])."
-        # https://www.psychopy.org/api/hardware/cedrus.html
-
-        for bm in range(0, 7):  # < 256
-            mask = 2 ** bm
-            print("activate_line bitmask: ", mask)
-            # dev.activate_line(lines=[1,3,5,7,9,11,13,15])
-            # In code, consider >> win.callOnFlip(dev.activate_line,[1,2,3])
-            # https://community.cedrus.com/forum/hardware/general/1847-about-the-extra-port
-            dev.activate_line(bitmask=mask)
-            print('sent bitmask ' + str(mask))
-            # time.sleep(sleep_flash)
+    # Discovery, the self-test and response polling run on their own thread, which sends the triggers too (it is
+    # checked for a device before the triggers are set up):
+    dev = cedrus_worker.CedrusWorker(pulse_ms=trigger_pulse_ms, clock=core.getTime)
 
 ## Getting info on the run through GUI:
 exp_info = {u'subj': u'1', u'run': u'1'}  # run==0 is training run
@@ -102,11 +80,14 @@ full_screen = True
 background = [-.0, -.0, -.0]  # unless I'm willing  to mess with the stim lum range, keep this gray
 window = visual.Window(fullscr=full_screen, monitor=screen_name, color='black', units='deg',
                        allowStencil=True, autoLog=False, screen=0, waitBlanking=False)
-if debug:
-    frame_rate = window.getActualFrameRate()
-else:
-    frame_rate = 60
-print('frame rate: ' + str(frame_rate))
+# Measured refresh rate of the monitor profile (cached, and only measured again when stale):
+frame_rate = calib.frame_rate(window, screen_name)
+if cedrus:
+    dev.ready.wait()
+    if not dev.found:  # (raises the error of the worker, if discovery failed)
+        dev.close()
+        cedrus = False
+        print('WARNING! No Cedrus device: the triggers are only logged')
 
 vis_box = visual.Rect(window, width=visible_px[0], height=visible_px[1], lineColor='white', fillColor=background,
                       units='pix', pos=(0, center_y_off_px), opacity=1)
@@ -115,9 +96,12 @@ vis_box = visual.Rect(window, width=visible_px[0], height=visible_px[1], lineCol
 annulus_in_dva = 1
 annulus_out_dva = 10
 stim_sf_cpd = 1  # cycles per degree
-# Initiating the stimulus, a standard Gabor grating:
-stim = visual.GratingStim(window, size=annulus_out_dva, tex='sin', mask='circle', pos=(0, center_y_off_dva),
-                          sf=stim_sf_cpd)
+stim_phase_bins = 32  # phase steps per cycle of the ready-made gratings (None = exact phases)
+stim_cache_size = None  # max. number of gratings kept (None = all; set it when the phase is exact)
+# The stimulus, a standard Gabor grating, made once per orientation, contrast and phase bin of the run plan:
+stims = stim_cache.StimCache(lambda: visual.GratingStim(window, size=annulus_out_dva, tex='sin', mask='circle',
+                                                        pos=(0, center_y_off_dva), sf=stim_sf_cpd),
+                             phase_bins=stim_phase_bins, max_size=stim_cache_size)
 # The inner circle provides the inner side of the annulus:
 annulus_in_circle = visual.Circle(window, radius=annulus_in_dva/2, pos=(0, center_y_off_dva), fillColor=background,
                                   lineColor=background)
@@ -138,6 +122,24 @@ light_sensor_background = visual.Circle(window, radius=30, pos=(light_sensor_off
 light_sensor_stim = visual.Circle(window, radius=3, pos=(light_sensor_off_x, center_y_off_px+light_sensor_off_y),
                                   fillColor=[0, 0, 0], lineColor=[0, 0, 0], units='pix')
 
+## Static layers (everything but the grating), baked once per fixation cross colour and light sensor state:
+fix_colors = ['black', 'white']  # normal and blink trials
+fix_color = 'black'  # colour of the fixation cross on the current frame
+# Whole screen, with the annulus and the fixation cross (the light sensor dot is on during the stimulus frames):
+bg_layers = {}
+# The inside of the annulus, redrawn on top of the grating (masked to the inner circle):
+center_rect = layers.norm_rect(window, (0, center_y_off_px), dg2px(annulus_in_dva / 2))
+center_layers = {}
+for fix_color_ in fix_colors:
+    fix_cross.color = fix_color_
+    for sensor_on_ in [False, True]:
+        bg_layers[fix_color_, sensor_on_] = layers.bake(
+            window, [vis_box, annulus_in_circle, annulus_out_circle, fix_cross, light_sensor_background] +
+            [light_sensor_stim] * sensor_on_)
+    center_layers[fix_color_] = layers.bake(window, [vis_box, annulus_in_circle, fix_cross], rect=center_rect,
+                                            mask='circle', pos=(0, center_y_off_dva))
+fix_cross.color = fix_color
+
 ## Timing variables (note that the number of frames will differ for 60 and 100 Hz refresh rates):
 fix_dur_fr = 2  # in frames
 prestim_t_min_ms = 300  # in milliseconds
@@ -162,25 +164,54 @@ else:
 exp_conditions = 'cond-files/cond_' + exp_name + '.xlsx'
 
 # Trial handler depending on the measure or experimental stage:
-# Note: trials are reset for every block before every trial loop (below)
+# Note: the trials of all blocks are drawn into the run plan once the output directory exists (below)
+
+# Output thread: all disk writes and console output go through it, off the rendering thread:
+output = io_worker.OutputWorker()
+# Triggers are scheduled per trial and sent on their flips (without a device, they are only logged):
+triggers_out = triggers.TriggerScheduler(window, dev if cedrus else None, frame_rate, pulse_ms=trigger_pulse_ms,
+                                         clock=core.getTime, log=output.log)
 
 # Output file:
 exp_dir = '..' + os.sep + 'data' + os.sep + exp_name
 if not os.path.exists(exp_dir):
-    print('experiment directory does not exist - making')
-    os.makedirs(exp_dir)
+    output.log('experiment directory does not exist - making')
+    output.makedirs(exp_dir)
 else:
-    print('experiment directory exists')
+    output.log('experiment directory exists')
 subj_dir = exp_dir + os.sep + 'subj-%04d' % int(exp_info['subj'])
-if not os.path.exists(subj_dir):
-    os.makedirs(subj_dir)
+output.makedirs(subj_dir)
 run_dir = subj_dir + os.sep + 'run-%s_%s' % (exp_info['run'], exp_info['time'])
-if not os.path.exists(run_dir):
-    os.makedirs(run_dir)
+output.makedirs(run_dir)
+output.flush()  # the run directory has to exist before the output files are opened
 out_file_path = run_dir + os.sep + 'beh_out.csv'
 
-# Output matrix:
-output_mat = {}
+# Run plan: all randomized trial variables of all blocks are drawn here, before the first trial, and saved with their
+# seed. The blink schedule runs continuously across blocks.
+plan, plan_seed = planner.plan_meg_run(cond_cache.load_conditions(exp_conditions), num_blocks, frame_rate,
+                                       prestim_t_min_ms, prestim_t_max_ms,
+                                       blink_every_x_trials_min, blink_every_x_trials_max)
+output.submit(planner.save_plan, run_dir + os.sep + 'plan.npz', plan, plan_seed)
+output.log('plan seed: ' + str(plan_seed))
+stims.prebuild(zip(plan['stim_angle'].tolist(), plan['stim_contrast'].tolist(), plan['stim_phase'].tolist()))
+output.log('gratings made: ' + str(len(stims)))
+
+# Output file columns:
+data_columns = ['exp_name', 'frame_rate', 'subj', 'run', 'block', 'trial_id', 'block_trial_id',
+                'trial_beg_ns', 'prestim_t_ms', 'prestim_t_fr', 'blink_trial',  # prestim; "ns"=timestamp
+                'stim_on_ns', 'stim_ori', 'stim_c', 'stim_phase', 'stim_dur_fr', 'stim_off_ns',  # stim info
+                'poststim_t_fr', 'trial_end_ns', 'bitcode', 'anchor_wall_ns',
+                'max_ifi_ms', 'n_late_fr', 'stim_on_t', 'stim_off_t']  # measured timing
+
+# Output log: every completed trial is appended to the output file (and flushed to disk) at the end of the trial:
+trial_writer = trial_log.TrialWriter(out_file_path, data_columns)
+
+# Flip times of every frame, and the frame log they are written to after each trial:
+flip_rec = flip_log.FlipRecorder(frame_rate)
+frame_file = flip_log.FlipLogFile(run_dir + os.sep + 'frames.csv')
+# Issue and send times of the triggers, written after each trial (once sent):
+trigger_writer = trial_log.TrialWriter(run_dir + os.sep + 'triggers.csv', triggers.LOG_COLUMNS)
+stim_flag = 1  # draw flag of the grating in the frame log
 
 # Handling condition instructions:
 instr_text = 'Blink when the cross turns white'
@@ -188,28 +219,14 @@ instr_text_stim = visual.TextStim(window, text=instr_text, height=.6, pos=[0, ce
 
 ## Handy routines:
 
-# Timestamp routine
-def cur_ts():
-    return datetime.now().strftime('%H%M%S%f')
-
-# Return the angle of the orientation
-def stim_ori_angle(stim_ori_):
-    if stim_ori_ == 'L':
-        return 135
-    elif stim_ori_ == 'R':
-        return 45
-    else:
-        exit_routine()
-        return 0
+# Timestamps: integer ns since the start of the run (wall time = anchor_wall_ns + timestamp):
+ts_clock = run_clock.RunClock()
 
 # This is done at every frame update, regardless of trial phase, so predefining:
-def frame_routine():
-    flip_time_ = window.flip()
-    vis_box.draw()
-    annulus_in_circle.draw()
-    annulus_out_circle.draw()
-    fix_cross.draw()
-    light_sensor_background.draw()
+def frame_routine(phase_=flip_log.PH_FIX, shown_=0):
+    flip_time_ = triggers_out.flip()
+    flip_rec.record(flip_time_, tot_trials_done, phase_, shown_)
+    bg_layers[fix_color, False].draw()
     # Checking for quit (the Esc key)
     if event.getKeys(keyList=['escape']):
         exit_routine()
@@ -225,16 +242,24 @@ def exit_routine():
     core.wait(.7)
     window.flip()
 
-    # Behavioural data output:
-    if not output_mat:  # means that the dictionary is empty
+    # Behavioural data output (the trials are already on disk once the output thread is done), with the triggers whose
+    # send times were still to come from the worker:
+    if cedrus:
+        try:
+            dev.close()
+        except Exception as error_:
+            output.log('WARNING! The Cedrus worker failed: ' + repr(error_))
+    for trigger_ in triggers_out.take_log(final=True):
+        output.submit(trigger_writer.write, trigger_)
+    output.submit(trial_writer.close)
+    output.submit(frame_file.close)
+    output.submit(trigger_writer.close)
+    output.close()
+    if trial_writer.n_rows == 0:
         print('\n==================='
               '\nthe output file is empty')
     else:
-        data_columns = ['exp_name', 'frame_rate', 'subj', 'run', 'block', 'trial_id', 'block_trial_id',
-                        'trial_beg_ts', 'prestim_t_ms', 'prestim_t_fr', 'blink_trial',  # prestim; "ts"=timestamp
-                        'stim_on_ts', 'stim_ori', 'stim_c', 'stim_phase', 'stim_dur_fr', 'stim_off_ts',  # stim info
-                        'trial_end_ts', 'bitcode']
-        pd.DataFrame.from_dict(output_mat, orient='index').to_csv(out_file_path, index=False, columns=data_columns)
+        trial_log.csv_to_parquet(out_file_path)
         print('\noutput file path is ' + out_file_path)
 
     # Close the graphics
@@ -253,77 +278,70 @@ event.waitKeys(' ')
 ## Initiating the trial loop
 
 tot_trials_done = 0
-no_blink_trials_count = 0
-cur_blink_trial = blink_every_x_trials_min  # at first, the number of no-blink trials is minimal, but random thereafter
-blink_trial = False
 
 for block in range(num_blocks):
 
-    # Resetting the trials for every block of trials:
-    trials = pd.read_excel(exp_conditions)
     block_trials_done = 0
 
-    while len(trials > 0):
+    # Queue of the rows of the run plan that belong to the current block:
+    trials_left = TrialQueue(np.flatnonzero(plan['block'] == block + 1))
+
+    while len(trials_left) > 0:
+
+        trial = plan[trials_left.pop()]
 
         block_trials_done += 1
-        no_blink_trials_count += 1
         tot_trials_done += 1
-        print('\n======TRIAL#' + str(tot_trials_done) + '======')
-
-        ## Deciding on the number of no-blink trials for the control task:
-        if no_blink_trials_count >= cur_blink_trial:
-            blink_trial = True
-            no_blink_trials_count = 0
-            cur_blink_trial = np.random.randint(low=blink_every_x_trials_min, high=blink_every_x_trials_max+1)
-        else:
-            blink_trial = False
-
-        ## Randomly picking the current trial row, assigning it to 'trial' var, and dropping it from 'trials':
-        cur_trial_indx = int(np.random.choice(trials.index.values, 1))
-        trial = trials.ix[cur_trial_indx].copy()  # an explicit copy() is necessary due to a warning otherwise
-        trials = trials.drop([cur_trial_indx])
-        drop_trial = False
+        flip_rec.begin_trial()
+        output.log('\n======TRIAL#' + str(tot_trials_done) + '======')
+
+        ## Blink trial for the control task (planned at the start of the run):
+        blink_trial = bool(trial['blink_trial'])
 
         ## Stimulus variables:
 
         # Setting the condition bitcode to be passed to MEG:
         bitcode = trial['bitcode']
 
-        # Randomizing whether the stimulus phase:
-        stim_phase = np.random.rand(1)[0]  # phase=1 means one whole cycle; random of [0 to 1] is random phase
-        stim.phase = stim_phase
+        # Random stimulus phase:
+        # phase=1 means one whole cycle; random of [0 to 1] is random phase (as shown, i.e., rounded to its bin):
+        stim_phase = stims.phase_bin(trial['stim_phase'])
 
         # Stimulus contrast / opacity:
         stim_c = trial['stim_c']  # stimulus contrast
-        stim.contrast = stim_c * 0.01
 
         # Stimulus orientation:
         stim_ori = trial['stim_ori']
-        stim.ori = stim_ori_angle(stim_ori)
+
+        # The grating with this trial's orientation, contrast and phase:
+        stim = stims.get(trial['stim_angle'], trial['stim_contrast'], stim_phase)
 
         # Stimulus duration:
-        stim_dur_fr = trial['stim_dur']
+        stim_dur_fr = trial['stim_dur_fr']
 
         ## Timing variables.
 
-        # Randomizing the onset:
-        prestim_t_ms = np.random.randint(low=prestim_t_min_ms, high=prestim_t_max_ms)
+        # Randomized onset:
+        prestim_t_ms = trial['prestim_t_ms']
 
         ## Print trial specifics to screen:
-        print('ori=' + str(stim_ori) + ' c=' + str(stim_c) + ' dur=' + str(stim_dur_fr) +
-              ' phase=' + str(stim_phase) + ' prestim=' + str(prestim_t_ms), ' blink=', str(blink_trial),
-              ' bitcode=' + str(bitcode))
+        output.log('ori=' + str(stim_ori) + ' c=' + str(stim_c) + ' dur=' + str(stim_dur_fr) +
+                   ' phase=' + str(stim_phase) + ' prestim=' + str(prestim_t_ms) + ' blink=' + str(blink_trial) +
+                   ' bitcode=' + str(bitcode))
 
         ## Pre-stimulus phase:
-        if cedrus:
-            # dev.activate_line(lines=[1])  # line 1 = trial onset
-            window.callOnFlip(dev.activate_line, bitmask=1)  # line 1
-        trial_beg_ts = cur_ts()  # time stamp
-        prestim_t_fr = int(np.round(frame_rate * prestim_t_ms / 1000))
+        prestim_t_fr = trial['prestim_t_fr']
+        # Both triggers of the trial are scheduled before its first flip, so that any overlap is known ahead:
+        # line 1 = trial onset, on the first prestimulus flip; the condition bitcode on the first stimulus-loop flip.
+        triggers_out.schedule(1, 1, tot_trials_done)
+        triggers_out.schedule(bitcode, prestim_t_fr + 1, tot_trials_done)
+        trial_beg_ns = ts_clock.now()  # time stamp
         if blink_trial:
-            fix_cross.color = 'white'
+            fix_color = 'white'
+        shown = 0  # draw flags of what is on screen
+        shown_phase = flip_log.PH_FIX  # and the trial phase it belongs to
         for cur_frame in range(prestim_t_fr):
-            flip_time = frame_routine()
+            flip_time = frame_routine(shown_phase, shown)
             # flip_time = window.flip()
             # annulus_in_circle.draw()
             # annulus_out_circle.draw()
@@ -334,8 +352,8 @@ for block in range(num_blocks):
             #     exit_routine()
 
         ## Presentation phase
-        if cedrus:
-            window.callOnFlip(dev.activate_line, bitmask=bitcode)
+        # (the bitcode trigger goes out on the first flip below)
+        # if cedrus:
             # line2 = stimulus onset; having a separate trigger to use it as a reference line for online averaging
             # if stim_ori == 'L':
                 # dev.activate_line(lines=[2, 3], leave_remaining_lines=True)  # line3 = left-leaning stimulus onset
@@ -345,21 +363,21 @@ for block in range(num_blocks):
                 # dev.activate_line(lines=[2, 4], leave_remaining_lines=True)  # line4 = right-leaning stimulus onset
                 # window.callOnFlip(dev.activate_line, bitmask=10)  # lines 2 and 4
                 # window.callOnFlip(dev.activate_line, bitmask=4)  # line 3 only, if using light sensor
-        stim_on_ts = cur_ts()
+        stim_on_ns = ts_clock.now()
         # Iterating through frames:
         for cur_frame in range(stim_dur_fr):
             # Writing out the frame routine here since the fixation stuff needs to appear on top of stim
-            flip_time = window.flip()
-            vis_box.draw()
+            flip_time = triggers_out.flip()
+            flip_rec.record(flip_time, tot_trials_done, shown_phase, shown)
+            # The background, with the visual event marker for Cedrus:
+            bg_layers[fix_color, True].draw()
             # Drawing the stimulus:
             stim.draw()
+            shown = stim_flag
+            shown_phase = flip_log.PH_INT1
             # The said fixation stuff:
-            annulus_in_circle.draw()
+            center_layers[fix_color].draw()
             annulus_out_circle.draw()
-            fix_cross.draw()
-            # Visual event marker for Cedrus:
-            light_sensor_background.draw()
-            light_sensor_stim.draw()
         # Stimulus offset:
         # if cedrus:
             # dev.clear_line(lines=[2])  # stimulus offset
@@ -371,27 +389,39 @@ for block in range(num_blocks):
             # consider dropping if using a light sensor
 
         ## Post-stimulus fixation phase:
-        stim_off_ts = cur_ts()
+        stim_off_ns = ts_clock.now()
         if blink_trial:
-            fix_cross.color = 'black'
+            fix_color = 'black'
         for cur_frame in range(poststim_t_fr):
-            flip_time = frame_routine()
+            flip_time = frame_routine(shown_phase, shown)
+            shown = 0
+            shown_phase = flip_log.PH_POSTFIX
 
         ## Trial end:
         # if cedrus:
         #     dev.clear_line(lines=[0])  # trial offset
-        trial_end_ts = cur_ts()  # time stamp
+        trial_end_ns = ts_clock.now()  # time stamp
+        flip_summary = flip_rec.trial_summary({'stim': stim_flag})
 
         ## Recording the data
-        output_mat[tot_trials_done - 1] = {'exp_name': exp_name, 'datetime': exp_info['time'], 'frame_rate': frame_rate,
-                                           'subj': exp_info['subj'], 'run': run, 'block': block+1,
-                                           'trial_id': tot_trials_done, 'block_trial_id': block_trials_done,
-                                           'trial_beg_ts': trial_beg_ts, 'prestim_t_ms': prestim_t_ms,
-                                           'prestim_t_fr': prestim_t_fr, 'blink_trial': int(blink_trial),
-                                           'stim_on_ts': stim_on_ts, 'stim_ori': stim_ori,
-                                           'stim_c': stim_c, 'stim_phase': stim_phase,
-                                           'stim_dur_fr': stim_dur_fr, 'stim_off_ts': stim_off_ts,
-                                           'trial_end_ts': trial_end_ts, 'bitcode': bitcode}
+        trial_out = {'exp_name': exp_name, 'datetime': exp_info['time'], 'frame_rate': frame_rate,
+                     'subj': exp_info['subj'], 'run': run, 'block': block+1,
+                     'trial_id': tot_trials_done, 'block_trial_id': block_trials_done,
+                     'trial_beg_ns': trial_beg_ns, 'prestim_t_ms': prestim_t_ms,
+                     'prestim_t_fr': prestim_t_fr, 'blink_trial': int(blink_trial),
+                     'stim_on_ns': stim_on_ns, 'stim_ori': stim_ori,
+                     'stim_c': stim_c, 'stim_phase': stim_phase,
+                     'stim_dur_fr': stim_dur_fr, 'stim_off_ns': stim_off_ns,
+                     'poststim_t_fr': poststim_t_fr, 'trial_end_ns': trial_end_ns, 'bitcode': bitcode,
+                     'anchor_wall_ns': ts_clock.anchor_wall_ns}
+        trial_out.update(flip_summary)
+        output.submit(trial_writer.write, trial_out)
+        output.submit(frame_file.write, flip_rec.trial_flips())
+        for trigger_ in triggers_out.take_log():
+            output.submit(trigger_writer.write, trigger_)
+        if cedrus:
+            for resp_t_, resp_ in dev.get_responses():
+                output.log('Cedrus response: ' + str(resp_))
 
 # Finishing the experiment
 exit_routine()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Block-level trial plans.
+All the randomized trial variables of a block (order, jitter, location, phase, prestimulus time, blink trials) are
+drawn once, before the first trial, into a structured array with one row per trial in presentation order. The trial
+loops then only read rows, and a saved plan can be inspected without running the session.
+Original date: 2026-10-18
+"""
+
+from __future__ import division
+import numpy as np
+
+## Stimulus orientation codes and the corresponding grating angles:
+ORI_ANGLES = {'L': 135, 'R': 45}
+
+## Row layouts of the plans:
+PM_PLAN_DTYPE = [('trial', 'i4'), ('cond_idx', 'i4'), ('soa', 'f8'),
+                 ('stim1_ori', 'U1'), ('stim2_ori', 'U1'), ('stim1_angle', 'f8'), ('stim2_angle', 'f8'),
+                 ('stim1_c', 'f8'), ('stim2_c', 'f8'), ('stim1_contrast', 'f8'), ('stim2_contrast', 'f8'),
+                 ('stim_loc_R2', 'i1'), ('stim_loc', 'U3'), ('jitter', 'i4')]
+MEG_PLAN_DTYPE = [('trial', 'i4'), ('block', 'i4'), ('block_trial_id', 'i4'), ('cond_idx', 'i4'),
+                  ('stim_ori', 'U1'), ('stim_angle', 'f8'), ('stim_c', 'f8'), ('stim_contrast', 'f8'),
+                  ('stim_phase', 'f8'), ('stim_dur_fr', 'i4'), ('prestim_t_ms', 'i4'), ('prestim_t_fr', 'i4'),
+                  ('blink_trial', 'i1'), ('bitcode', 'i4')]
+
+## Handy routines:
+
+# A fresh seed, drawn from the global generator so that seeding numpy at the top of a script still fixes the plan:
+def new_seed():
+    return int(np.random.randint(2 ** 31 - 1))
+
+# Grating angles for an array of orientation codes:
+def ori_angles(stim_ori):
+    stim_ori_ = np.asarray(stim_ori).astype(str)
+    unknown_ = set(stim_ori_) - set(ORI_ANGLES)
+    if unknown_:
+        raise ValueError('unrecognized stimulus orientation(s): ' + ', '.join(sorted(unknown_)))
+    return np.array([ORI_ANGLES[ori_] for ori_ in stim_ori_], dtype=float)
+
+# Plan of a pm block; the SOA is converted to frames as soa * soa_scale, plus soa_pad for non-zero SOAs (which has to
+# come out as a whole number of frames):
+def plan_pm_block(trials, wiggle, para, soa_scale=1, soa_pad=0, seed=None):
+    if seed is None:
+        seed = new_seed()
+    rng_ = np.random.RandomState(seed)
+    n_ = len(trials)
+    order_ = rng_.permutation(n_)
+    plan_ = np.zeros(n_, dtype=PM_PLAN_DTYPE)
+    plan_['trial'] = np.arange(1, n_ + 1)
+    plan_['cond_idx'] = order_
+    # Condition variables:
+    soa_ = trials['SOA'].values[order_] * soa_scale
+    soa_[soa_ > 0] += soa_pad
+    fractional_ = sorted(set(soa_[soa_ != np.round(soa_)]))
+    if fractional_:
+        raise ValueError('SOA(s) of a fraction of a frame: ' + ', '.join(str(value_) for value_ in fractional_))
+    plan_['soa'] = soa_
+    for stim_ in ['stim1', 'stim2']:
+        plan_[stim_ + '_ori'] = trials[stim_ + '_ori'].values[order_].astype(str)
+        plan_[stim_ + '_angle'] = ori_angles(plan_[stim_ + '_ori'])
+        plan_[stim_ + '_c'] = trials[stim_ + '_c'].values[order_]  # log scaled
+        plan_[stim_ + '_contrast'] = 10 ** plan_[stim_ + '_c']
+    # Randomized variables: left/right (or 1st/2nd interval) and the jitter of the first stimulus onset:
+    plan_['stim_loc_R2'] = rng_.randint(2, size=n_)
+    if para == 'loc':
+        plan_['stim_loc'] = np.where(plan_['stim_loc_R2'], 'R', 'L')
+    else:
+        plan_['stim_loc'] = np.where(plan_['stim_loc_R2'], '2nd', '1st')
+    plan_['jitter'] = rng_.randint(int(wiggle) + 1, size=n_)  # the jitter could be zero
+    return plan_, seed
+
+# Plan of a meg run: num_blocks repetitions of the condition table, with the blink schedule running across blocks:
+def plan_meg_run(trials, num_blocks, frame_rate, prestim_t_min_ms, prestim_t_max_ms, blink_min, blink_max,
+                 seed=None):
+    if seed is None:
+        seed = new_seed()
+    rng_ = np.random.RandomState(seed)
+    n_cond_ = len(trials)
+    plan_ = np.zeros(n_cond_ * num_blocks, dtype=MEG_PLAN_DTYPE)
+    plan_['trial'] = np.arange(1, len(plan_) + 1)
+    plan_['block'] = np.repeat(np.arange(1, num_blocks + 1), n_cond_)
+    plan_['block_trial_id'] = np.tile(np.arange(1, n_cond_ + 1), num_blocks)
+    order_ = np.concatenate([rng_.permutation(n_cond_) for block_ in range(num_blocks)])
+    plan_['cond_idx'] = order_
+    # Condition variables:
+    plan_['stim_ori'] = trials['stim_ori'].values[order_].astype(str)
+    plan_['stim_angle'] = ori_angles(plan_['stim_ori'])
+    plan_['stim_c'] = trials['stim_c'].values[order_]
+    plan_['stim_contrast'] = plan_['stim_c'] * 0.01
+    plan_['stim_dur_fr'] = trials['stim_dur'].values[order_]
+    plan_['bitcode'] = trials['bitcode'].values[order_]
+    # Random phase: phase=1 means one whole cycle:
+    plan_['stim_phase'] = rng_.rand(len(plan_))
+    # Randomized onset:
+    plan_['prestim_t_ms'] = rng_.randint(low=prestim_t_min_ms, high=prestim_t_max_ms, size=len(plan_))
+    plan_['prestim_t_fr'] = np.round(frame_rate * plan_['prestim_t_ms'] / 1000)
+    # Blink trials: at first, the number of no-blink trials is minimal, but random thereafter:
+    no_blink_trials_count_ = 0
+    cur_blink_trial_ = blink_min
+    for trial_ in range(len(plan_)):
+        no_blink_trials_count_ += 1
+        if no_blink_trials_count_ >= cur_blink_trial_:
+            plan_['blink_trial'][trial_] = 1
+            no_blink_trials_count_ = 0
+            cur_blink_trial_ = rng_.randint(low=blink_min, high=blink_max + 1)
+    return plan_, seed
+
+# Save a plan and its seed next to the behavioural output, and read it back:
+def save_plan(path, plan, seed):
+    np.savez(path, plan=plan, seed=seed)
+
+def load_plan(path):
+    with np.load(path) as plan_file_:
+        return plan_file_['plan'], int(plan_file_['seed'])
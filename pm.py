@@ -1,5 +1,6 @@
 ####!/usr/bin/arch -i386 /usr/bin/python # -*- coding: utf-8 -*-
 from __future__ import print_function
+from __future__ import division  # so that 1/3=0.333 instead of 1/3=0
 
 """
 Investigating facilitative and suppressive interactions between stimuli.
@@ -7,12 +8,23 @@ Creator: Egor Ananyev
 Original date: 2019-05-07
 """
 
-from __future__ import division  # so that 1/3=0.333 instead of 1/3=0
 from psychopy import visual, core, event, gui
 import numpy as np
 import os
-import pandas as pd
 from datetime import datetime
+import schedule
+import planner
+import trial_log
+import io_worker
+import flip_log
+import calib
+import cond_cache
+import stim_cache
+import layers
+import responses
+import quest
+import adaptive_design
+from trial_queue import TrialQueue
 
 ## Initial variables.
 # experiment modes:
@@ -20,6 +32,13 @@ shocky = True
 debug = False  # sets SOA to stim_dur+10 and lengthens stim_dur
 # experiment variables:
 exp_name = 'pm1'
+# threshold blocks (pm1): the contrast of one of the stimuli comes from an adaptive (Psi) track instead of the table,
+# with one track per SOA and varied stimulus; the other stimulus keeps the reference contrast of the table:
+adaptive = False
+adaptive_ref_c = -1.2  # log scaled, as in cond_pm1_thresh.xlsx
+# adaptive design (pm1): each trial is run in the (SOA, stim1_c, stim2_c) cell of the table that is expected to tell
+# the most about the masking function; the table still sets the number of trials, orientations and locations:
+bayes_design = False
 # stimulus parameters:
 stim_diam = 1.5  # for Shocky's Samsung monitor, a 5 deg stim = 6.3 cm
 stim_sf = 4  # cycles per degree (e.g., for a 5 deg stim, there will be 5 cycles)
@@ -37,6 +56,10 @@ wiggle = 10  # additional 'wiggle room' for jittering of stimulus onset
 interval_dur = int(stim_dur * 2 + beg_buff + end_buff + wiggle)  # 34 frames, or 340 ms
 # trial duration:
 resp_feedback_wait = 0.2
+# the number of times a trial can be dropped (and put back) before it is discarded:
+max_drops = 5
+# the number of trials per block that can be dropped (and put back) because of late frames while the stimuli are up:
+max_timing_drops = 20
 
 # Reassign stimulus durations for the slower refresh rate:
 if shocky:
@@ -81,6 +104,12 @@ if exp_info['block'] == '0':
     train = True
 else:
     train = False
+if adaptive and (train or exp_name != 'pm1'):
+    print('adaptive thresholds are only run in pm1 test blocks')
+    adaptive = False
+if bayes_design and (train or exp_name != 'pm1' or adaptive):
+    print('the adaptive design is only run in pm1 test blocks, without adaptive thresholds')
+    bayes_design = False
 
 # Handling condition instructions:
 if para == 'loc':
@@ -111,31 +140,77 @@ else:
 # Condition file:
 if train:
     exp_conditions = 'cond-files/cond_' + exp_name + '_train' + '.xlsx'
+elif adaptive:
+    exp_conditions = 'cond-files/cond_' + exp_name + '_thresh' + '.xlsx'
 else:
     exp_conditions = 'cond-files/cond_' + exp_name + '.xlsx'
 
 # Trial handler depending on the measure or experimental stage:
 # trials = pd.read_excel('C:\Users\egora\Dropbox\Projects\pm\pm\cond-files\cond_pm1_train.xlsx')
-trials = pd.read_excel(exp_conditions)
-trials['drops'] = 0
+trials = cond_cache.load_conditions(exp_conditions)
+
+# Output thread: all disk writes and console output go through it, off the rendering thread:
+output = io_worker.OutputWorker()
 
 # Output file:
 exp_dir = '..' + os.sep + 'data' + os.sep + exp_name + '_' + para
 if not os.path.exists(exp_dir):
-    print('experiment directory does not exist')
-    os.makedirs(exp_dir)
+    output.log('experiment directory does not exist')
+    output.makedirs(exp_dir)
 else:
-    print('experiment directory exists')
+    output.log('experiment directory exists')
 subj_dir = exp_dir + os.sep + 'subj-%02d' % int(exp_info['subj'])
-if not os.path.exists(subj_dir):
-    os.makedirs(subj_dir)
+output.makedirs(subj_dir)
 block_dir = subj_dir + os.sep + 'block-%s_%s' % (exp_info['block'], exp_info['time'])
-if not os.path.exists(block_dir):
-    os.makedirs(block_dir)
+output.makedirs(block_dir)
+output.flush()  # the block directory has to exist before the output files are opened
 out_file_path = block_dir + os.sep + 'beh_out.csv'
 
-# Output matrix:
-output_mat = {}
+# Block plan: all randomized trial variables are drawn here, before the first trial, and saved with their seed:
+if shocky:
+    soa_scale = .5
+else:
+    soa_scale = 1
+if debug:
+    soa_pad = stim_dur
+else:
+    soa_pad = 0
+plan, plan_seed = planner.plan_pm_block(trials, wiggle, para, soa_scale=soa_scale, soa_pad=soa_pad)
+output.submit(planner.save_plan, block_dir + os.sep + 'plan.npz', plan, plan_seed)
+output.log('plan seed: ' + str(plan_seed))
+
+# Adaptive tracks, by (SOA, varied stimulus); the varied stimulus is the one off the reference contrast (the second one
+# if both are on it):
+if adaptive:
+    plan_varied = np.where(plan['stim1_c'] != adaptive_ref_c, 1, 2)
+    tracks = {track_: quest.Psi() for track_ in sorted(set(zip(plan['soa'].tolist(), plan_varied.tolist())))}
+    output.log(str(len(tracks)) + ' adaptive tracks')
+
+# Output file columns:
+data_columns = ['exp_name', 'frame_rate', 'stim_dur', 'beg_buff', 'end_buff', 'wiggle',  # experiment specs
+                'subj', 'block', 'trial_id',  # log info
+                'soa', 'stim1_ori', 'stim2_ori', 'stim1_c', 'stim2_c',  # stim info
+                'stim_loc', 'jitter',  # randomized variables
+                'resp_num', 'resp_loc', 'resp_ori', 'drops',  # subj resp
+                'rt_num', 'rt_loc', 'rt_ori',  # response times, in s from the response screen flip
+                'max_ifi_ms', 'n_late_fr', 'stim1_on_t', 'stim1_off_t', 'stim2_on_t', 'stim2_off_t']  # timing
+if adaptive:
+    # The track of the trial, and its threshold estimate after the response:
+    data_columns += ['varied_stim', 'correct', 'thresh', 'thresh_sd', 'slope']
+if bayes_design:
+    # The cell of the trial, and the estimates of the masking function after the response:
+    data_columns += ['design_cell', 'correct'] + [name_ + sd_ for name_ in adaptive_design.PARAM_NAMES
+                                                  for sd_ in ['', '_sd']]
+
+# Output log: every completed trial is appended to the output file (and flushed to disk) during the ITI:
+trial_writer = trial_log.TrialWriter(out_file_path, data_columns)
+# Dropped trials are logged separately, with the reason they were dropped:
+drop_writer = trial_log.TrialWriter(block_dir + os.sep + 'drop_out.csv', data_columns + ['drop_reason'])
+# Final estimates of the adaptive tracks, written on exit:
+if adaptive:
+    thresh_writer = trial_log.TrialWriter(block_dir + os.sep + 'thresholds.csv',
+                                          ['soa', 'varied_stim', 'n_trials', 'n_correct', 'thresh', 'thresh_sd',
+                                           'slope', 'slope_sd'])
 
 ## Monitor setup:
 if shocky:
@@ -145,17 +220,21 @@ else:
     window = visual.Window(fullscr=full_screen, monitor=screen_name, color=[-.5, -.5, -.5], units='deg',
                            allowStencil=True, autoLog=False, screen=0, waitBlanking=False)
 
-if shocky:
-    if debug:
-        frame_rate = window.getActualFrameRate()
-        print('frame rate: ' + str(frame_rate))
-    else:
-        frame_rate = 60
-else:
-    frame_rate = window.getActualFrameRate()
-    print('frame rate: ' + str(frame_rate))
-    if frame_rate < 100:
-        print('WARNING! The measured frame rate is lower than expected')
+# Measured refresh rate of the monitor profile (cached, and only measured again when stale):
+frame_rate = calib.frame_rate(window, screen_name)
+if not shocky and frame_rate < 100:
+    output.log('WARNING! The measured frame rate is lower than expected')
+
+# Adaptive design: the cells are the (SOA, contrast) combinations of the plan, with the SOA in ms for the model:
+if bayes_design:
+    design_cells = np.unique(plan[['soa', 'stim1_c', 'stim2_c']])
+    design = adaptive_design.MaskingDesign(design_cells['soa'] / frame_rate * 1000, design_cells['stim1_c'],
+                                           design_cells['stim2_c'], seed=plan_seed)
+    output.log(str(len(design_cells)) + ' design cells')
+
+# Flip times of every frame, and the frame log they are written to after each trial:
+flip_rec = flip_log.FlipRecorder(frame_rate)
+frame_file = flip_log.FlipLogFile(block_dir + os.sep + 'frames.csv')
 
 ## Initialize the stimuli and instructions
 space_text = "\n\nPress the spacebar to start"
@@ -163,10 +242,22 @@ instr_text = cond_instr + space_text
 instr_text_stim = visual.TextStim(window, text=instr_text, height=.6, pos=[0, 1])
 fix_cross = visual.TextStim(window, text='+', bold='True', pos=[0, 0], rgb=1, height=fix_size)
 
-# Target:
-stim1 = visual.GratingStim(window, size=stim_diam, tex='sin', mask='gauss', pos=(0, 0), sf=stim_sf)
-stim2 = visual.GratingStim(window, size=stim_diam, tex='sin', mask='gauss', pos=(0, 0), sf=stim_sf)
+# Target: one grating per orientation & contrast of the block plan, made before the first trial:
+stims = stim_cache.StimCache(lambda: visual.GratingStim(window, size=stim_diam, tex='sin', mask='gauss', pos=(0, 0),
+                                                        sf=stim_sf))
+stims.prebuild(set(zip(plan['stim1_angle'].tolist(), plan['stim1_contrast'].tolist())) |
+               set(zip(plan['stim2_angle'].tolist(), plan['stim2_contrast'].tolist())))
+if adaptive:
+    # Every contrast the tracks can pick, in both orientations:
+    stims.prebuild([(angle_, 10 ** c_) for angle_ in planner.ORI_ANGLES.values() for c_ in quest.STIM_GRID])
+
 box = visual.Rect(window, width=5, height=5, lineColor='white')
+# Separate boxes for each interval, so that no line colour is changed during the presentation phase:
+box_int1 = visual.Rect(window, width=5, height=5, lineColor='blue')
+box_int2 = visual.Rect(window, width=5, height=5, lineColor='red')
+# The trial phase of every frame of the schedule (the same for all trials):
+sched_phases = ([flip_log.PH_INT1] * interval_dur + [flip_log.PH_POSTFIX] * fix_dur +
+                [flip_log.PH_INT2] * interval_dur + [flip_log.PH_POSTFIX] * fix_dur)
 
 # Response buttons & text:
 text_size = .6
@@ -206,7 +297,7 @@ elif para == 'loc':
 else:
     button_text_left = ''
     button_text_right = ''
-    print('ERROR: Paradigm string not recognized!')
+    output.log('ERROR: Paradigm string not recognized!')
 resp_loc_button1 = visual.Rect(window, width=button_dim[0], height=button_dim[1], pos=button1_pos)
 resp_loc_button1_text = visual.TextStim(window, text=button_text_left, height=text_size, pos=text1_pos)
 resp_loc_button2 = visual.Rect(window, width=button_dim[0], height=button_dim[1], pos=button3_pos)
@@ -233,164 +324,83 @@ resp_ori_button3_text = visual.TextStim(window, text='right tilt', height=text_s
 # The response buttons will remain in place: I won't make them toglable at this stage, but they won't render during
 # trials if they are not required.
 
-## Number of stimuli response buttons:
-def resp_num_draw():
-    # Confidence rendering:
-    resp_num_text.draw()
-    resp_num_button1.draw()
-    button1_arrow.draw()
-    resp_num_button1_text.draw()
-    resp_num_button2.draw()
-    button2_arrow.draw()
-    resp_num_button2_text.draw()
-    resp_num_button3.draw()
-    button3_arrow.draw()
-    resp_num_button3_text.draw()
-
-def resp_num_monitor():
-    # Monitoring for key presses:
-    arrow_keys_ = event.getKeys(keyList=['left', 'right', 'down', 'space', 'escape'])
-    if len(arrow_keys_) > 0:
-        if 'left' in arrow_keys_:
-            print('number response: 0', end='   ')
-            resp_num_ = 0
-            resp_num_button1.lineColor = 'red'
-            resp_num_button1.draw()
-        elif 'down' in arrow_keys_:
-            print('number response: 1', end='   ')
-            resp_num_ = 1
-            resp_num_button2.lineColor = 'red'
-            resp_num_button2.draw()
-        elif 'right' in arrow_keys_:
-            print('number response: 2', end='   ')
-            resp_num_ = 2
-            resp_num_button3.lineColor = 'red'
-            resp_num_button3.draw()
-        elif 'space' in arrow_keys_:
-            resp_num_ = 'X'
-        elif 'escape' in arrow_keys_:
-            exit_routine()
-        # noinspection PyUnboundLocalVariable
-        return resp_num_
-    else:
-        return 'N'
-
-# Resetting the number response buttons:
-def resp_num_reset():
-    resp_num_button1.lineColor = 'white'
-    resp_num_button2.lineColor = 'white'
-    resp_num_button3.lineColor = 'white'
-
-## Location response buttons:
-def resp_loc_draw():
-    # Confidence rendering:
-    resp_loc_text.draw()
-    resp_loc_button1.draw()
-    button1_arrow.draw()
-    resp_loc_button1_text.draw()
-    resp_loc_button2.draw()
-    button3_arrow.draw()
-    resp_loc_button2_text.draw()
-
-def resp_loc_monitor():
-    # Monitoring for key presses:
-    arrow_keys_ = event.getKeys(keyList=['left', 'right', 'space', 'escape'])
-    if len(arrow_keys_) > 0:
-        if 'left' in arrow_keys_:
-            print('location response: Left', end='   ')
-            resp_loc_ = 'L'
-            resp_loc_button1.lineColor = 'blue'
-            resp_loc_button1.draw()
-        elif 'right' in arrow_keys_:
-            print('location response: Right', end='   ')
-            resp_loc_ = 'R'
-            resp_loc_button2.lineColor = 'red'
-            resp_loc_button2.draw()
-        elif 'space' in arrow_keys_:
-            resp_loc_ = 'X'
-        elif 'escape' in arrow_keys_:
-            exit_routine()
-        # noinspection PyUnboundLocalVariable
-        return resp_loc_
-    else:
-        return 'N'
-
-# Resetting the response buttons:
-def resp_loc_reset():
-    resp_loc_button1.lineColor = 'white'
-    resp_loc_button2.lineColor = 'white'
-
-## Orientation response buttons:
-def resp_ori_draw(resp_num_):
-    # Button rendering:
-    resp_ori_text.draw()
-    resp_ori_button1.draw()
-    button1_arrow.draw()
-    resp_ori_button1_text.draw()
-    if resp_num_ == 2:
-        resp_ori_button2.draw()
-        button2_arrow.draw()
-        resp_ori_button2_text.draw()
-    resp_ori_button3.draw()
-    button3_arrow.draw()
-    resp_ori_button3_text.draw()
-
-def resp_ori_monitor(resp_num_):
-    # Monitoring for key presses:
-    arrow_keys_ = event.getKeys(keyList=['left', 'down', 'right', 'space', 'escape'])
-    if len(arrow_keys_) > 0:
-        if 'left' in arrow_keys_:
-            print('orientation response: Left', end='   ')
-            resp_ori_ = 'L'
-            resp_ori_button1.lineColor = 'red'
-            resp_ori_button1.draw()
-        elif 'down' in arrow_keys_ and resp_num_ == 2:
-            print('orientation response: Both', end='   ')
-            resp_ori_ = 'B'
-            resp_ori_button2.lineColor = 'red'
-            resp_ori_button2.draw()
-        elif 'down' in arrow_keys_ and not resp_num_ == 2:
-            print('improper response: dropping trial')
-            resp_ori_ = 'X'
-        elif 'right' in arrow_keys_:
-            print('orientation response: Right', end='   ')
-            resp_ori_ = 'R'
-            resp_ori_button3.lineColor = 'red'
-            resp_ori_button3.draw()
-        elif 'space' in arrow_keys_:
-            resp_ori_ = 'X'
-        elif 'escape' in arrow_keys_:
-            exit_routine()
-        # noinspection PyUnboundLocalVariable
-        return resp_ori_
+## Response screens, baked into one image per highlighted button:
+# Each screen maps a response to the image with its button highlighted, and 'N' (no response yet) to the plain one.
+def bake_resp_screens(items_, buttons_):
+    screens_ = {'N': layers.bake(window, items_)}
+    for resp_, (button_, color_) in buttons_.items():
+        button_.lineColor = color_
+        screens_[resp_] = layers.bake(window, items_)
+        button_.lineColor = 'white'
+    return screens_
+
+if exp_name == 'pm2':
+    resp_num_screens = bake_resp_screens(
+        [resp_num_text, resp_num_button1, button1_arrow, resp_num_button1_text,
+         resp_num_button2, button2_arrow, resp_num_button2_text,
+         resp_num_button3, button3_arrow, resp_num_button3_text],
+        {0: (resp_num_button1, 'red'), 1: (resp_num_button2, 'red'), 2: (resp_num_button3, 'red')})
+    # The orientation screen, by the number of stimuli reported (the 'both tilts' button only for two):
+    resp_ori_screens = {
+        1: bake_resp_screens([resp_ori_text, resp_ori_button1, button1_arrow, resp_ori_button1_text,
+                              resp_ori_button3, button3_arrow, resp_ori_button3_text],
+                             {'L': (resp_ori_button1, 'red'), 'R': (resp_ori_button3, 'red')}),
+        2: bake_resp_screens([resp_ori_text, resp_ori_button1, button1_arrow, resp_ori_button1_text,
+                              resp_ori_button2, button2_arrow, resp_ori_button2_text,
+                              resp_ori_button3, button3_arrow, resp_ori_button3_text],
+                             {'L': (resp_ori_button1, 'red'), 'B': (resp_ori_button2, 'red'),
+                              'R': (resp_ori_button3, 'red')})}
+if exp_name == 'pm1':
+    resp_loc_screens = bake_resp_screens(
+        [resp_loc_text, resp_loc_button1, button1_arrow, resp_loc_button1_text,
+         resp_loc_button2, button3_arrow, resp_loc_button2_text],
+        {'L': (resp_loc_button1, 'blue'), 'R': (resp_loc_button2, 'red')})
+
+## Response keys: the response code of each key, and its console message:
+resp_num_keys = {'left': (0, 'number response: 0'), 'down': (1, 'number response: 1'),
+                 'right': (2, 'number response: 2')}
+resp_loc_keys = {'left': ('L', 'location response: Left'), 'right': ('R', 'location response: Right')}
+# The orientation keys, by the number of stimuli reported ('down', i.e. both tilts, is improper unless two):
+resp_ori_keys = {1: {'left': ('L', 'orientation response: Left'), 'down': ('X', 'improper response: dropping trial'),
+                     'right': ('R', 'orientation response: Right')},
+                 2: {'left': ('L', 'orientation response: Left'), 'down': ('B', 'orientation response: Both'),
+                     'right': ('R', 'orientation response: Right')}}
+
+# Show a response screen and wait for a response key (or space, which drops the trial, or escape). Returns the
+# response code ('X' if dropped) and the response time, in s from the flip that showed the screen; the screen with the
+# chosen button highlighted is drawn for the next flip:
+def collect_resp(screens_, resp_keys_):
+    screens_['N'].draw()
+    press_ = collector.collect(list(resp_keys_) + ['space', 'escape'])
+    if press_.key == 'escape':
+        exit_routine()
+    if press_.key == 'space':
+        resp_ = 'X'
     else:
-        return 'N'
-
-def resp_ori_reset(resp_num_):
-    resp_ori_button1.lineColor = 'white'
-    if resp_num_ == 2:
-        resp_ori_button2.lineColor = 'white'
-    resp_ori_button3.lineColor = 'white'
+        resp_, message_ = resp_keys_[press_.key]
+        output.log(message_, end='   ')
+    screens_.get(resp_, screens_['N']).draw()
+    return resp_, press_.rt
 
 ## Handy routines:
-# Return the angle of the orientation
-def stim_ori_angle(stim_ori_):
-    if stim_ori_ == 'L':
-        return 135
-    elif stim_ori_ == 'R':
-        return 45
-    else:
-        exit_routine()
-        return 0
-
 # This is done at every frame update, regardless of trial phase, so predefining:
-def frame_routine():
+def frame_routine(phase_=flip_log.PH_FIX, shown_=0):
     flip_time_ = window.flip()
+    flip_rec.record(flip_time_, n_trials_done, phase_, shown_)
     # Checking for quit (the Esc key)
     if event.getKeys(keyList=['escape']):
         exit_routine()
     return flip_time_
 
+# Flips of the response and inter-trial screens, recorded but with no check for quitting:
+def record_flip(phase_):
+    flip_time_ = window.flip()
+    flip_rec.record(flip_time_, n_trials_done, phase_)
+    return flip_time_
+
+# Response screens are flipped once, and then wait for the keyboard:
+collector = responses.ResponseCollector(window, flip=lambda: record_flip(flip_log.PH_RESP))
+
 # Also no variation across frames, but only available upon call, which is made only in key registering phase.
 def exit_routine():
     # Say goodbye:
@@ -400,16 +410,30 @@ def exit_routine():
     core.wait(.7)
     window.flip()
 
-    # Behavioural data output:
-    if not output_mat:  # means that the dictionary is empty
+    # Final estimates of the adaptive tracks:
+    if adaptive:
+        for (soa_, varied_), track_ in tracks.items():
+            thresh_out_ = {'soa': soa_, 'varied_stim': varied_, 'n_trials': track_.n_trials,
+                           'n_correct': track_.n_correct}
+            thresh_out_.update(track_.estimate())
+            output.submit(thresh_writer.write, thresh_out_)
+        output.submit(thresh_writer.close)
+    # The cells run and the posterior marginals of the masking function:
+    if bayes_design:
+        design_out_ = dict((name_ + '_grid', design.grids[name_]) for name_ in adaptive_design.PARAM_NAMES)
+        design_out_.update(design.marginals())
+        output.submit(np.savez, block_dir + os.sep + 'design.npz', cells=design_cells, n_trials=design.n_trials,
+                      n_correct=design.n_correct, **design_out_)
+
+    # Behavioural data output (the trials are already on disk once the output thread is done):
+    output.submit(trial_writer.close)
+    output.submit(drop_writer.close)
+    output.submit(frame_file.close)
+    output.close()
+    if trial_writer.n_rows == 0:
         print('\n===================\nthe output file is empty')
     else:
-        data_columns = ['exp_name', 'frame_rate', 'stim_dur', 'beg_buff', 'end_buff', 'wiggle',  # experiment specs
-                        'subj', 'block', 'trial_id',  # log info
-                        'soa', 'stim1_ori', 'stim2_ori', 'stim1_c', 'stim2_c',  # stim info
-                        'stim_loc', 'jitter',  # randomized variables
-                        'resp_num', 'resp_loc', 'resp_ori', 'drops']  # subj resp
-        pd.DataFrame.from_dict(output_mat, orient='index').to_csv(out_file_path, index=False, columns=data_columns)
+        trial_log.csv_to_parquet(out_file_path)
         print('\noutput file path is ' + out_file_path)
 
     # Close the graphics
@@ -419,7 +443,9 @@ def exit_routine():
 
 ## Initiating the trial loop
 n_trials_done = 0
-while len(trials > 0):
+n_timing_drops = 0
+trials_left = TrialQueue(np.arange(len(plan)), max_drops=max_drops)  # plan rows, in presentation order
+while len(trials_left) > 0:
 
     ## First trial initiates instructions and sends the expt initiation message to the eye tracker:
     if n_trials_done == 0:
@@ -430,237 +456,209 @@ while len(trials > 0):
         # Wait until a space key event occurs after the instructions are displayed:
         event.waitKeys(' ')
 
-    ## Randomly picking the current trial row, assigning it to 'trial' var, and dropping it from 'trials':
-    cur_trial_indx = int(np.random.choice(trials.index.values, 1))
-    trial = trials.ix[cur_trial_indx].copy()  # an explicit copy() is necessary due to a warning otherwise
-    trials = trials.drop([cur_trial_indx])
+    ## Reading the next row of the block plan:
+    cur_plan_indx = trials_left.pop()
+    trial = plan[cur_plan_indx]
+    # With the adaptive design, the SOA and contrasts are those of the cell it picked (during the previous ITI):
+    if bayes_design:
+        design_cell = design.next_cell
+        trial = trial.copy()
+        for field_ in ['soa', 'stim1_c', 'stim2_c']:
+            trial[field_] = design_cells[field_][design_cell]
+        trial['stim1_contrast'] = 10 ** trial['stim1_c']
+        trial['stim2_contrast'] = 10 ** trial['stim2_c']
     drop_trial = False
+    drop_reason = ''
     # print(trial)
 
     n_trials_done += 1
-    print('\n======TRIAL#' + str(n_trials_done) + '======')
+    flip_rec.begin_trial()
+    output.log('\n======TRIAL#' + str(n_trials_done) + '====== (' + str(len(trials_left)) + ' left)')
 
     ## Assigning the trial variables:
 
-    # Token variables:
-    resp_loc_given = False
-    resp_num_given = False
-    resp_ori_given = False
+    # Whether the stimuli will appear on the left or right (or in the 1st or 2nd interval):
+    stim_loc_R2 = trial['stim_loc_R2']  # 0 if Left and 1 if Right - used in the loop check (BOOL is faster)
+    stim_loc = trial['stim_loc']
 
-    # Randomizing whether the stimuli will appear on the left or right:
-    stim_loc_R2 = np.random.randint(2)  # 0 if Left and 1 if Right - used in the loop check (BOOL is faster)
-    if para == 'loc':
-        if stim_loc_R2:
-            stim_loc = 'R'
+    # Stimulus contrast / opacity:
+    stim1_c = trial['stim1_c']  # stimulus contrast, log scaled
+    stim2_c = trial['stim2_c']
+    stim1_contrast = trial['stim1_contrast']
+    stim2_contrast = trial['stim2_contrast']
+    # In threshold blocks, the varied stimulus takes the contrast picked by its track (during the previous ITI):
+    if adaptive:
+        varied_stim = plan_varied[cur_plan_indx]
+        track = tracks[trial['soa'], varied_stim]
+        track_indx = track.next_indx
+        if varied_stim == 1:
+            stim1_c = track.next_x
+            stim1_contrast = 10 ** stim1_c
         else:
-            stim_loc = 'L'
+            stim2_c = track.next_x
+            stim2_contrast = 10 ** stim2_c
+
+    # The stimuli with this trial's orientation and contrast:
+    stim1 = stims.get(trial['stim1_angle'], stim1_contrast)
+    stim2 = stims.get(trial['stim2_angle'], stim2_contrast)
+    if para == 'loc':
         stim_pos = (-stim_x_off + stim_x_off * stim_loc_R2 * 2, 0)
         stim1.pos = stim_pos
         stim2.pos = stim_pos
-    else:
-        if stim_loc_R2:
-            stim_loc = '2nd'
-        else:
-            stim_loc = '1st'
 
     # Timing variables.
 
-    # Stimulus onset asynchrony, in frames: must be greater than stimulus duration:
-    soa = trial['SOA']
-    if shocky:
-        soa = soa / 2
-    if debug:
-        if soa > 0:
-            soa = soa + stim_dur
+    # Stimulus onset asynchrony, in frames (already converted for the refresh rate and debug mode):
+    soa = trial['soa']
     # Jittering the onset timing for the first or only stimulus, in frames:
-    jitter = np.random.randint(wiggle+1)  # the jitter could be zero
+    jitter = trial['jitter']
     if debug:
-        print('jitter=' + str(jitter))
-    # Onsets and frames of the stimuli:
-    stim1_onset = beg_buff + jitter  # time for first stimulus onsets, in frames, from the onset of the interval
-    stim1_twin = np.add(stim1_onset, range(int(stim_dur)))  # stimulus time window, i.e., the frames in which it appears
-    # print('stim1 time window:')
-    # print(stim1_twin)
-    stim2_onset = stim1_onset + soa
-    stim2_twin = np.add(stim2_onset, range(int(stim_dur)))
-    # print('stim2 time window:')
-    # print(stim2_twin)
-
-    # Stimulus contrast / opacity:
-    stim1_c = trial['stim1_c']  # stimulus contrast, log scaled
-    stim1.contrast = 10 ** stim1_c
-    stim2_c = trial['stim2_c']
-    stim2.contrast = 10 ** stim2_c
+        output.log('jitter=' + str(jitter))
+    # Onset of the first stimulus, in frames, from the onset of the interval:
+    stim1_onset = beg_buff + jitter
 
     # Stimulus orientation:
     stim1_ori = trial['stim1_ori']
-    stim1.ori = stim_ori_angle(stim1_ori)
     stim2_ori = trial['stim2_ori']
-    stim2.ori = stim_ori_angle(stim2_ori)
 
     # Print trial specifics to screen:
-    print('loc=' + str(stim_loc) + ' soa=' + str(int(soa)) + ' ori1=' + str(stim1_ori) + ' ori2=' + str(stim2_ori) +
-          ' c1=' + str(stim1_c) + ' c2=' + str(stim2_c))
+    output.log('loc=' + str(stim_loc) + ' soa=' + str(int(soa)) + ' ori1=' + str(stim1_ori) + ' ori2=' +
+               str(stim2_ori) + ' c1=' + str(stim1_c) + ' c2=' + str(stim2_c))
 
     ## Pre-trial fixation phase:
+    shown = 0  # draw flags of what is on screen
+    shown_phase = flip_log.PH_FIX  # and the trial phase it belongs to
     for cur_frame in range(fix_dur):
-        flip_time = frame_routine()
+        flip_time = frame_routine(shown_phase, shown)
         fix_cross.draw()
+        shown = schedule.FIX
 
-    ## The number of if intervals is 2 for interval-based paradigms:
+    ## The stimuli appear in a single interval for the location-based paradigm:
     if para == 'loc':
-        int_num = 0  # only a single interval for the location-based paradigm
-        stim_loc_R2 = 0  # I promise I'll be careful
+        stim_int = 0
     elif para == 'int':
-        int_num = [0, 1]
+        stim_int = stim_loc_R2
     else:
-        print('ERROR: Paradigm string not recognized!')
+        stim_int = 0
+        output.log('ERROR: Paradigm string not recognized!')
+
+    ## Compiling the frame schedule of the presentation phase (both intervals, each followed by fixation):
+    frame_sched = schedule.compile_trial(interval_dur, fix_dur, stim_dur, stim1_onset, soa, stim_int,
+                                         draw_fix=(para == 'loc'))
+    if debug:
+        output.log(schedule.trace(frame_sched, interval_dur))
 
     ## Presentation phase
-    # Iterating through intervals:
-    for cur_int in [0, 1]:
-        if cur_int == 0:
-            box.lineColor = 'blue'
+    # The draw calls for each combination of the schedule flags:
+    draw_sets = schedule.draw_table(fix_cross, box_int1, box_int2, box, stim1, stim2)
+    # Every frame only looks up the precompiled draw calls:
+    for cur_flags, cur_phase in zip(frame_sched.tolist(), sched_phases):
+        flip_time = frame_routine(shown_phase, shown)
+        for cur_draw in draw_sets[cur_flags]:
+            cur_draw()
+        shown = cur_flags
+        shown_phase = cur_phase
+    # The flip that brings up the last presentation frame (which stays on until the response screen):
+    flip_time = frame_routine(shown_phase, shown)
+    # Measured timing of the presentation phase:
+    flip_summary = flip_rec.trial_summary({'stim1': schedule.STIM1, 'stim2': schedule.STIM2})
+    if flip_summary['n_late_fr'] > 0:
+        output.log('WARNING! ' + str(flip_summary['n_late_fr']) + ' late frame(s), longest flip interval ' +
+                   str(round(flip_summary['max_ifi_ms'], 1)) + ' ms')
+    # A late frame while the stimuli are up (their durations and the SOA) invalidates the trial, which is then put back
+    # like any dropped trial:
+    if flip_rec.n_late_stim(schedule.STIM1 | schedule.STIM2) > 0:
+        if n_timing_drops < max_timing_drops:
+            output.log('late frame while the stimuli are up: dropping trial')
+            drop_trial = True
+            drop_reason = 'timing'
+            n_timing_drops += 1
         else:
-            box.lineColor = 'red'
-        for cur_frame in range(interval_dur):
-            # Fixation presentation & frame routine:
-            flip_time = frame_routine()
-            if para == 'loc':
-                fix_cross.draw()
-            box.draw()
-
-            # Stimulus presentation:
-            if cur_int == stim_loc_R2:
-                # first stimulus time window:
-                if cur_frame in stim1_twin:
-                    if debug:
-                        print('/', end='')
-                    # draw the first stimulus
-                    stim1.draw()
-                # second stimulus time window (may overlap with the first):
-                if cur_frame in stim2_twin:
-                    if debug:
-                        print('\\', end='')
-                    # draw the second stimulus
-                    stim2.draw()
-                if debug:
-                    if cur_frame not in stim1_twin and cur_frame not in stim2_twin:
-                        print('-', end='')
-            else:
-                if debug and para == 'int':
-                    print('-', end='')
-        if debug:
-            print('\n', end='')
-
-        ## Post-trial fixation phase:
-        box.lineColor = 'white'
-        for cur_frame in range(fix_dur):
-            flip_time = frame_routine()
-            if para == 'loc':
-                fix_cross.draw()
-            box.draw()
+            output.log('late frame while the stimuli are up, but the timing drops of this block are used up')
 
     ## Response phase:
     event.clearEvents()
 
     # Stimulus number response:
     resp_num = 'N'
+    rt_num = np.nan
     if exp_name == 'pm2':
-        while not resp_num_given:
-
-            window.flip()
-
-            # Stimulus number response:
-            resp_num_draw()
-            if not resp_num_given:
-                if resp_num == 'N':
-                    resp_num = resp_num_monitor()
-                else:
-                    if resp_num == 'X':
-                        drop_trial = True
-                    resp_num_given = True
-                    event.clearEvents()
-
-        resp_num_reset()
-        window.flip()
+        resp_num, rt_num = collect_resp(resp_num_screens, resp_num_keys)
+        if resp_num == 'X':
+            drop_trial = True
+        record_flip(flip_log.PH_RESP)
         core.wait(resp_feedback_wait)
-        event.clearEvents()
 
     # Location response:
     resp_loc = 'N'
+    rt_loc = np.nan
     if exp_name == 'pm1':
-        while not resp_loc_given:
-
-            window.flip()
-
-            # Interval response:
-            resp_loc_draw()
-            if not resp_loc_given:
-                if resp_loc == 'N':
-                    resp_loc = resp_loc_monitor()
-                else:
-                    if resp_loc == 'X':
-                        drop_trial = True
-                    resp_loc_given = True
-                    event.clearEvents()
-
-        resp_loc_reset()
-        window.flip()
+        resp_loc, rt_loc = collect_resp(resp_loc_screens, resp_loc_keys)
+        if resp_loc == 'X':
+            drop_trial = True
+        record_flip(flip_log.PH_RESP)
         core.wait(resp_feedback_wait)
-        event.clearEvents()
 
     # Orientation response:
     resp_ori = 'N'
-    if exp_name == 'pm2' and resp_num > 0 and not drop_trial:
-        while not resp_ori_given:
-
-            window.flip()
-
-            # Stimulus number response:
-            resp_ori_draw(resp_num)
-            if not resp_ori_given:
-                if resp_ori == 'N':
-                    resp_ori = resp_ori_monitor(resp_num)
-                else:
-                    if resp_ori == 'X':
-                        drop_trial = True
-                    resp_ori_given = True
-                    event.clearEvents()
-
-        resp_ori_reset(resp_num)
-        window.flip()
+    rt_ori = np.nan
+    if exp_name == 'pm2' and not drop_trial and resp_num > 0:
+        resp_ori, rt_ori = collect_resp(resp_ori_screens[resp_num], resp_ori_keys[resp_num])
+        if resp_ori == 'X':
+            drop_trial = True
+        record_flip(flip_log.PH_RESP)
         core.wait(resp_feedback_wait)
-        event.clearEvents()
 
     ## Trial termination feedback:
-    if drop_trial:
-        trial_drops = trial['drops'] + 1
-        trial['drops'] = trial_drops
-        trials = trials.append(trial)
-    else:
-        trial_drops = trial['drops']
+    # The dropped trial goes back to a random position among the remaining ones, unless dropped too often:
+    if drop_trial and not drop_reason:
+        drop_reason = 'participant'  # spacebar or an improper response
+    if drop_trial and not trials_left.requeue(cur_plan_indx):
+        output.log('trial dropped ' + str(max_drops) + ' times: discarding')
+        drop_reason += ' (discarded)'
+    trial_drops = trials_left.drops[cur_plan_indx]
     instr_text_stim.setText('press spacebar to continue')
     instr_text_stim.draw()
     fix_cross.draw()
-    window.flip()
+    record_flip(flip_log.PH_ITI)
+
+    ## Recording the data (while the participant reads the prompt):
+    output.submit(frame_file.write, flip_rec.trial_flips())
+    trial_out = {'exp_name': exp_name, 'frame_rate': frame_rate, 'stim_dur': stim_dur,
+                 'beg_buff': beg_buff, 'end_buff': end_buff, 'wiggle': wiggle,
+                 'subj': exp_info['subj'], 'block': exp_info['block'],
+                 'trial_id': n_trials_done, 'soa': soa,
+                 'stim1_ori': stim1_ori, 'stim2_ori': stim2_ori,
+                 'stim1_c': stim1_c, 'stim2_c': stim2_c,
+                 'stim_loc': stim_loc, 'jitter': jitter,
+                 'resp_num': resp_num, 'resp_loc': resp_loc, 'resp_ori': resp_ori,
+                 'rt_num': rt_num, 'rt_loc': rt_loc, 'rt_ori': rt_ori,
+                 'drops': trial_drops}
+    trial_out.update(flip_summary)
+    # The response goes to the trial's track (or the design), which picks what comes next before the participant
+    # presses space:
+    if (adaptive or bayes_design) and not drop_trial:
+        trial_out['correct'] = int((resp_loc == 'R') == bool(stim_loc_R2))
+    if adaptive:
+        trial_out['varied_stim'] = varied_stim
+        if not drop_trial:
+            track.update(trial_out['correct'], track_indx)
+        trial_out.update(track.estimate())
+    if bayes_design:
+        trial_out['design_cell'] = design_cell
+        if not drop_trial:
+            design.update(trial_out['correct'], design_cell)
+        trial_out.update(design.estimate())
+    if drop_trial:
+        trial_out['drop_reason'] = drop_reason
+        output.submit(drop_writer.write, trial_out)
+    else:
+        output.submit(trial_writer.write, trial_out)
 
     # wait until a space key event occurs after the instructions are displayed
     event.waitKeys(' ')
 
     flip_time = window.flip()
 
-    ## Recording the data
-    if not drop_trial:
-        output_mat[n_trials_done - 1] = {'exp_name': exp_name, 'frame_rate': frame_rate, 'stim_dur': stim_dur,
-                                         'beg_buff': beg_buff, 'end_buff': end_buff, 'wiggle': wiggle,
-                                         'subj': exp_info['subj'], 'block': exp_info['block'],
-                                         'trial_id': n_trials_done, 'soa': soa,
-                                         'stim1_ori': stim1_ori, 'stim2_ori': stim2_ori,
-                                         'stim1_c': stim1_c, 'stim2_c': stim2_c,
-                                         'stim_loc': stim_loc, 'jitter': jitter,
-                                         'resp_num': resp_num, 'resp_loc': resp_loc, 'resp_ori': resp_ori,
-                                         'drops': trial_drops}
-
 # Finishing the experiment
 exit_routine()
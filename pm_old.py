@@ -1,5 +1,6 @@
 ####!/usr/bin/arch -i386 /usr/bin/python # -*- coding: utf-8 -*-
 from __future__ import print_function
+from __future__ import division  # so that 1/3=0.333 instead of 1/3=0
 
 """
 Investigating facilitative and suppressive interactions between stimuli.
@@ -7,13 +8,13 @@ Creator: Egor Ananyev
 Original date: 2019-05-07
 """
 
-from __future__ import division  # so that 1/3=0.333 instead of 1/3=0
 from psychopy import visual, core, event, gui
 import numpy as np
 import os
 from psychopy.data import TrialHandler, importConditions
 import pandas as pd
 from datetime import datetime
+import responses
 
 ## Initial variables.
 # experiment modes:
@@ -133,6 +134,8 @@ else:
     # TODO make sure that 'station3' monitor profile exists and is properly configured
     window = visual.Window(fullscr=full_screen, monitor=screen_name, color=[-.5, -.5, -.5], units='deg',
                            allowStencil=True, autoLog=False, screen=0, waitBlanking=False)
+# Response screens are flipped once, and then wait for the keyboard:
+collector = responses.ResponseCollector(window)
 
 if shocky:
     if debug:
@@ -228,29 +231,26 @@ def conf_draw():
     conf_button2_text.draw()
     conf_button3.draw()
     conf_button3_text.draw()
-    # Monitoring for key presses:
-    num_keys_ = event.getKeys(keyList=['1', '2', '3', 'escape'])
-    if len(num_keys_) > 0:
-        if '1' in num_keys_:
-            print('confidence: 1')
-            resp_conf_ = 1
-            conf_button1.lineColor = 'blue'
-            conf_button1.draw()
-        elif '2' in num_keys_:
-            print('confidence: 2')
-            resp_conf_ = 2
-            conf_button2.lineColor = 'blue'
-            conf_button2.draw()
-        elif '3' in num_keys_:
-            print('confidence: 3')
-            resp_conf_ = 3
-            conf_button3.lineColor = 'blue'
-            conf_button3.draw()
-        elif 'escape' in num_keys_:
-            exit_routine()
-        return resp_conf_
+
+def conf_monitor():
+    # Waiting for a key press; returns the rating and its response time (from the flip of the confidence buttons):
+    num_key_, key_t_, rt_ = collector.collect(['1', '2', '3', 'escape'])
+    if num_key_ == '1':
+        print('confidence: 1')
+        resp_conf_ = 1
+        conf_button1.lineColor = 'blue'
+    elif num_key_ == '2':
+        print('confidence: 2')
+        resp_conf_ = 2
+        conf_button2.lineColor = 'blue'
+    elif num_key_ == '3':
+        print('confidence: 3')
+        resp_conf_ = 3
+        conf_button3.lineColor = 'blue'
     else:
-        return 0
+        exit_routine()
+    # noinspection PyUnboundLocalVariable
+    return resp_conf_, rt_
 
 def conf_reset():
     conf_button1.lineColor = 'white'
@@ -269,24 +269,21 @@ def resp_int_draw():
     resp_int_button2_text.draw()
 
 def resp_int_monitor():
-    # Monitoring for key presses:
-    arrow_keys_ = event.getKeys(keyList=['left', 'right', 'escape'])
-    if len(arrow_keys_) > 0:
-        if 'left' in arrow_keys_:
-            print('interval response: 1', end='   ')
-            resp_int_ = 1
-            resp_int_button1.lineColor = 'red'
-            resp_int_button1.draw()
-        elif 'right' in arrow_keys_:
-            print('interval response: 2', end='   ')
-            resp_int_ = 2
-            resp_int_button2.lineColor = 'red'
-            resp_int_button2.draw()
-        elif 'escape' in arrow_keys_:
-            exit_routine()
-        return resp_int_
+    # Waiting for a key press; returns the response and its response time (the chosen button is highlighted at the
+    # next draw):
+    arrow_key_, key_t_, rt_ = collector.collect(['left', 'right', 'escape'])
+    if arrow_key_ == 'left':
+        print('interval response: 1', end='   ')
+        resp_int_ = 1
+        resp_int_button1.lineColor = 'red'
+    elif arrow_key_ == 'right':
+        print('interval response: 2', end='   ')
+        resp_int_ = 2
+        resp_int_button2.lineColor = 'red'
     else:
-        return 0
+        exit_routine()
+    # noinspection PyUnboundLocalVariable
+    return resp_int_, rt_
 
 # Resetting the confidence response buttons:
 def resp_int_reset():
@@ -305,24 +302,21 @@ def resp_num_draw():
     resp_num_button2_text.draw()
 
 def resp_num_monitor():
-    # Monitoring for key presses:
-    arrow_keys_ = event.getKeys(keyList=['left', 'right', 'escape'])
-    if len(arrow_keys_) > 0:
-        if 'left' in arrow_keys_:
-            print('number response: 1', end='   ')
-            resp_stim_num_ = 1
-            resp_num_button1.lineColor = 'red'
-            resp_num_button1.draw()
-        elif 'right' in arrow_keys_:
-            print('number response: 2', end='   ')
-            resp_stim_num_ = 2
-            resp_num_button2.lineColor = 'red'
-            resp_num_button2.draw()
-        elif 'escape' in arrow_keys_:
-            exit_routine()
-        return resp_stim_num_
+    # Waiting for a key press; returns the response and its response time (the chosen button is highlighted at the
+    # next draw):
+    arrow_key_, key_t_, rt_ = collector.collect(['left', 'right', 'escape'])
+    if arrow_key_ == 'left':
+        print('number response: 1', end='   ')
+        resp_stim_num_ = 1
+        resp_num_button1.lineColor = 'red'
+    elif arrow_key_ == 'right':
+        print('number response: 2', end='   ')
+        resp_stim_num_ = 2
+        resp_num_button2.lineColor = 'red'
     else:
-        return 0
+        exit_routine()
+    # noinspection PyUnboundLocalVariable
+    return resp_stim_num_, rt_
 
 # Resetting the number response buttons:
 def resp_num_reset():
@@ -344,29 +338,25 @@ def resp_ori_draw():
     resp_ori_button3_text.draw()
 
 def resp_ori_monitor():
-    # Monitoring for key presses:
-    arrow_keys_ = event.getKeys(keyList=['left', 'down', 'right', 'escape'])
-    if len(arrow_keys_) > 0:
-        if 'left' in arrow_keys_:
-            print('orientation response: Left', end='   ')
-            resp_ori_ = 'L'
-            resp_ori_button1.lineColor = 'red'
-            resp_ori_button1.draw()
-        elif 'down' in arrow_keys_:
-            print('orientation response: Both', end='   ')
-            resp_ori_ = 'B'
-            resp_ori_button2.lineColor = 'red'
-            resp_ori_button2.draw()
-        elif 'right' in arrow_keys_:
-            print('orientation response: Right', end='   ')
-            resp_ori_ = 'R'
-            resp_ori_button3.lineColor = 'red'
-            resp_ori_button3.draw()
-        elif 'escape' in arrow_keys_:
-            exit_routine()
-        return resp_ori_
+    # Waiting for a key press; returns the response and its response time (the chosen button is highlighted at the
+    # next draw):
+    arrow_key_, key_t_, rt_ = collector.collect(['left', 'down', 'right', 'escape'])
+    if arrow_key_ == 'left':
+        print('orientation response: Left', end='   ')
+        resp_ori_ = 'L'
+        resp_ori_button1.lineColor = 'red'
+    elif arrow_key_ == 'down':
+        print('orientation response: Both', end='   ')
+        resp_ori_ = 'B'
+        resp_ori_button2.lineColor = 'red'
+    elif arrow_key_ == 'right':
+        print('orientation response: Right', end='   ')
+        resp_ori_ = 'R'
+        resp_ori_button3.lineColor = 'red'
     else:
-        return 0
+        exit_routine()
+    # noinspection PyUnboundLocalVariable
+    return resp_ori_, rt_
 
 def resp_ori_reset():
     resp_ori_button1.lineColor = 'white'
@@ -401,7 +391,8 @@ def exit_routine():
                         'soa', 'angle_diff', 'stim1_ori', 'stim2_ori', 'stim1_c', 'stim2_c',  # stim info
                         'stim_int', 'jitter',  # randomized variables
                         'resp_int', 'resp_num', 'resp_ori',  # subj resp
-                        'resp_int_conf', 'resp_num_conf', 'resp_ori_conf']  # subj confidence
+                        'resp_int_conf', 'resp_num_conf', 'resp_ori_conf',  # subj confidence
+                        'rt_int', 'rt_num', 'rt_ori', 'rt_conf']  # response times, in s from the screen flip
         pd.DataFrame.from_dict(output_mat, orient='index').to_csv(out_file_path, index=False, columns=data_columns)
         print('\noutput file path is ' + out_file_path)
 
@@ -430,14 +421,6 @@ for trial in trials:
 
     ## Assigning the trial variables:
 
-    # Token variables:
-    resp_int_given = False
-    resp_num_given = False
-    resp_ori_given = False
-    resp_int_conf = 0
-    resp_num_conf = 0
-    resp_ori_conf = 0
-
     # Randomizing whether the stimuli will appear in the first or second interval:
     stim_resp_int_second = np.random.randint(2)  # 0 if 1st and 1 if 2nd - used in the loop check (BOOL is faster)
     stim_int = stim_resp_int_second + 1  # adding 1 to record
@@ -542,84 +525,47 @@ for trial in trials:
 
     ## Response phase:
 
+    # Each screen is flipped once and then waits for the keyboard; the chosen button is shown highlighted.
+
     # Interval response:
     conf_reset()
-    resp_int = 0
-    event.clearEvents()
-    while not resp_int_given or resp_int_conf == 0:
-
-        window.flip()
+    resp_int_draw()
+    resp_int, rt_int = resp_int_monitor()
 
-        # Interval response:
-        resp_int_draw()
-        if not resp_int_given:
-            if resp_int == 0:
-                resp_int = resp_int_monitor()
-            else:
-                resp_int_given = True
-                event.clearEvents()
-
-        # Confidence response:
-        if resp_int_given:
-            resp_int_conf = conf_draw()
+    # Confidence response (with the interval response still on screen):
+    resp_int_draw()
+    conf_draw()
+    resp_int_conf, rt_conf = conf_monitor()
+    resp_int_draw()
+    conf_draw()
 
     resp_int_reset()
     window.flip()
     core.wait(resp_feedback_wait)
     conf_reset()
-    event.clearEvents()
 
     # Stimulus number response:
-    resp_num = 0
-    while not resp_num_given or resp_num_conf == 0:
-
-        window.flip()
-
-        # Stimulus number response:
-        resp_num_draw()
-        if not resp_num_given:
-            if resp_num == 0:
-                resp_num = resp_num_monitor()
-            else:
-                resp_num_given = True
-                event.clearEvents()
-
-        # Confidence response:
-        if resp_num_given:
-            print('bingo')
-            resp_num_conf = 9
-            # resp_num_conf = conf_draw()
+    resp_num_draw()
+    resp_num, rt_num = resp_num_monitor()
+    resp_num_conf = 9
+    # resp_num_conf, rt_num_conf = conf_monitor()
+    resp_num_draw()
 
     resp_num_reset()
     window.flip()
     core.wait(resp_feedback_wait)
     conf_reset()
-    event.clearEvents()
 
     # Orientation response:
-    resp_ori = 0
-    while not resp_ori_given or resp_ori_conf == 0:
-
-        window.flip()
-
-        # Stimulus number response:
-        resp_ori_draw()
-        if not resp_ori_given:
-            if resp_ori == 0:
-                resp_ori = resp_ori_monitor()
-            else:
-                resp_ori_given = True
-                event.clearEvents()
-
-        # Confidence response:
-        if resp_ori_given:
-            resp_ori_conf = 9
-            # resp_ori_conf = conf_draw()
+    resp_ori_draw()
+    resp_ori, rt_ori = resp_ori_monitor()
+    resp_ori_conf = 9
+    # resp_ori_conf, rt_ori_conf = conf_monitor()
+    resp_ori_draw()
 
     resp_ori_reset()
     window.flip()
     core.wait(resp_feedback_wait)
-    event.clearEvents()
 
     ## Trial termination feedback:
     instr_text_stim.setText('press spacebar to continue')
@@ -643,7 +589,8 @@ for trial in trials:
                                      'resp_int': resp_int, 'resp_num': resp_num, 'resp_ori': resp_ori,
                                      'resp_int_conf': resp_int_conf,
                                      'resp_num_conf': resp_num_conf,
-                                     'resp_ori_conf': resp_ori_conf}
+                                     'resp_ori_conf': resp_ori_conf,
+                                     'rt_int': rt_int, 'rt_num': rt_num, 'rt_ori': rt_ori, 'rt_conf': rt_conf}
 
 # Finishing the experiment
 exit_routine()
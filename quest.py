@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive contrast thresholds (Psi method, Kontsevich & Tyler, 1999).
+The posterior over the threshold and slope of a Weibull psychometric function is kept on a grid, and each trial's
+(log) contrast is the one that minimizes the expected entropy of the posterior after the response. The likelihood of a
+correct response is tabulated once, for every (threshold, slope, contrast) combination, so both the update and the
+choice of the next contrast are a few array operations over the whole grid, and take about a millisecond.
+Contrasts are log10 scaled, as in the condition files (stim1_c, stim2_c).
+Original date: 2026-10-18
+"""
+
+from __future__ import division
+import numpy as np
+
+## Default grids:
+THRESH_GRID = np.round(np.arange(-2.6, -0.195, .05), 2)  # thresholds, log10 contrast
+SLOPE_GRID = np.geomspace(.5, 12, 15)  # Weibull slopes, per log10 unit
+STIM_GRID = np.round(np.arange(-2.4, -0.395, .05), 2)  # contrasts that can be shown, log10
+
+
+# Probability of a correct response at log contrast x, for a Weibull function with the given threshold and slope;
+# guess is the chance rate (.5 for two alternatives) and lapse the rate of errors at any contrast:
+def weibull(x, thresh, slope, guess=.5, lapse=.02):
+    return guess + (1 - guess - lapse) * (1 - np.exp(-10 ** (slope * (x - thresh))))
+
+
+# Entropy (in bits) of distributions over the leading axes (summed over axes 0 and 1):
+def entropy(p):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms_ = np.where(p > 0, p * np.log2(p), 0)
+    return -terms_.sum(axis=(0, 1))
+
+
+class Psi(object):
+    """
+    Psi staircase on one track. next_x is the contrast of the next trial (chosen as soon as the previous response is
+    in, so that starting a trial costs nothing), and update() takes the response to it. The prior over the thresholds
+    is Gaussian (prior_sd=None: flat), and flat over the slopes.
+    """
+
+    def __init__(self, thresh_grid=THRESH_GRID, slope_grid=SLOPE_GRID, stim_grid=STIM_GRID, guess=.5, lapse=.02,
+                 prior_mean=-1.4, prior_sd=.6):
+        self.thresh_grid = np.asarray(thresh_grid, dtype=float)
+        self.slope_grid = np.asarray(slope_grid, dtype=float)
+        self.stim_grid = np.asarray(stim_grid, dtype=float)
+        # Likelihood of a correct response, by threshold x slope x contrast:
+        self.p_correct = weibull(self.stim_grid[None, None, :], self.thresh_grid[:, None, None],
+                                 self.slope_grid[None, :, None], guess, lapse)
+        if prior_sd is None:
+            prior_ = np.ones(len(self.thresh_grid))
+        else:
+            prior_ = np.exp(-.5 * ((self.thresh_grid - prior_mean) / prior_sd) ** 2)
+        self.posterior = np.repeat(prior_[:, None], len(self.slope_grid), axis=1)
+        self.posterior /= self.posterior.sum()
+        self.n_trials = 0
+        self.n_correct = 0
+        self.next_indx = self.choose()
+
+    @property
+    def next_x(self):
+        return self.stim_grid[self.next_indx]
+
+    # The index of the contrast with the lowest expected posterior entropy:
+    def choose(self):
+        joint_correct_ = self.posterior[:, :, None] * self.p_correct
+        joint_wrong_ = self.posterior[:, :, None] - joint_correct_
+        p_correct_ = joint_correct_.sum(axis=(0, 1))  # predicted probability of a correct response, per contrast
+        p_wrong_ = 1 - p_correct_
+        expected_ = (p_correct_ * entropy(joint_correct_ / p_correct_) +
+                     p_wrong_ * entropy(joint_wrong_ / p_wrong_))
+        return int(np.argmin(expected_))
+
+    # Take the response to the contrast of the given index (by default, the one of next_x), and choose the next one:
+    def update(self, correct, x_indx=None):
+        if x_indx is None:
+            x_indx = self.next_indx
+        likelihood_ = self.p_correct[:, :, x_indx]
+        self.posterior *= likelihood_ if correct else 1 - likelihood_
+        self.posterior /= self.posterior.sum()
+        self.n_trials += 1
+        self.n_correct += int(correct)
+        self.next_indx = self.choose()
+
+    # Posterior means and SDs of the threshold and slope:
+    def estimate(self):
+        p_thresh_ = self.posterior.sum(axis=1)
+        p_slope_ = self.posterior.sum(axis=0)
+        thresh_ = np.dot(p_thresh_, self.thresh_grid)
+        slope_ = np.dot(p_slope_, self.slope_grid)
+        return {'thresh': thresh_, 'thresh_sd': np.sqrt(np.dot(p_thresh_, (self.thresh_grid - thresh_) ** 2)),
+                'slope': slope_, 'slope_sd': np.sqrt(np.dot(p_slope_, (self.slope_grid - slope_) ** 2))}
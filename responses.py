@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Event-driven response collection.
+A response screen is flipped once, and the collector then blocks on the keyboard (psychopy.hardware.keyboard, which
+timestamps key presses with the psychtoolbox event queue where available) instead of flipping and polling every frame.
+The keyboard clock is reset on the flip that shows the screen (window.callOnFlip), so a response time is the key
+press time on that clock, i.e., measured from the flip rather than from when the script noticed the key, whatever
+clock the keyboard backend (psychtoolbox, event or iohub) timestamps its presses with.
+Original date: 2026-10-18
+"""
+
+from __future__ import division
+import collections
+from psychopy.hardware import keyboard
+
+# A key press: key name, press time (on the flip clock, i.e., onset of the screen + rt) and time since the onset of the
+# response screen, in s:
+Response = collections.namedtuple('Response', ['key', 't', 'rt'])
+
+
+class ResponseCollector(object):
+    """
+    Waits for key presses on screens that are already drawn. flip() is called to show the screen (window.flip by
+    default, or e.g. a function that also records the flip); it must flip the window and return the flip time.
+    """
+
+    def __init__(self, window, flip=None, kb=None):
+        self.window = window
+        self.flip = flip if flip is not None else window.flip
+        self.kb = kb if kb is not None else keyboard.Keyboard()
+        self.onset_t = None  # flip time of the last response screen
+
+    # Show the drawn screen and block until one of the keys is pressed (presses before the flip are discarded).
+    # Returns None if nothing was pressed within max_wait seconds:
+    def collect(self, keys, max_wait=float('inf')):
+        self.window.callOnFlip(self.kb.clock.reset)
+        self.onset_t = self.flip()
+        self.kb.clearEvents()
+        presses_ = self.kb.waitKeys(maxWait=max_wait, keyList=keys, waitRelease=False, clear=True)
+        if not presses_:
+            return None
+        press_ = presses_[0]
+        return Response(press_.name, self.onset_t + press_.rt, press_.rt)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Numeric run clock.
+Timestamps are integer nanoseconds of the monotonic performance counter, counted from an anchor taken once at the
+start of the run, when the wall clock is read too. They never wrap at midnight and are subtracted directly; the wall
+time of any timestamp is anchor_wall_ns + timestamp.
+Original date: 2026-10-18
+"""
+
+import time
+
+
+class RunClock(object):
+    """
+    Monotonic nanosecond timestamps since the anchor, with the wall-clock time (ns since the epoch) of the anchor.
+    """
+
+    def __init__(self):
+        self.anchor_ns = time.perf_counter_ns()
+        self.anchor_wall_ns = time.time_ns()
+
+    # Nanoseconds since the anchor:
+    def now(self):
+        return time.perf_counter_ns() - self.anchor_ns
+
+    # Wall-clock time of a timestamp, in ns since the epoch:
+    def wall_ns(self, t_ns):
+        return self.anchor_wall_ns + t_ns
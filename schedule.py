@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Per-trial frame schedules for the presentation phase of pm.py.
+Each trial is compiled once, before its first frame, into a flat array with one entry per frame holding the set of
+stimuli to draw on that frame, so the presentation loop only has to index a precomputed table.
+Original date: 2026-10-18
+"""
+
+from __future__ import division
+import numpy as np
+
+## Draw flags (one bit per stimulus that may be drawn on a frame):
+FIX = 1  # fixation cross
+BOX1 = 2  # the box marking the first interval
+BOX2 = 4  # the box marking the second interval
+BOXW = 8  # the (white) box of the post-interval fixation
+STIM1 = 16
+STIM2 = 32
+N_FLAGS = 64  # the number of possible flag combinations
+
+## Handy routines:
+
+# The frames of an interval in which a stimulus is shown, as a boolean mask (onset and duration in whole frames):
+def stim_frames(onset, dur, n_frames):
+    if onset != int(onset) or dur != int(dur):
+        raise ValueError('stimulus onset and duration have to be whole frames: ' + str(onset) + ', ' + str(dur))
+    frames_ = np.zeros(n_frames, dtype=bool)
+    onset_ = int(onset)
+    frames_[max(onset_, 0):max(onset_ + int(dur), 0)] = True
+    return frames_
+
+# Compile the presentation phase of a trial (two intervals, each followed by a fixation period) into draw flags:
+def compile_trial(interval_dur, fix_dur, stim_dur, stim1_onset, soa, stim_int, draw_fix=False):
+    seg_dur_ = interval_dur + fix_dur
+    sched_ = np.zeros(2 * seg_dur_, dtype=np.uint8)
+    for cur_int_ in [0, 1]:
+        int_beg_ = cur_int_ * seg_dur_
+        interval_ = sched_[int_beg_:int_beg_ + interval_dur]
+        if cur_int_ == 0:
+            interval_ |= BOX1
+        else:
+            interval_ |= BOX2
+        if cur_int_ == stim_int:
+            interval_[stim_frames(stim1_onset, stim_dur, interval_dur)] |= STIM1
+            interval_[stim_frames(stim1_onset + soa, stim_dur, interval_dur)] |= STIM2
+        sched_[int_beg_ + interval_dur:int_beg_ + seg_dur_] = BOXW
+    if draw_fix:
+        sched_ |= FIX
+    return sched_
+
+# Map every flag combination to the tuple of draw() methods to call, in the order the stimuli are layered:
+def draw_table(fix_cross_, box_int1_, box_int2_, box_post_, stim1_, stim2_):
+    layers_ = [(FIX, fix_cross_), (BOX1, box_int1_), (BOX2, box_int2_), (BOXW, box_post_),
+               (STIM1, stim1_), (STIM2, stim2_)]
+    return [tuple(stim_.draw for flag_, stim_ in layers_ if flags_ & flag_) for flags_ in range(N_FLAGS)]
+
+# Text rendering of the interval frames of a schedule, for debugging ('/' = first, '\' = second stimulus):
+def trace(sched_, interval_dur):
+    seg_dur_ = len(sched_) // 2
+    lines_ = []
+    for cur_int_ in [0, 1]:
+        line_ = ''
+        for flags_ in sched_[cur_int_ * seg_dur_:cur_int_ * seg_dur_ + interval_dur]:
+            if flags_ & (STIM1 | STIM2):
+                line_ += '/' * bool(flags_ & STIM1) + '\\' * bool(flags_ & STIM2)
+            else:
+                line_ += '-'
+        lines_.append(line_)
+    return '\n'.join(lines_)
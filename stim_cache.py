@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of ready-made grating stimuli.
+Instead of changing the orientation, contrast and phase of a single GratingStim right before the presentation frames,
+one stimulus is made per (ori, contrast, phase bin) combination, before the first trial, and a trial only picks the
+matching one. With a continuous phase (or contrast), the number of stimuli kept can be bounded, in which case the least
+recently used one is dropped to make room.
+Original date: 2026-10-18
+"""
+
+from __future__ import division
+import collections
+
+
+class StimCache(object):
+    """
+    Stimuli by (ori, contrast, phase bin). make_stim() returns a new stimulus with the default attributes (size, mask,
+    spatial frequency...); the cache sets ori, contrast and phase once, when the stimulus is made. phase_bins=None keeps
+    the exact phase; otherwise the phase (in cycles) is rounded to the nearest of phase_bins steps per cycle.
+    max_size=None keeps every stimulus made.
+    """
+
+    def __init__(self, make_stim, phase_bins=None, max_size=None):
+        self.make_stim = make_stim
+        self.phase_bins = phase_bins
+        self.max_size = max_size
+        self.stims = collections.OrderedDict()  # in order of last use
+        self.n_made = 0
+
+    # The phase that is actually shown for the given phase (the nearest bin step):
+    def phase_bin(self, phase):
+        if self.phase_bins is None:
+            return float(phase)
+        return round(phase % 1 * self.phase_bins) % self.phase_bins / self.phase_bins
+
+    def key(self, ori, contrast, phase=0.):
+        return float(ori), float(contrast), self.phase_bin(phase)
+
+    # The stimulus for the given attributes (made now if not cached):
+    def get(self, ori, contrast, phase=0.):
+        key_ = self.key(ori, contrast, phase)
+        stim_ = self.stims.get(key_)
+        if stim_ is None:
+            stim_ = self.make(key_)
+        else:
+            self.stims.move_to_end(key_)
+        return stim_
+
+    def make(self, key):
+        stim_ = self.make_stim()
+        stim_.ori, stim_.contrast, stim_.phase = key
+        self.n_made += 1
+        self.stims[key] = stim_
+        if self.max_size is not None and len(self.stims) > self.max_size:
+            self.stims.popitem(last=False)
+        return stim_
+
+    # Make the stimuli of all the given (ori, contrast[, phase]) combinations up front:
+    def prebuild(self, combinations):
+        for combination_ in combinations:
+            self.get(*combination_)
+        return len(self.stims)
+
+    def __len__(self):
+        return len(self.stims)
@@ -1,5 +1,6 @@
 ####!/usr/bin/arch -i386 /usr/bin/python # -*- coding: utf-8 -*-
 from __future__ import print_function
+from __future__ import division  # so that 1/3=0.333 instead of 1/3=0
 
 """
 Investigating facilitative and suppressive interactions between stimuli.
@@ -7,7 +8,6 @@ Creator: Egor Ananyev
 Original date: 2019-05-07
 """
 
-from __future__ import division  # so that 1/3=0.333 instead of 1/3=0
 from psychopy import visual, core, event, gui
 
 window = visual.Window(fullscr=True, monitor='station3', color=[-.5, -.5, -.5], units='pix',
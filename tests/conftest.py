@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the hardware-free modules (no PsychoPy or response device needed).
+The scripts are flat modules, so their directories are put on the import path.
+Original date: 2026-10-18
+"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'an'))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import adaptive_design
+
+GRIDS = {'thresh': np.array([-2., -1.5, -1.]), 'slope': np.array([2., 4.]), 'amp': np.array([0., .5]),
+         'tau': np.array([50., 200.])}
+
+
+def cells():
+    soa_ms = np.repeat([0., 50., 100.], 3)
+    c1 = np.tile([-99., -1.5, -1.], 3)
+    c2 = np.full(9, -1.5)
+    return soa_ms, c1, c2
+
+
+def test_information_is_bounded():
+    design = adaptive_design.MaskingDesign(*cells(), param_grids=GRIDS, seed=0)
+    info = design.information()
+    assert info.shape == (9,)
+    assert np.all(info >= -1e-12) and np.all(info <= 1)
+
+
+def test_update_and_estimate():
+    design = adaptive_design.MaskingDesign(*cells(), param_grids=GRIDS, top_k=1, seed=0)
+    for trial in range(20):
+        cell = design.next_cell
+        design.update(True)
+        assert design.n_trials[cell] >= 1
+    assert design.n_trials.sum() == 20 and design.n_correct.sum() == 20
+    estimate = design.estimate()
+    assert set(estimate) == set(adaptive_design.PARAM_NAMES + [name + '_sd' for name in adaptive_design.PARAM_NAMES])
+    marginals = design.marginals()
+    assert all(np.isclose(marginals[name].sum(), 1) for name in adaptive_design.PARAM_NAMES)
+    # Always correct: the lowest threshold gains the most:
+    assert np.argmax(marginals['thresh']) == 0
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import collections
+import os
+import pandas as pd
+import aggregate
+
+
+def write_block(data_dir, experiment, subject, block, rows):
+    block_dir = os.path.join(data_dir, experiment, subject, block)
+    os.makedirs(block_dir)
+    pd.DataFrame(rows).to_csv(os.path.join(block_dir, 'beh_out.csv'), index=False)
+
+
+def trial_rows(block, stim_locs, resp_locs, resp_nums):
+    return {'subj': 1, 'block': block, 'soa': 2, 'stim1_c': -1., 'stim2_c': -1.5, 'stim1_ori': 'L', 'stim2_ori': 'R',
+            'stim_loc': stim_locs, 'resp_loc': resp_locs, 'resp_num': resp_nums, 'resp_ori': 'N'}
+
+
+def test_derive_interval_and_location_codings():
+    trials = pd.DataFrame({'stim_loc': ['1st', '2nd', 'L', 'R', 'R'], 'resp_loc': ['L', 'L', 'L', 'R', 'N'],
+                           'resp_num': ['0', '2', 'N', '1', '0'], 'stim1_ori': 'L',
+                           'stim2_ori': ['L', 'R', 'L', 'R', 'L']})
+    trials = aggregate.derive(trials)
+    assert trials['loc_corr'].tolist()[:4] == [1, 0, 1, 1]
+    assert pd.isna(trials['loc_corr'][4])
+    assert trials['vis'].tolist()[:2] == [0, 1] and pd.isna(trials['vis'][2])
+    assert trials['angle_diff'].tolist() == [0, 1, 0, 1, 0]
+
+
+def test_orientations_of_invisible_trials_are_not_counted():
+    trials = pd.DataFrame(dict(trial_rows(1, ['1st', '2nd', '1st'], ['L', 'R', 'R'], ['0', '1', 'N']),
+                               experiment='pm1', resp_ori=['A', 'B', 'B']))
+    counts = aggregate.session_counts(aggregate.derive(trials))
+    assert sorted(key[-1] for key in counts['resp_ori']) == ['B']
+    assert sum(counts['resp_ori'].values()) == 2
+
+
+def test_old_interval_sessions_are_counted(tmp_path, capsys):
+    # pm_old.py logs: the intervals as stim_int/resp_int (1/2), without stim_loc and resp_loc:
+    data_dir, agg_dir = str(tmp_path / 'data'), str(tmp_path / 'agg')
+    write_block(data_dir, 'pm1', 'subj-01', 'block-01',
+                {'exp_name': 'pm1', 'subj': 1, 'block': 1, 'soa': 3, 'stim1_c': -1., 'stim2_c': -1.5,
+                 'stim1_ori': 'L', 'stim2_ori': ['L', 'R', 'R'], 'stim_int': [1, 2, 2], 'resp_int': [1, 1, 2],
+                 'resp_num': [1, 2, 2], 'resp_ori': ['L', 'B', 'R']})
+    write_block(data_dir, 'pm1', 'subj-01', 'block-02', {'subj': 1, 'block': 2, 'soa': 3, 'resp_num': [1]})
+    aggregate.update(data_dir, agg_dir)
+    assert 'pm1/subj-01/block-02 left out' in capsys.readouterr().out
+    tables = aggregate.CountTables.load(agg_dir)
+    loc_corr = collections.Counter()
+    for key, n in tables.counts['loc_corr'].items():
+        loc_corr[key[-1]] += n
+    assert loc_corr == {0: 1, 1: 2}
+    assert sum(tables.counts['vis'].values()) == 3 and sum(tables.counts['resp_ori'].values()) == 3
+
+
+def test_update_adds_and_takes_back_sessions(tmp_path):
+    data_dir, agg_dir = str(tmp_path / 'data'), str(tmp_path / 'agg')
+    write_block(data_dir, 'pm1_int', 'subj-01', 'block-01', trial_rows(1, ['1st', '2nd'], ['L', 'R'], [1, 0]))
+    write_block(data_dir, 'pm1_int', 'subj-01', 'block-02', trial_rows(2, ['1st', '2nd'], ['R', 'R'], [1, 1]))
+    counted, removed = aggregate.update(data_dir, agg_dir)
+    assert len(counted) == 2 and removed == []
+    loc_corr = pd.read_csv(aggregate.table_file_path(agg_dir, 'loc_corr'))
+    assert loc_corr.groupby('loc_corr')['count'].sum().to_dict() == {0: 1, 1: 3}
+    assert loc_corr.groupby('block')['count'].sum().to_dict() == {1: 2, 2: 2}
+    # Nothing changed: nothing is counted again:
+    assert aggregate.update(data_dir, agg_dir) == ([], [])
+    os.remove(os.path.join(data_dir, 'pm1_int', 'subj-01', 'block-02', 'beh_out.csv'))
+    counted, removed = aggregate.update(data_dir, agg_dir)
+    assert removed == ['pm1_int/subj-01/block-02']
+    tables = aggregate.CountTables.load(agg_dir)
+    assert sum(tables.counts['loc_corr'].values()) == 2
+    assert sum(tables.counts['vis'].values()) == 2
+
+
+def test_tables_of_other_cells_are_counted_again(tmp_path):
+    data_dir, agg_dir = str(tmp_path / 'data'), str(tmp_path / 'agg')
+    write_block(data_dir, 'pm1_int', 'subj-01', 'block-01', trial_rows(1, ['1st', '2nd'], ['L', 'R'], [1, 0]))
+    aggregate.update(data_dir, agg_dir)
+    # Tables from before the block was a cell column:
+    old_table = pd.read_csv(aggregate.table_file_path(agg_dir, 'vis')).drop(columns='block')
+    old_table.to_csv(aggregate.table_file_path(agg_dir, 'vis'), index=False)
+    counted, removed = aggregate.update(data_dir, agg_dir)
+    assert counted == ['pm1_int/subj-01/block-01']
+    assert aggregate.tables_current(agg_dir)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import sys
+import types
+import pytest
+import cedrus_worker
+import triggers
+from test_triggers import FakeWindow
+
+
+def fake_pyxid(monkeypatch, devices):
+    pyxid = types.ModuleType('pyxid')
+    pyxid.get_xid_devices = lambda: devices
+    monkeypatch.setitem(sys.modules, 'pyxid', pyxid)
+
+
+def test_worker_error_is_raised_on_the_render_side(monkeypatch):
+    pyxid = types.ModuleType('pyxid')
+
+    def get_xid_devices():
+        raise IOError('no USB access')
+    pyxid.get_xid_devices = get_xid_devices
+    monkeypatch.setitem(sys.modules, 'pyxid', pyxid)
+    dev = cedrus_worker.CedrusWorker()
+    dev.ready.wait()
+    with pytest.raises(IOError):
+        dev.found
+    with pytest.raises(IOError):
+        dev.activate_line(bitmask=1)
+    with pytest.raises(IOError):
+        dev.close()
+
+
+def test_no_device(monkeypatch):
+    fake_pyxid(monkeypatch, [])
+    dev = cedrus_worker.CedrusWorker()
+    dev.ready.wait()
+    assert not dev.found
+    dev.close()
+
+
+def test_trigger_log_gets_the_send_times(monkeypatch):
+    window = FakeWindow()
+    fake_dev = triggers.FakeXidDevice(clock=lambda: window.now)
+    fake_pyxid(monkeypatch, [fake_dev])
+    dev = cedrus_worker.CedrusWorker(clock=lambda: window.now, self_test=False)
+    dev.ready.wait()
+    assert dev.found
+    scheduler = triggers.TriggerScheduler(window, dev, 100, clock=lambda: window.now)
+    scheduler.schedule(1, 1, trial=1)
+    scheduler.schedule(8, 10, trial=1)
+    for i in range(10):
+        scheduler.flip()
+    dev.close()  # all the queued activations are done
+    log = scheduler.take_log()
+    assert [row['bitmask'] for row in log] == [1, 8]
+    assert [row['t_sent'] for row in log] == [t for t, bitmask in fake_dev.activations]
+    assert scheduler.take_log(final=True) == []
+
+
+def test_unsent_triggers_are_held_back():
+    class QueuedDevice(object):
+        def __init__(self):
+            self.queued = []
+
+        def set_pulse_duration(self, duration):
+            pass
+
+        def activate_line(self, bitmask=None, tag=None):
+            self.queued.append((bitmask, tag))
+
+        def take_sent(self):
+            sent, self.queued = [(1., bitmask, tag) for bitmask, tag in self.queued[:1]], self.queued[1:]
+            return sent
+
+    window = FakeWindow()
+    scheduler = triggers.TriggerScheduler(window, QueuedDevice(), 100, clock=lambda: window.now)
+    scheduler.schedule(1, 1)
+    scheduler.schedule(2, 10)
+    for i in range(10):
+        scheduler.flip()
+    assert [row['bitmask'] for row in scheduler.take_log()] == [1]
+    log = scheduler.take_log(final=True)
+    assert [row['bitmask'] for row in log] == [2] and log[0]['t_sent'] == 1.
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import flip_log
+
+STIM = 16
+
+
+# Flips of a trial: 3 fixation frames, 4 presentation frames (the stimulus on the 2nd and 3rd), each flip tagged with
+# the frame it brings up; late_flip is delayed by one period:
+def record_trial(recorder, late_flip=None, period=.01):
+    frames = [(flip_log.PH_FIX, 0)] * 3 + [(flip_log.PH_INT1, 0), (flip_log.PH_INT1, STIM),
+                                           (flip_log.PH_INT1, STIM), (flip_log.PH_POSTFIX, 0)]
+    recorder.begin_trial()
+    t = 0.
+    for flip, (phase, shown) in enumerate(frames):
+        t += period * (2 if flip == late_flip else 1)
+        recorder.record(t, 1, phase, shown)
+
+
+def test_stim_times_and_summary():
+    recorder = flip_log.FlipRecorder(frame_rate=100)
+    record_trial(recorder)
+    on_t, off_t = recorder.stim_times(STIM)
+    assert np.isclose(on_t, .05) and np.isclose(off_t, .07)
+    summary = recorder.trial_summary({'stim': STIM})
+    assert summary['n_late_fr'] == 0
+    assert np.isclose(summary['max_ifi_ms'], 10)
+
+
+def test_late_flip_counts_against_the_frame_it_brings_up():
+    # The flip that brings up the first presentation frame is late:
+    recorder = flip_log.FlipRecorder(frame_rate=100)
+    record_trial(recorder, late_flip=3)
+    assert recorder.n_late([flip_log.PH_INT1]) == 1
+    # The last fixation frame is late; it is not a presentation frame:
+    record_trial(recorder, late_flip=2)
+    assert recorder.n_late([flip_log.PH_INT1, flip_log.PH_POSTFIX]) == 0
+    assert recorder.n_late() == 1
+
+
+def test_only_late_frames_of_the_stimuli_count():
+    recorder = flip_log.FlipRecorder(frame_rate=100)
+    # Late before the stimulus comes up (its onset is later, but it is shown as planned):
+    record_trial(recorder, late_flip=4)
+    assert recorder.n_late_stim(STIM) == 0
+    # The stimulus stays on for an extra frame, at its second frame or at the flip that takes it down:
+    for late_flip in [5, 6]:
+        record_trial(recorder, late_flip=late_flip)
+        assert recorder.n_late_stim(STIM) == 1
+    assert recorder.n_late_stim(32) == 0  # never shown
+
+
+def test_ring_buffer_keeps_the_current_trial():
+    recorder = flip_log.FlipRecorder(frame_rate=100, capacity=10)
+    for trial in range(3):
+        record_trial(recorder)
+    flips = recorder.trial_flips()
+    assert len(flips) == 7
+    assert flips['shown'].tolist() == [0, 0, 0, 0, STIM, STIM, 0]
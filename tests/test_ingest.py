@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import os
+import pandas as pd
+import pytest
+import ingest
+
+
+def write_log(data_dir, session, name, rows):
+    session_dir = os.path.join(data_dir, *session)
+    if not os.path.exists(session_dir):
+        os.makedirs(session_dir)
+    pd.DataFrame(rows).to_csv(os.path.join(session_dir, name), index=False)
+
+
+OLD_ROWS = {'exp_name': 'pm1', 'subj': 1, 'block': 1, 'trial_id': [1, 2], 'soa': [0, 3], 'stim1_ori': 'L',
+            'stim2_ori': 'R', 'stim1_c': -1., 'stim2_c': -99., 'stim_loc': ['1st', '2nd'], 'resp_num': 'N',
+            'resp_loc': ['L', 'R'], 'resp_ori': 'N'}
+
+
+def test_normalize_fills_the_schema():
+    trials = ingest.normalize(pd.DataFrame(dict(OLD_ROWS, resp_num=['N', '2'], dropped=False)))
+    assert list(trials.columns) == list(ingest.SCHEMA)
+    assert str(trials['subj'].dtype) == 'Int64'
+    assert trials['resp_num'].isna().tolist() == [True, False]
+    assert trials['rt_loc'].isna().all() and str(trials['drop_reason'].dtype) == 'string'
+    with pytest.raises(ValueError):
+        ingest.normalize(pd.DataFrame({'trial_id': [1.5], 'dropped': False}))
+
+
+def test_no_parquet_engine(tmp_path, monkeypatch):
+    def import_module(name):
+        raise ImportError(name)
+    monkeypatch.setattr(ingest.importlib, 'import_module', import_module)
+    with pytest.raises(ImportError, match='pyarrow'):
+        ingest.ingest(str(tmp_path / 'data'), str(tmp_path / 'store'))
+
+
+def test_store_across_log_versions(tmp_path):
+    pytest.importorskip('pyarrow')
+    data_dir, store_dir = str(tmp_path / 'data'), str(tmp_path / 'store')
+    old_session = ('pm1_int', 'subj-01', 'block-01')
+    new_session = ('pm1_int', 'subj-01', 'block-02')
+    write_log(data_dir, old_session, 'beh_out.csv', OLD_ROWS)
+    write_log(data_dir, new_session, 'beh_out.csv', dict(OLD_ROWS, block=2, rt_loc=[.5, .7], thresh=[-1.2, -1.3]))
+    write_log(data_dir, new_session, 'drop_out.csv', dict(OLD_ROWS, block=2, trial_id=[3, 4], rt_loc=.4,
+                                                          drop_reason='timing'))
+    parsed, removed = ingest.ingest(data_dir, store_dir, n_jobs=1)
+    assert len(parsed) == 2 and removed == []
+    # A leftover of an interrupted write:
+    with open(os.path.join(os.path.dirname(ingest.store_file_path(store_dir, old_session)),
+                           '.block-03.parquet.tmp'), 'w') as tmp_file:
+        tmp_file.write('broken')
+    trials = ingest.load_store(store_dir, 'pm1_int')
+    assert len(trials) == 6
+    assert {'rt_loc', 'thresh', 'drop_reason'} <= set(trials.columns)
+    new_trials = trials[trials['session'] == 'block-02'].sort_values('trial_id')
+    assert new_trials['rt_loc'].tolist() == [.5, .7, .4, .4]
+    assert new_trials['dropped'].tolist() == [False, False, True, True]
+    assert new_trials['drop_reason'].tolist()[2] == 'timing'
+    assert trials.loc[trials['session'] == 'block-01', 'rt_loc'].isna().all()
+    # Nothing changed: nothing is parsed again:
+    assert ingest.ingest(data_dir, store_dir, n_jobs=1) == ([], [])
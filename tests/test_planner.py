@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+import planner
+
+
+@pytest.fixture
+def pm_trials():
+    return pd.DataFrame({'SOA': [0, 2, 4, 6], 'stim1_ori': ['L', 'R', 'L', 'R'], 'stim2_ori': ['R', 'R', 'L', 'L'],
+                         'stim1_c': [-1., -1.5, -99, -2.], 'stim2_c': [-1.2, -99, -1., -2.]})
+
+
+def test_pm_plan_is_a_seeded_permutation(pm_trials):
+    plan, seed = planner.plan_pm_block(pm_trials, wiggle=3, para='int', soa_scale=2, soa_pad=1, seed=5)
+    assert seed == 5
+    assert sorted(plan['cond_idx']) == [0, 1, 2, 3]
+    assert np.array_equal(plan['soa'], np.where(pm_trials['SOA'].values[plan['cond_idx']] > 0,
+                                                pm_trials['SOA'].values[plan['cond_idx']] * 2 + 1, 0))
+    assert np.allclose(plan['stim1_contrast'], 10 ** plan['stim1_c'])
+    assert np.all(plan['stim1_angle'] == np.where(plan['stim1_ori'] == 'L', 135, 45))
+    assert np.all(plan['stim_loc'] == np.where(plan['stim_loc_R2'], '2nd', '1st'))
+    assert np.all((plan['jitter'] >= 0) & (plan['jitter'] <= 3))
+    plan_again, seed_again = planner.plan_pm_block(pm_trials, wiggle=3, para='int', soa_scale=2, soa_pad=1, seed=5)
+    assert np.array_equal(plan, plan_again)
+
+
+def test_fractional_soa_frames(pm_trials):
+    with pytest.raises(ValueError):
+        planner.plan_pm_block(pm_trials.assign(SOA=[0, 3, 5, 6]), wiggle=3, para='int', soa_scale=.5)
+
+
+def test_unknown_orientation():
+    with pytest.raises(ValueError):
+        planner.ori_angles(['L', 'X'])
+
+
+def test_meg_plan_blocks_and_blinks():
+    trials = pd.DataFrame({'stim_ori': ['L', 'R', 'L'], 'stim_c': [50, 60, 70], 'stim_dur': [2, 2, 3],
+                           'bitcode': [8, 16, 24]})
+    plan, seed = planner.plan_meg_run(trials, num_blocks=20, frame_rate=60, prestim_t_min_ms=500,
+                                      prestim_t_max_ms=1000, blink_min=3, blink_max=6, seed=1)
+    assert len(plan) == 60
+    for block in range(1, 21):
+        assert sorted(plan['cond_idx'][plan['block'] == block]) == [0, 1, 2]
+    assert np.all((plan['prestim_t_ms'] >= 500) & (plan['prestim_t_ms'] < 1000))
+    blinks = np.flatnonzero(plan['blink_trial'])
+    assert blinks[0] == 2  # the first blink comes after the minimal number of trials
+    assert np.all((np.diff(blinks) >= 3) & (np.diff(blinks) <= 6))
+
+
+def test_save_and_load(tmp_path, pm_trials):
+    plan, seed = planner.plan_pm_block(pm_trials, wiggle=0, para='loc', seed=7)
+    path = str(tmp_path / 'plan.npz')
+    planner.save_plan(path, plan, seed)
+    plan_loaded, seed_loaded = planner.load_plan(path)
+    assert seed_loaded == 7
+    assert np.array_equal(plan_loaded, plan)
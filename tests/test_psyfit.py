@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import psyfit
+
+
+def count_rows(cell, contrasts, n, k):
+    rows = []
+    for contrast, n_, k_ in zip(contrasts, n, k):
+        rows += [dict(cell=cell, stim1_c=contrast, loc_corr=1, count=k_),
+                 dict(cell=cell, stim1_c=contrast, loc_corr=0, count=n_ - k_)]
+    return rows
+
+
+def test_fit_recovers_the_parameters():
+    contrasts = np.linspace(-2.5, -.5, 9)
+    p = .5 + (1 - .5 - psyfit.LAPSE) * psyfit.weibull(3. * (contrasts + 1.5))[0]
+    counts = pd.DataFrame(count_rows(1, contrasts, [1000] * 9, np.round(1000 * p).astype(int)))
+    fits = psyfit.fit_table(counts, by=['cell'], n_boot=0)
+    assert abs(fits['thresh'][0] + 1.5) < .05 and abs(fits['slope'][0] - 3.) < .3
+    assert fits['converged'][0]
+
+
+def test_step_function_is_not_an_estimate():
+    # Chance up to -1.5, then all correct: the slope has no finite estimate:
+    contrasts = np.linspace(-2.5, -.5, 9)
+    k = [20 if contrast > -1.5 else 10 for contrast in contrasts]
+    counts = pd.DataFrame(count_rows(1, contrasts, [20] * 9, k))
+    fits = psyfit.fit_table(counts, by=['cell'], n_boot=20, n_jobs=1, seed=0)
+    assert not fits['converged'][0]
+    assert np.isnan(fits['slope'][0]) and np.isnan(fits['thresh'][0])
+    # The upper limit is unbounded, not missing:
+    assert fits['slope_hi'][0] == np.inf and np.isfinite(fits['slope_lo'][0])
+    assert -1.75 <= fits['thresh_lo'][0] <= fits['thresh_hi'][0] <= -1.25
+    assert fits['boot_converged'][0] < .5
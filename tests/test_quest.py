@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import quest
+
+
+def test_psi_converges_on_a_simulated_observer():
+    rng = np.random.RandomState(0)
+    track = quest.Psi()
+    true_thresh, true_slope = -1.6, 3.
+    for trial in range(150):
+        correct = rng.rand() < quest.weibull(track.next_x, true_thresh, true_slope)
+        track.update(correct)
+    estimate = track.estimate()
+    assert track.n_trials == 150
+    assert abs(estimate['thresh'] - true_thresh) < 3 * estimate['thresh_sd'] + .05
+    assert estimate['thresh_sd'] < .2
+    assert np.isclose(track.posterior.sum(), 1)
+
+
+def test_update_at_a_given_contrast():
+    track = quest.Psi()
+    track.update(False, x_indx=len(track.stim_grid) - 1)  # wrong at the highest contrast
+    assert track.n_trials == 1 and track.n_correct == 0
+    assert 0 <= track.next_indx < len(track.stim_grid)
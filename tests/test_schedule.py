@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+import schedule
+
+
+def test_compile_trial_second_interval():
+    sched = schedule.compile_trial(interval_dur=10, fix_dur=4, stim_dur=2, stim1_onset=3, soa=4, stim_int=1)
+    assert len(sched) == 2 * (10 + 4)
+    first, post1, second, post2 = sched[:10], sched[10:14], sched[14:24], sched[24:]
+    assert np.all(first == schedule.BOX1)
+    assert np.all(post1 == schedule.BOXW) and np.all(post2 == schedule.BOXW)
+    assert np.all(second & schedule.BOX2)
+    assert np.flatnonzero(second & schedule.STIM1).tolist() == [3, 4]
+    assert np.flatnonzero(second & schedule.STIM2).tolist() == [7, 8]
+
+
+def test_fractional_onset():
+    with pytest.raises(ValueError):
+        schedule.compile_trial(interval_dur=10, fix_dur=4, stim_dur=2, stim1_onset=3, soa=2.5, stim_int=0)
+
+
+def test_compile_trial_overlap_and_clipping():
+    # SOA 0: both stimuli on the same frames; a stimulus running past the interval is cut at its end:
+    sched = schedule.compile_trial(interval_dur=6, fix_dur=2, stim_dur=3, stim1_onset=4, soa=0, stim_int=0,
+                                   draw_fix=True)
+    interval = sched[:6]
+    assert np.flatnonzero(interval & schedule.STIM1).tolist() == [4, 5]
+    assert np.array_equal(interval & schedule.STIM1, (interval & schedule.STIM2) >> 1)
+    assert np.all(sched & schedule.FIX)
+
+
+class FakeStim(object):
+    def __init__(self, name, drawn):
+        self.name = name
+        self.drawn = drawn
+
+    def draw(self):
+        self.drawn.append(self.name)
+
+
+def test_draw_table_layers():
+    drawn = []
+    names = ['fix', 'box1', 'box2', 'boxw', 'stim1', 'stim2']
+    table = schedule.draw_table(*[FakeStim(name, drawn) for name in names])
+    assert len(table) == schedule.N_FLAGS
+    assert table[0] == ()
+    for cur_draw in table[schedule.STIM2 | schedule.FIX | schedule.BOX1]:
+        cur_draw()
+    assert drawn == ['fix', 'box1', 'stim2']
+
+
+def test_trace():
+    sched = schedule.compile_trial(interval_dur=5, fix_dur=1, stim_dur=1, stim1_onset=1, soa=2, stim_int=0)
+    assert schedule.trace(sched, 5).split('\n') == ['-/-\\-', '-----']
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import statistics
+import numpy as np
+import sdt
+
+
+def test_norm_ppf():
+    p = np.array([1e-6, .01, .3, .5, .9, .999])
+    assert np.allclose(sdt.norm_ppf(p), [statistics.NormalDist().inv_cdf(p_) for p_ in p], atol=1e-8)
+
+
+def test_bootstrap_draws_from_the_observed_rates():
+    # A perfect cell is redrawn as perfect, so its interval collapses on the (corrected) point estimate:
+    hits, n_signal, fas, n_noise = np.array([20.]), np.array([20.]), np.array([0.]), np.array([20.])
+    (d_lo, d_hi), (c_lo, c_hi) = sdt.bootstrap_ci(hits, n_signal, fas, n_noise, n_boot=200, seed=0)
+    d, c = sdt.dprime_c(sdt.corrected_rate(hits, n_signal), sdt.corrected_rate(fas, n_noise))
+    assert np.allclose([d_lo, d_hi], d) and np.allclose([c_lo, c_hi], c)
+
+
+def test_bootstrap_interval_covers_the_estimate():
+    hits, n_signal, fas, n_noise = np.array([30., 12.]), np.array([40., 40.]), np.array([10., 8.]), np.array([40., 40.])
+    (d_lo, d_hi), (c_lo, c_hi) = sdt.bootstrap_ci(hits, n_signal, fas, n_noise, two_afc=True, seed=1)
+    d, c = sdt.dprime_c(sdt.corrected_rate(hits, n_signal), sdt.corrected_rate(fas, n_noise), two_afc=True)
+    assert np.all((d_lo < d) & (d < d_hi)) and np.all((c_lo < c) & (c < c_hi))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import collections
+import numpy as np
+import pytest
+from trial_queue import TrialQueue
+
+
+def test_pops_in_order():
+    queue = TrialQueue([3, 1, 2])
+    assert len(queue) == 3
+    assert [queue.pop() for i in range(3)] == [3, 1, 2]
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_requeue_bound():
+    queue = TrialQueue([0, 1], max_drops=2, rng=np.random.RandomState(0))
+    assert queue.requeue(queue.pop())
+    popped = [queue.pop(), queue.pop()]
+    assert sorted(popped) == [0, 1]
+    assert queue.requeue(0)
+    assert queue.pop() == 0
+    # Dropped twice already:
+    assert not queue.requeue(0)
+    assert len(queue) == 0
+    assert queue.drops[0] == 2
+
+
+def test_requeue_into_full_queue():
+    queue = TrialQueue([0, 1])
+    with pytest.raises(IndexError):
+        queue.requeue(0)
+
+
+def test_every_trial_is_popped_once_plus_its_requeues():
+    queue = TrialQueue(np.arange(10), max_drops=1, rng=np.random.RandomState(1))
+    popped = []
+    while len(queue):
+        indx = queue.pop()
+        popped.append(indx)
+        if indx % 2 == 0:
+            queue.requeue(indx)
+    counts = collections.Counter(popped)
+    assert all(counts[indx] == (2 if indx % 2 == 0 else 1) for indx in range(10))
+
+
+def test_requeued_position_is_uniform():
+    # A trial requeued among 5 remaining ones comes back at each of the 6 positions equally often:
+    rng = np.random.RandomState(2)
+    positions = np.zeros(6, dtype=int)
+    for rep in range(5000):
+        queue = TrialQueue(np.arange(6), rng=rng)
+        queue.requeue(queue.pop())
+        positions[[queue.pop() for i in range(6)].index(0)] += 1
+    expected = 5000 / 6
+    chi2 = np.sum((positions - expected) ** 2 / expected)
+    assert chi2 < 20.5  # 99.9% quantile, 5 degrees of freedom
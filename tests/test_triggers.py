@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import triggers
+
+
+class FakeWindow(object):
+    """
+    Window with callOnFlip(), on a simulated 100 Hz clock.
+    """
+
+    def __init__(self):
+        self.now = 0.
+        self.on_flip = []
+
+    def callOnFlip(self, fn, *args, **kwargs):
+        self.on_flip.append((fn, args, kwargs))
+
+    def flip(self):
+        self.now += .01
+        on_flip, self.on_flip = self.on_flip, []
+        for fn, args, kwargs in on_flip:
+            fn(*args, **kwargs)
+        return self.now
+
+
+def make_scheduler(pulse_ms=50):
+    window = FakeWindow()
+    dev = triggers.FakeXidDevice(clock=lambda: window.now)
+    return window, dev, triggers.TriggerScheduler(window, dev, 100, pulse_ms=pulse_ms, clock=lambda: window.now)
+
+
+def test_triggers_fire_on_their_flips():
+    window, dev, scheduler = make_scheduler()
+    assert dev.pulse_ms == 50
+    assert scheduler.schedule(1, 1, trial=1)
+    assert scheduler.schedule(8, 10, trial=1)
+    flip_times = [scheduler.flip() for i in range(12)]
+    assert dev.activations == [(flip_times[0], 1), (flip_times[9], 8)]
+    assert dev.n_overlaps == 0
+    log = scheduler.take_log()
+    assert [(row['flip'], row['bitmask'], row['collision']) for row in log] == [(1, 1, 0), (10, 8, 0)]
+    assert scheduler.take_log() == []
+
+
+def test_same_flip_collision_merges_the_bitmasks():
+    window, dev, scheduler = make_scheduler()
+    scheduler.schedule(1, 2)
+    assert not scheduler.schedule(4, 2)
+    for i in range(3):
+        scheduler.flip()
+    assert dev.activations == [(.02, 5)]
+    assert scheduler.take_log()[0]['collision'] == 1
+
+
+def test_pending_triggers_within_a_pulse_collide():
+    # 10 ms flips, 50 ms pulses: a trigger 3 flips after (or before) a pending one overlaps its pulse:
+    window, dev, scheduler = make_scheduler()
+    assert scheduler.schedule(1, 5)
+    assert not scheduler.schedule(2, 2)  # before the pending one, on a different flip
+    assert not scheduler.schedule(4, 8)
+    assert scheduler.schedule(16, 20)
+    for i in range(20):
+        scheduler.flip()
+    assert [bitmask for t, bitmask in dev.activations] == [2, 1, 4, 16]
+    assert dev.n_overlaps == 2
+    assert [row['collision'] for row in scheduler.take_log()] == [1, 0, 1, 0]
+
+
+def test_overlap_warning_goes_to_the_log():
+    window = FakeWindow()
+    messages = []
+    scheduler = triggers.TriggerScheduler(window, None, 100, clock=lambda: window.now, log=messages.append)
+    scheduler.schedule(1, 1)
+    scheduler.schedule(2, 2)
+    assert len(messages) == 1 and messages[0].startswith('WARNING! Trigger 2')
+
+
+def test_collision_with_a_sent_trigger():
+    window, dev, scheduler = make_scheduler()
+    scheduler.schedule(1, 1)
+    scheduler.flip()
+    scheduler.flip()
+    assert not scheduler.schedule(2, 1)  # flip 3: 20 ms after the sent one
+    assert not scheduler.schedule(4, 5)  # flip 7: 40 ms after the pending one
+    assert scheduler.schedule(4, 11)  # flip 13: 60 ms after it
+
+
+def test_no_device():
+    window = FakeWindow()
+    scheduler = triggers.TriggerScheduler(window, None, 100, clock=lambda: window.now)
+    scheduler.schedule(1, 1)
+    scheduler.flip()
+    assert len(scheduler.take_log()) == 1
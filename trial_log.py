@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only trial log.
+Every completed trial is written to the output CSV as soon as it is recorded and flushed to disk, so a crash or a
+killed process loses at most the trial in progress, and memory use does not grow with the number of trials.
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+import csv
+import os
+
+
+class TrialWriter(object):
+    """
+    Streams trial records (dicts keyed by column name) to a CSV file with a fixed set of columns. The header is
+    written on opening; missing columns are left empty and extra keys are ignored, as in DataFrame.to_csv(columns=...).
+    """
+
+    def __init__(self, path, columns, fsync=True):
+        self.path = path
+        self.columns = list(columns)
+        self.fsync = fsync
+        self.n_rows = 0
+        self.out_file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.out_file, lineterminator='\n')
+        self.writer.writerow(self.columns)
+        self.flush()
+
+    # Write out a single trial and push it all the way to the disk:
+    def write(self, row):
+        self.writer.writerow([row.get(column_, '') for column_ in self.columns])
+        self.n_rows += 1
+        self.flush()
+
+    def flush(self):
+        self.out_file.flush()
+        if self.fsync:
+            os.fsync(self.out_file.fileno())
+
+    def close(self):
+        if not self.out_file.closed:
+            self.flush()
+            self.out_file.close()
+
+
+# Columnar copy of a finished trial log (reads the CSV column-wise, without building per-row dicts):
+def csv_to_parquet(csv_path, parquet_path=None):
+    if parquet_path is None:
+        parquet_path = os.path.splitext(csv_path)[0] + '.parquet'
+    try:
+        import pandas as pd
+        pd.read_csv(csv_path).to_parquet(parquet_path, index=False)
+    except ImportError:
+        print('no parquet engine found - keeping the CSV output only')
+        return None
+    return parquet_path
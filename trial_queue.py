@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Trial queue backed by integer index arrays.
+The queue holds row indices into a condition table or block plan, so picking, dropping and requeuing a trial never
+copies the table itself. Every operation is O(1).
+Original date: 2026-10-18
+"""
+
+from __future__ import division
+import numpy as np
+
+
+class TrialQueue(object):
+    """
+    Pending trials, kept in a ring buffer of row indices.
+
+    The trials are popped from the front of 'order'. When 'order' is a random permutation (e.g., the order of a block
+    plan), this is the same as popping uniformly at random among the remaining trials. A requeued trial is put back at a
+    uniformly random position among the remaining ones, which keeps it that way. 'max_drops' bounds the number of
+    times any one trial can be requeued (None = no bound).
+    """
+
+    def __init__(self, order, max_drops=None, rng=None):
+        self.order = np.asarray(order, dtype=int)
+        self.max_drops = max_drops
+        self.rng = rng if rng is not None else np.random
+        self.slots = self.order.copy()
+        self.head = 0
+        self.n_left = len(self.slots)
+        # Drop counts are kept per row of the table, which may be longer than the queue:
+        if len(self.order):
+            self.drops = np.zeros(self.order.max() + 1, dtype=int)
+        else:
+            self.drops = np.zeros(0, dtype=int)
+
+    def __len__(self):
+        return self.n_left
+
+    # Take the next trial off the queue:
+    def pop(self):
+        if self.n_left == 0:
+            raise IndexError('pop from an empty trial queue')
+        indx_ = int(self.slots[self.head])
+        self.head = (self.head + 1) % len(self.slots)
+        self.n_left -= 1
+        return indx_
+
+    # Put a dropped trial back among the remaining ones; returns False if it has been dropped too many times:
+    def requeue(self, indx):
+        if self.max_drops is not None and self.drops[indx] >= self.max_drops:
+            return False
+        size_ = len(self.slots)
+        if self.n_left == size_:
+            raise IndexError('requeue into a full trial queue')
+        self.drops[indx] += 1
+        tail_ = (self.head + self.n_left) % size_
+        self.slots[tail_] = indx
+        self.n_left += 1
+        swap_ = (self.head + self.rng.randint(self.n_left)) % size_
+        self.slots[tail_], self.slots[swap_] = self.slots[swap_], self.slots[tail_]
+        return True
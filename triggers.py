@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Flip-locked trigger output for the Cedrus XID devices.
+Triggers are scheduled ahead as (bitmask, flip) events, counted in flips from the time of scheduling, and sent from
+window.callOnFlip() on their flip. A trigger that would be sent while the pulse of another one is still on (or on the
+same flip) is reported when it is scheduled, and flagged in the trigger log. The log keeps, on the same clock as the
+flip times, the time at which every trigger was issued in the flip callback and the time at which it actually went
+out to the device: with a device that sends on its own thread (CedrusWorker, which has take_sent()), the latter is
+only known once the worker has sent it, so the log records of such triggers are held back until then.
+FakeXidDevice is an in-process stand-in for a pyxid device, so the whole path runs without hardware.
+Original date: 2026-10-18
+"""
+
+from __future__ import print_function
+from __future__ import division
+import time
+
+# Columns of the trigger log:
+LOG_COLUMNS = ['trial', 'flip', 'bitmask', 't_issue', 't_done', 't_sent', 'collision']
+
+
+class TriggerScheduler(object):
+    """
+    Sends scheduled triggers on their flips. Every flip of the trial loop has to go through flip(), which counts the
+    flips and arms the trigger of the coming one. dev=None runs the schedule (and the log) without sending anything.
+    A trigger collides with any other one (pending or already sent) less than pulse_ms (plus a 1 ms margin) apart.
+    Warnings go to log (e.g., OutputWorker.log, to keep the console output off the rendering thread).
+    """
+
+    def __init__(self, window, dev, frame_rate, pulse_ms=50, clock=time.perf_counter, log=print):
+        self.window = window
+        self.dev = dev
+        self.log_message = log
+        self.queued = dev is not None and hasattr(dev, 'take_sent')  # whether the device sends on its own thread
+        self.period_ms = 1000 / frame_rate
+        self.pulse_ms = pulse_ms
+        self.clock = clock
+        if dev is not None:
+            dev.set_pulse_duration(pulse_ms)  # the pulse duration for activate_line() calls, in ms
+        self.n_flips = 0  # flips made through flip()
+        self.pending = {}  # target flip -> (bitmask, trial, collision)
+        self.last_flip = None  # flip of the latest trigger, scheduled or sent
+        self.log = []  # records of the triggers issued since the last take_log()
+        self.unsent = {}  # flip -> log record, of the issued triggers not yet sent by a queued device
+
+    # Whether a trigger on the given flip would overlap the pulse of another one, pending or sent:
+    def collides(self, flip):
+        others_ = list(self.pending)
+        if self.last_flip is not None:
+            others_.append(self.last_flip)
+        return any(abs(flip - other_) * self.period_ms < self.pulse_ms + 1 for other_ in others_)
+
+    # Schedule a trigger for the in_flips-th flip from now (1 = the next flip); returns False if it collides:
+    def schedule(self, bitmask, in_flips=1, trial=None):
+        flip_ = self.n_flips + in_flips
+        collision_ = self.collides(flip_)
+        if collision_:
+            self.log_message('WARNING! Trigger ' + str(bitmask) + ' overlaps the pulse of another one (' +
+                             str(self.pulse_ms) + ' ms)')
+            if flip_ in self.pending:
+                # Both go out together (the lines are raised at once):
+                bitmask |= self.pending[flip_][0]
+        self.pending[flip_] = (int(bitmask), trial, collision_)
+        if self.last_flip is None or flip_ > self.last_flip:
+            self.last_flip = flip_
+        return not collision_
+
+    # Flip the window, with the trigger of this flip (if any) sent as soon as the flip is done:
+    def flip(self):
+        self.n_flips += 1
+        event_ = self.pending.pop(self.n_flips, None)
+        if event_ is not None:
+            self.window.callOnFlip(self.fire, self.n_flips, *event_)
+        return self.window.flip()
+
+    def fire(self, flip, bitmask, trial, collision):
+        t_issue_ = self.clock()
+        if self.queued:
+            self.dev.activate_line(bitmask=bitmask, tag=flip)
+        elif self.dev is not None:
+            self.dev.activate_line(bitmask=bitmask)
+        t_done_ = self.clock()
+        # A device called directly has sent the trigger once activate_line() returns; a queued one, later on:
+        sent_ = self.dev is not None and not self.queued
+        record_ = {'trial': trial, 'flip': flip, 'bitmask': bitmask, 't_issue': t_issue_, 't_done': t_done_,
+                   't_sent': t_done_ if sent_ else float('nan'), 'collision': int(collision)}
+        if self.queued:
+            self.unsent[flip] = record_
+        self.log.append(record_)
+
+    # The records of the triggers issued since the last call (e.g., to be written out after a trial), up to the first
+    # one that a queued device has not sent yet (final=True: all of them, the unsent ones without t_sent):
+    def take_log(self, final=False):
+        if self.queued:
+            for t_sent_, bitmask_, tag_ in self.dev.take_sent():
+                if tag_ in self.unsent:
+                    self.unsent.pop(tag_)['t_sent'] = t_sent_
+        n_ = len(self.log)
+        if not final:
+            n_ = next((i_ for i_, record_ in enumerate(self.log) if record_['flip'] in self.unsent), n_)
+        else:
+            self.unsent = {}
+        log_, self.log = self.log[:n_], self.log[n_:]
+        return log_
+
+
+class FakeXidDevice(object):
+    """
+    Stand-in for a pyxid XID device: records every line activation with its time, and counts the activations that
+    came while the previous pulse was still on. It has no response buttons.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.pulse_ms = 0
+        self.activations = []  # (time, bitmask)
+        self.n_overlaps = 0
+
+    def __str__(self):
+        return '<FakeXidDevice>'
+
+    def set_pulse_duration(self, duration):
+        self.pulse_ms = duration
+
+    def activate_line(self, lines=None, bitmask=None, leave_remaining_lines=False):
+        if bitmask is None:
+            bitmask = sum(2 ** (line_ - 1) for line_ in lines or [])
+        t_ = self.clock()
+        if self.activations and (t_ - self.activations[-1][0]) * 1000 < self.pulse_ms:
+            self.n_overlaps += 1
+        self.activations.append((t_, bitmask))
+
+    def clear_line(self, lines=None, bitmask=None):
+        pass
+
+    def reset_base_timer(self):
+        pass
+
+    def reset_rt_timer(self):
+        pass
+
+    def is_response_device(self):
+        return False
+
+    def has_response(self):
+        return False
+
+    def poll_for_response(self):
+        pass
+
+    def get_next_response(self):
+        return None
+
+    def clear_response_queue(self):
+        pass